@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import time
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+_MISSING = object()
+
+
+class LRUCache(Generic[K, V]):
+    """Ограниченный по размеру кэш с вытеснением давно неиспользуемых записей и TTL."""
+
+    def __init__(self, maxsize: int, ttl: float | None = None, clock: Callable[[], float] = time.monotonic) -> None:
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return self._lookup(key) is not _MISSING
+
+    def _lookup(self, key: K) -> object:
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        expires, value = item
+        if self.ttl is not None and expires <= self._clock():
+            del self._data[key]
+            return _MISSING
+        return value
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value  # type: ignore[return-value]
+
+    def set(self, key: K, value: V) -> None:
+        expires = self._clock() + self.ttl if self.ttl is not None else 0.0
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K, default: V | None = None) -> V | None:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def items(self) -> list[tuple[K, V]]:
+        """Неистекшие записи; порядок вытеснения не меняется."""
+        now = self._clock()
+        return [(key, value) for key, (expires, value) in self._data.items() if self.ttl is None or expires > now]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -1,6 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
+import secrets
 
+from .db import PragmaProfile
 from .validation import normalize_phone
 
 
@@ -10,6 +12,34 @@ class Config:
     admin_code: str
     admin_phones: list[str]
     db_path: str
+    db_pool_size: int = 4
+    db_pragmas: PragmaProfile = field(default_factory=PragmaProfile)
+    db_write_batch_size: int = 64
+    db_write_batch_delay_ms: float = 2.0
+    user_cache_size: int = 1024
+    user_cache_ttl: float = 60.0
+    order_cache_size: int = 512
+    swipe_session_cache_size: int = 1024
+    swipe_session_ttl: float = 1800.0
+    report_concurrency: int = 1
+    reports_per_admin: int = 1
+    fsm_ttl: float = 7 * 24 * 3600
+    fsm_flush_interval: float = 1.0
+    fsm_cache_size: int = 4096
+    notify_queue_size: int = 1000
+    notify_global_rate: float = 30.0
+    notify_chat_rate: float = 1.0
+    order_fanout: bool = False
+    order_fanout_page_size: int = 500
+    order_digest_interval: float = 3600.0
+    run_mode: str = "polling"
+    webhook_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_max_connections: int = 40
+    update_concurrency: int = 0
 
 
 def load_config() -> Config:
@@ -20,9 +50,84 @@ def load_config() -> Config:
     phones_raw = os.getenv("ADMIN_PHONES", "")
     admin_phones = [normalize_phone(p) for p in phones_raw.split(",") if normalize_phone(p)]
     db_path = os.getenv("DB_PATH", os.path.join("data", "bot.db"))
+    db_pool_size = int(os.getenv("DB_POOL_SIZE", "4"))
+    db_write_batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))
+    db_write_batch_delay_ms = float(os.getenv("DB_WRITE_BATCH_DELAY_MS", "2"))
+    user_cache_size = int(os.getenv("USER_CACHE_SIZE", "1024"))
+    user_cache_ttl = float(os.getenv("USER_CACHE_TTL", "60"))
+    order_cache_size = int(os.getenv("ORDER_CACHE_SIZE", "512"))
+    swipe_session_cache_size = int(os.getenv("SWIPE_SESSION_CACHE_SIZE", "1024"))
+    swipe_session_ttl = float(os.getenv("SWIPE_SESSION_TTL", "1800"))
+    report_concurrency = int(os.getenv("REPORT_CONCURRENCY", "1"))
+    # Отчет держит читающее соединение все время формирования: хотя бы одно остается обработчикам
+    if not 1 <= report_concurrency < db_pool_size:
+        raise RuntimeError(
+            f"REPORT_CONCURRENCY must be at least 1 and less than DB_POOL_SIZE ({db_pool_size})"
+        )
+    reports_per_admin = int(os.getenv("REPORTS_PER_ADMIN", "1"))
+    fsm_ttl = float(os.getenv("FSM_TTL", str(7 * 24 * 3600)))
+    fsm_flush_interval = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))
+    fsm_cache_size = int(os.getenv("FSM_CACHE_SIZE", "4096"))
+    notify_queue_size = int(os.getenv("NOTIFY_QUEUE_SIZE", "1000"))
+    notify_global_rate = float(os.getenv("NOTIFY_GLOBAL_RATE", "30"))
+    notify_chat_rate = float(os.getenv("NOTIFY_CHAT_RATE", "1"))
+    order_fanout = os.getenv("ORDER_FANOUT", "0").strip().lower() in ("1", "true", "yes")
+    order_fanout_page_size = int(os.getenv("ORDER_FANOUT_PAGE_SIZE", "500"))
+    order_digest_interval = float(os.getenv("ORDER_DIGEST_INTERVAL", "3600"))
+    run_mode = os.getenv("RUN_MODE", "polling").strip().lower()
+    if run_mode not in ("polling", "webhook"):
+        raise RuntimeError("RUN_MODE must be polling or webhook")
+    webhook_url = os.getenv("WEBHOOK_URL", "").rstrip("/")
+    if run_mode == "webhook" and not webhook_url:
+        raise RuntimeError("WEBHOOK_URL env var is required in webhook mode")
+    webhook_path = os.getenv("WEBHOOK_PATH", "/webhook")
+    # Без заданного секрета берется случайный: вебхук регистрируется заново при каждом запуске
+    webhook_secret = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    webhook_port = int(os.getenv("WEBHOOK_PORT", "8080"))
+    webhook_max_connections = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    update_concurrency = int(os.getenv("UPDATE_CONCURRENCY", "0"))
+    defaults = PragmaProfile()
+    db_pragmas = PragmaProfile(
+        journal_mode=os.getenv("DB_JOURNAL_MODE", defaults.journal_mode),
+        synchronous=os.getenv("DB_SYNCHRONOUS", defaults.synchronous),
+        cache_size=int(os.getenv("DB_CACHE_SIZE", str(defaults.cache_size))),
+        mmap_size=int(os.getenv("DB_MMAP_SIZE", str(defaults.mmap_size))),
+        temp_store=os.getenv("DB_TEMP_STORE", defaults.temp_store),
+        busy_timeout=int(os.getenv("DB_BUSY_TIMEOUT", str(defaults.busy_timeout))),
+        checkpoint_interval=float(os.getenv("DB_CHECKPOINT_INTERVAL", str(defaults.checkpoint_interval))),
+    )
     return Config(
         bot_token=token,
         admin_code=admin_code,
         admin_phones=admin_phones,
         db_path=db_path,
+        db_pool_size=db_pool_size,
+        db_pragmas=db_pragmas,
+        db_write_batch_size=db_write_batch_size,
+        db_write_batch_delay_ms=db_write_batch_delay_ms,
+        user_cache_size=user_cache_size,
+        user_cache_ttl=user_cache_ttl,
+        order_cache_size=order_cache_size,
+        swipe_session_cache_size=swipe_session_cache_size,
+        swipe_session_ttl=swipe_session_ttl,
+        report_concurrency=report_concurrency,
+        reports_per_admin=reports_per_admin,
+        fsm_ttl=fsm_ttl,
+        fsm_flush_interval=fsm_flush_interval,
+        fsm_cache_size=fsm_cache_size,
+        notify_queue_size=notify_queue_size,
+        notify_global_rate=notify_global_rate,
+        notify_chat_rate=notify_chat_rate,
+        order_fanout=order_fanout,
+        order_fanout_page_size=order_fanout_page_size,
+        order_digest_interval=order_digest_interval,
+        run_mode=run_mode,
+        webhook_url=webhook_url,
+        webhook_path=webhook_path,
+        webhook_secret=webhook_secret,
+        webhook_host=webhook_host,
+        webhook_port=webhook_port,
+        webhook_max_connections=webhook_max_connections,
+        update_concurrency=update_concurrency,
     )
@@ -79,3 +79,9 @@ ORDER_STATUS_CLOSED = "closed"
 
 MATCH_DECISION_LIKED = "liked"
 MATCH_DECISION_DECLINED = "declined"
+
+# Как исполнитель получает новые заказы по своим разделам
+NOTIFY_MODE_INSTANT = "instant"
+NOTIFY_MODE_DIGEST = "digest"
+NOTIFY_MODE_OFF = "off"
+NOTIFY_MODES = [NOTIFY_MODE_INSTANT, NOTIFY_MODE_DIGEST, NOTIFY_MODE_OFF]
@@ -1,16 +1,83 @@
 from __future__ import annotations
 
 import asyncio
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import datetime
 import json
+import logging
+from operator import itemgetter
+import queue
 import sqlite3
-from typing import Any
+import threading
+from typing import Any, AsyncIterator, Callable, Iterable, TypeVar
 
+from .cache import LRUCache
 from .constants import (
+    CONSTRUCTION_TYPES,
+    DOC_TYPES,
     MATCH_DECISION_DECLINED,
     MATCH_DECISION_LIKED,
+    NOTIFY_MODE_DIGEST,
+    NOTIFY_MODE_INSTANT,
+    NOTIFY_MODE_OFF,
+    NOTIFY_MODES,
     ORDER_STATUS_CLOSED,
+    SECTIONS_CAPITAL,
+    SECTIONS_LINEAR,
 )
+from .services import section_masks
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_WRITE_BATCH_SIZE = 64
+DEFAULT_WRITE_BATCH_DELAY = 0.002
+DEFAULT_USER_CACHE_SIZE = 1024
+DEFAULT_USER_CACHE_TTL = 60.0
+DEFAULT_ORDER_CACHE_SIZE = 512
+
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+TEMP_STORE_MODES = {"DEFAULT", "FILE", "MEMORY"}
+
+
+@dataclass(frozen=True)
+class PragmaProfile:
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    # Отрицательное значение задает размер кеша в КиБ
+    cache_size: int = -16000
+    mmap_size: int = 128 * 1024 * 1024
+    temp_store: str = "MEMORY"
+    busy_timeout: int = 5000
+    # Период фонового wal_checkpoint в секундах, 0 отключает
+    checkpoint_interval: float = 300.0
+
+    def __post_init__(self) -> None:
+        for name, allowed in (
+            ("journal_mode", JOURNAL_MODES),
+            ("synchronous", SYNCHRONOUS_MODES),
+            ("temp_store", TEMP_STORE_MODES),
+        ):
+            value = getattr(self, name).upper()
+            if value not in allowed:
+                raise ValueError(f"Unsupported {name}: {value}")
+            object.__setattr__(self, name, value)
+
+    def connection_pragmas(self) -> list[str]:
+        return [
+            "PRAGMA foreign_keys = ON",
+            f"PRAGMA synchronous = {self.synchronous}",
+            f"PRAGMA cache_size = {int(self.cache_size)}",
+            f"PRAGMA mmap_size = {int(self.mmap_size)}",
+            f"PRAGMA temp_store = {self.temp_store}",
+            f"PRAGMA busy_timeout = {int(self.busy_timeout)}",
+        ]
 
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS users (
@@ -34,11 +101,9 @@ CREATE TABLE IF NOT EXISTS executor_profiles (
     experience TEXT,
     resume_link TEXT,
     resume_text TEXT,
-    doc_types TEXT,
-    construction_types TEXT,
-    sections_capital TEXT,
-    sections_linear TEXT,
     updated_at TEXT,
+    capital_mask INTEGER NOT NULL DEFAULT 0,
+    linear_mask INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY(user_id) REFERENCES users(id)
 );
 
@@ -46,10 +111,6 @@ CREATE TABLE IF NOT EXISTS orders (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     customer_id INTEGER NOT NULL,
     name TEXT NOT NULL,
-    doc_types TEXT NOT NULL,
-    construction_types TEXT NOT NULL,
-    sections_capital TEXT,
-    sections_linear TEXT,
     description TEXT,
     deadline TEXT,
     price TEXT,
@@ -59,10 +120,33 @@ CREATE TABLE IF NOT EXISTS orders (
     assigned_executor_id INTEGER,
     created_at TEXT NOT NULL,
     updated_at TEXT NOT NULL,
+    capital_mask INTEGER NOT NULL DEFAULT 0,
+    linear_mask INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY(customer_id) REFERENCES users(id),
     FOREIGN KEY(assigned_executor_id) REFERENCES users(id)
 );
 
+-- Виды документации, строительства и разделы: kind — поле (SECTION_KINDS),
+-- item_id — индекс значения в соответствующем списке app.constants,
+-- position — место значения в списке, в котором его выбрал пользователь
+CREATE TABLE IF NOT EXISTS order_sections (
+    order_id INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(order_id, kind, item_id),
+    FOREIGN KEY(order_id) REFERENCES orders(id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS executor_sections (
+    user_id INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY(user_id, kind, item_id),
+    FOREIGN KEY(user_id) REFERENCES executor_profiles(user_id)
+) WITHOUT ROWID;
+
 CREATE TABLE IF NOT EXISTS matches (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     order_id INTEGER NOT NULL,
@@ -105,6 +189,35 @@ CREATE TABLE IF NOT EXISTS admin_whitelist (
     added_at TEXT NOT NULL
 );
 
+-- Состояния FSM aiogram: ключ из DefaultKeyBuilder, data — JSON, updated_at — unix time
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+
+-- Как исполнитель получает новые заказы; нет строки — NOTIFY_MODE_INSTANT
+CREATE TABLE IF NOT EXISTS notification_prefs (
+    user_id INTEGER PRIMARY KEY,
+    mode TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    FOREIGN KEY(user_id) REFERENCES users(id)
+);
+
+-- Заказы, ждущие отправки сводкой
+CREATE TABLE IF NOT EXISTS order_digest (
+    user_id INTEGER NOT NULL,
+    order_id INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY(user_id, order_id),
+    FOREIGN KEY(user_id) REFERENCES users(id),
+    FOREIGN KEY(order_id) REFERENCES orders(id)
+) WITHOUT ROWID;
+"""
+
+# Индексы создаются после миграций: они могут ссылаться на новые колонки
+INDEXES_SQL = """
 -- Optimization: Index for list_orders_for_executor (JOINs) and list_matches_for_executor
 CREATE INDEX IF NOT EXISTS idx_matches_executor_id ON matches(executor_id);
 
@@ -113,21 +226,36 @@ CREATE INDEX IF NOT EXISTS idx_orders_customer_id ON orders(customer_id);
 
 -- Optimization: Index for get_rating_summary
 CREATE INDEX IF NOT EXISTS idx_ratings_to_user_id ON ratings(to_user_id);
-"""
 
+-- Поиск заказов и исполнителей по разделу: (kind, item_id) -> владельцы
+CREATE INDEX IF NOT EXISTS idx_order_sections_item ON order_sections(kind, item_id, order_id);
+CREATE INDEX IF NOT EXISTS idx_executor_sections_item ON executor_sections(kind, item_id, user_id);
 
-def _now() -> str:
-    return datetime.utcnow().isoformat()
+-- Подбор исполнителя к заказу: узкий покрывающий индекс вместо строк анкеты с текстом резюме
+CREATE INDEX IF NOT EXISTS idx_executor_profiles_masks ON executor_profiles(user_id, capital_mask, linear_mask);
 
+-- Удаление брошенных состояний FSM по TTL
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated_at ON fsm_states(updated_at);
+"""
 
-def _json_dump(value: Any) -> str:
-    return json.dumps(value, ensure_ascii=False)
+SECTION_KINDS: dict[str, tuple[int, list[str]]] = {
+    "doc_types": (1, DOC_TYPES),
+    "construction_types": (2, CONSTRUCTION_TYPES),
+    "sections_capital": (3, SECTIONS_CAPITAL),
+    "sections_linear": (4, SECTIONS_LINEAR),
+}
 
+_SECTION_FIELDS = {kind: (field, options) for field, (kind, options) in SECTION_KINDS.items()}
+_SECTION_IDS = {
+    field: {name: idx for idx, name in enumerate(options)} for field, (_, options) in SECTION_KINDS.items()
+}
 
-def _json_load(value: str | None) -> list[Any]:
-    if not value:
-        return []
-    return json.loads(value)
+# Параметров в одном IN (...) не больше, чем допускает SQLite по умолчанию
+_IN_CHUNK = 500
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
 
 
 def _row_to_dict(row: sqlite3.Row | None) -> dict[str, Any] | None:
@@ -136,46 +264,732 @@ def _row_to_dict(row: sqlite3.Row | None) -> dict[str, Any] | None:
     return dict(row)
 
 
+def section_id(field: str, value: str) -> int:
+    try:
+        return _SECTION_IDS[field][value]
+    except KeyError:
+        raise ValueError(f"Unknown {field} value: {value!r}") from None
+
+
+def _copy_row(row: dict[str, Any]) -> dict[str, Any]:
+    # Списки разделов копируются, чтобы вызывающий код не испортил запись в кэше
+    return {key: list(value) if isinstance(value, list) else value for key, value in row.items()}
+
+
+def _section_rows(data: dict[str, Any], strict: bool = True) -> list[tuple[int, int, int]]:
+    # (kind, item_id, position): повторы отбрасываются, порядок выбора сохраняется в position
+    rows = []
+    for field, (kind, _) in SECTION_KINDS.items():
+        item_ids: dict[int, None] = {}
+        for value in data.get(field) or []:
+            if not strict and value not in _SECTION_IDS[field]:
+                logger.warning("Dropping unknown %s value %r", field, value)
+                continue
+            item_ids.setdefault(section_id(field, value))
+        rows.extend((kind, item_id, position) for position, item_id in enumerate(item_ids))
+    return rows
+
+
+def _sections_from_rows(rows: list[tuple[int, int, int]]) -> dict[str, list[str]]:
+    sections: dict[str, list[str]] = {field: [] for field in SECTION_KINDS}
+    for kind, item_id, _ in sorted(rows, key=itemgetter(0, 2, 1)):
+        field, options = _SECTION_FIELDS[kind]
+        sections[field].append(options[item_id])
+    return sections
+
+
+def _attach_sections(
+    conn: sqlite3.Connection, table: str, key: str, rows: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    by_owner: dict[int, list[tuple[int, int, int]]] = {row[key]: [] for row in rows}
+    owner_column = "order_id" if table == "order_sections" else "user_id"
+    owners = list(by_owner)
+    for start in range(0, len(owners), _IN_CHUNK):
+        chunk = owners[start:start + _IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        cur = conn.execute(
+            f"SELECT {owner_column}, kind, item_id, position FROM {table} WHERE {owner_column} IN ({placeholders})",
+            chunk,
+        )
+        for owner, kind, item_id, position in cur:
+            by_owner[owner].append((kind, item_id, position))
+    for row in rows:
+        row.update(_sections_from_rows(by_owner[row[key]]))
+    return rows
+
+
+def _fetch_orders(conn: sqlite3.Connection, query: str, params: tuple[Any, ...] = ()) -> list[dict[str, Any]]:
+    rows = [dict(row) for row in conn.execute(query, params)]
+    return _attach_sections(conn, "order_sections", "id", rows)
+
+
+def _fetch_executor_profiles(
+    conn: sqlite3.Connection, query: str, params: tuple[Any, ...] = ()
+) -> list[dict[str, Any]]:
+    rows = [dict(row) for row in conn.execute(query, params)]
+    return _attach_sections(conn, "executor_sections", "user_id", rows)
+
+
+def _fetch_by_ids(
+    conn: sqlite3.Connection,
+    fetch: Callable[[sqlite3.Connection, str, tuple[Any, ...]], list[dict[str, Any]]],
+    table: str,
+    ids: list[int],
+) -> dict[int, dict[str, Any]]:
+    found: dict[int, dict[str, Any]] = {}
+    for start in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[start:start + _IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        for row in fetch(conn, f"SELECT * FROM {table} WHERE id IN ({placeholders})", tuple(chunk)):
+            found[row["id"]] = row
+    return found
+
+
+def _fetch_rows(conn: sqlite3.Connection, query: str, params: tuple[Any, ...] = ()) -> list[dict[str, Any]]:
+    return [dict(row) for row in conn.execute(query, params)]
+
+
+# Таблица-владелец и ее ключ для каждой таблицы разделов
+_SECTION_OWNERS = {
+    "order_sections": ("orders", "id", "order_id"),
+    "executor_sections": ("executor_profiles", "user_id", "user_id"),
+}
+
+
+def _store_masks(conn: sqlite3.Connection, table: str, owner_id: int, sections: dict[str, Any]) -> dict[str, int]:
+    owner_table, key, _ = _SECTION_OWNERS[table]
+    capital, linear = section_masks(sections)
+    conn.execute(
+        f"UPDATE {owner_table} SET capital_mask = ?, linear_mask = ? WHERE {key} = ?",
+        (capital, linear, owner_id),
+    )
+    return {"capital_mask": capital, "linear_mask": linear}
+
+
+def _replace_sections(
+    conn: sqlite3.Connection, table: str, owner_id: int, data: dict[str, Any]
+) -> dict[str, Any]:
+    owner_column = _SECTION_OWNERS[table][2]
+    rows = _section_rows(data)
+    conn.execute(f"DELETE FROM {table} WHERE {owner_column} = ?", (owner_id,))
+    conn.executemany(
+        f"INSERT INTO {table}({owner_column}, kind, item_id, position) VALUES(?, ?, ?, ?)",
+        [(owner_id, *row) for row in rows],
+    )
+    sections: dict[str, Any] = _sections_from_rows(rows)
+    sections.update(_store_masks(conn, table, owner_id, sections))
+    return sections
+
+
+def _migrate_sections_to_tables(conn: sqlite3.Connection) -> None:
+    # JSON-колонки прежней схемы переносятся в order_sections/executor_sections
+    for table, key, junction in (
+        ("orders", "id", "order_sections"),
+        ("executor_profiles", "user_id", "executor_sections"),
+    ):
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        legacy = [field for field in SECTION_KINDS if field in columns]
+        if not legacy:
+            continue
+        owner_column = "order_id" if junction == "order_sections" else "user_id"
+        for row in conn.execute(f"SELECT {key}, {', '.join(legacy)} FROM {table}").fetchall():
+            data = {field: json.loads(row[field]) if row[field] else [] for field in legacy}
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {junction}({owner_column}, kind, item_id, position) VALUES(?, ?, ?, ?)",
+                [(row[key], *section) for section in _section_rows(data, strict=False)],
+            )
+        for field in legacy:
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN {field}")
+
+
+def _migrate_section_masks(conn: sqlite3.Connection) -> None:
+    # Битовые маски разделов считаются по уже перенесенным строкам order_sections/executor_sections
+    for table, (owner_table, key, owner_column) in _SECTION_OWNERS.items():
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({owner_table})")}
+        for column in ("capital_mask", "linear_mask"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {owner_table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        rows = [dict(row) for row in conn.execute(f"SELECT {key} FROM {owner_table}")]
+        for row in _attach_sections(conn, table, key, rows):
+            _store_masks(conn, table, row[key], row)
+
+
+def _migrate_section_positions(conn: sqlite3.Connection) -> None:
+    # Порядок выбора для строк, перенесенных до появления position, уже потерян:
+    # они остаются в порядке app.constants (position = 0, сортировка по item_id)
+    for table in _SECTION_OWNERS:
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if "position" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN position INTEGER NOT NULL DEFAULT 0")
+
+
+SCHEMA_VERSION = 3
+
+MIGRATIONS: list[tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _migrate_sections_to_tables),
+    (2, _migrate_section_masks),
+    (3, _migrate_section_positions),
+]
+
+
+def _init_schema(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    fresh = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone() is None
+    conn.executescript(SCHEMA_SQL)
+    if fresh:
+        version = SCHEMA_VERSION
+    for target, migrate in MIGRATIONS:
+        if version >= target:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info("Database migrated to schema version %s", target)
+        version = target
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.executescript(INDEXES_SQL)
+
+
+class _ConnectionWorker:
+    """Поток с собственным долгоживущим соединением SQLite."""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], name: str) -> None:
+        self._connect = connect
+        self._jobs: queue.SimpleQueue = queue.SimpleQueue()
+        self._ready: Future = Future()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> Future:
+        self._thread.start()
+        return self._ready
+
+    def _run(self) -> None:
+        try:
+            conn = self._connect()
+        except BaseException as exc:
+            self._ready.set_exception(exc)
+            return
+        self._ready.set_result(None)
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(fn(conn))
+                except BaseException as exc:
+                    future.set_exception(exc)
+        finally:
+            conn.close()
+
+    def submit(self, fn: Callable[[sqlite3.Connection], T]) -> Future:
+        future: Future = Future()
+        self._jobs.put((fn, future))
+        return future
+
+    def stop(self) -> None:
+        self._jobs.put(None)
+        self._thread.join()
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений: каждое соединение живет в своем потоке."""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int = DEFAULT_POOL_SIZE) -> None:
+        if size < 1:
+            raise ValueError("pool size must be positive")
+        self._connect = connect
+        self.size = size
+        self._workers: list[_ConnectionWorker] = []
+        self._idle: asyncio.Queue[_ConnectionWorker] | None = None
+        self._lock = asyncio.Lock()
+        self._closed = False
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    async def start(self) -> None:
+        async with self._lock:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            if self._idle is not None:
+                return
+            workers = [
+                _ConnectionWorker(self._connect, name=f"sqlite-pool-{idx}") for idx in range(self.size)
+            ]
+            try:
+                await asyncio.gather(*(asyncio.wrap_future(w.start()) for w in workers))
+            except BaseException:
+                for worker in workers:
+                    await asyncio.to_thread(worker.stop)
+                raise
+            idle: asyncio.Queue[_ConnectionWorker] = asyncio.Queue()
+            for worker in workers:
+                idle.put_nowait(worker)
+            self._workers = workers
+            self._idle = idle
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[_ConnectionWorker]:
+        if self._idle is None:
+            await self.start()
+        worker = await self._idle.get()
+        try:
+            yield worker
+        finally:
+            self._idle.put_nowait(worker)
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        async with self.acquire() as worker:
+            return await asyncio.wrap_future(worker.submit(fn))
+
+    async def health_check(self) -> bool:
+        if self._closed:
+            return False
+        await self.start()
+
+        def _ping(conn: sqlite3.Connection) -> bool:
+            return conn.execute("SELECT 1").fetchone()[0] == 1
+
+        try:
+            results = await asyncio.gather(
+                *(asyncio.wrap_future(w.submit(_ping)) for w in self._workers)
+            )
+        except sqlite3.Error:
+            logger.exception("SQLite pool health check failed")
+            return False
+        return all(results)
+
+    async def close(self) -> None:
+        async with self._lock:
+            self._closed = True
+            if self._idle is None:
+                return
+            idle = self._idle
+            for _ in range(len(self._workers)):
+                worker = await idle.get()
+                await asyncio.to_thread(worker.stop)
+            self._workers = []
+            self._idle = None
+
+
+class WriteQueue:
+    """Единственный писатель: копит записи и коммитит их пачками."""
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        batch_size: int = DEFAULT_WRITE_BATCH_SIZE,
+        batch_delay: float = DEFAULT_WRITE_BATCH_DELAY,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch size must be positive")
+        self._connect = connect
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._worker: _ConnectionWorker | None = None
+        self._pending: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self._exclusive = asyncio.Lock()
+        self._closed = False
+        self.batches = 0
+        self.statements = 0
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        async with self._lock:
+            if self._closed:
+                raise RuntimeError("Write queue is closed")
+            if self._task is not None:
+                return
+            worker = _ConnectionWorker(self._connect, name="sqlite-writer")
+            await asyncio.wrap_future(worker.start())
+            self._worker = worker
+            self._pending = asyncio.Queue()
+            self._task = asyncio.create_task(self._loop())
+
+    async def submit(self, query: str, params: tuple[Any, ...] = (), returning: bool = False) -> Any:
+        """Возвращает lastrowid, а для returning=True — первую строку RETURNING."""
+        return await self.call(lambda conn: _execute_statement(conn, query, params, returning))
+
+    async def call(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Выполняет fn атомарно в составе ближайшей пачки."""
+        if self._task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.put_nowait((fn, future))
+        return await future
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        async with self.exclusive() as worker:
+            return await asyncio.wrap_future(worker.submit(fn))
+
+    @asynccontextmanager
+    async def exclusive(self) -> AsyncIterator[_ConnectionWorker]:
+        # Пока соединение писателя занято, пачки не сбрасываются
+        if self._task is None:
+            await self.start()
+        async with self._exclusive:
+            yield self._worker
+
+    async def _loop(self) -> None:
+        pending = self._pending
+        stopping = False
+        while not stopping:
+            item = await pending.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = asyncio.get_running_loop().time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - asyncio.get_running_loop().time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(pending.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[Callable[[sqlite3.Connection], Any], asyncio.Future]]) -> None:
+        writes = [fn for fn, _ in batch]
+        try:
+            async with self._exclusive:
+                results = await asyncio.wrap_future(
+                    self._worker.submit(lambda conn: _apply_batch(conn, writes))
+                )
+        except BaseException as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            logger.exception("SQLite write batch of %s statements failed", len(batch))
+            return
+        self.batches += 1
+        self.statements += len(batch)
+        for (_, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def close(self) -> None:
+        async with self._lock:
+            self._closed = True
+            if self._task is None:
+                return
+            self._pending.put_nowait(None)
+            await self._task
+            await asyncio.to_thread(self._worker.stop)
+            self._task = None
+            self._worker = None
+            self._pending = None
+
+
+def _execute_statement(
+    conn: sqlite3.Connection, query: str, params: tuple[Any, ...], returning: bool
+) -> Any:
+    cur = conn.execute(query, params)
+    if not returning:
+        return cur.lastrowid
+    # Оператор с RETURNING завершается только после выборки всех строк
+    rows = cur.fetchall()
+    return _row_to_dict(rows[0]) if rows else None
+
+
+def _apply_batch(
+    conn: sqlite3.Connection, writes: list[Callable[[sqlite3.Connection], Any]]
+) -> list[tuple[bool, Any]]:
+    # Каждая запись в своем savepoint: ошибка одной не откатывает остальные
+    results: list[tuple[bool, Any]] = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for write in writes:
+            conn.execute("SAVEPOINT write_item")
+            try:
+                value = write(conn)
+            except Exception as exc:
+                conn.execute("ROLLBACK TO write_item")
+                conn.execute("RELEASE write_item")
+                results.append((False, exc))
+                continue
+            conn.execute("RELEASE write_item")
+            results.append((True, value))
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    return results
+
+
+def _in_read_snapshot(conn: sqlite3.Connection, fn: Callable[[sqlite3.Connection], T]) -> T:
+    # В WAL снимок фиксируется первым чтением и держится до конца транзакции
+    conn.execute("BEGIN")
+    try:
+        return fn(conn)
+    finally:
+        conn.execute("ROLLBACK")
+
+
+class _Transaction:
+    def __init__(self, db: "Database", worker: _ConnectionWorker) -> None:
+        self.db = db
+        self.worker = worker
+        self.active = True
+        self.after_commit: list[Callable[[], None]] = []
+
+    async def run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        return await asyncio.wrap_future(self.worker.submit(fn))
+
+
+_current_transaction: ContextVar[_Transaction | None] = ContextVar("sqlite_transaction", default=None)
+
+
 class Database:
-    def __init__(self, path: str) -> None:
+    def __init__(
+        self,
+        path: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        pragmas: PragmaProfile | None = None,
+        write_batch_size: int = DEFAULT_WRITE_BATCH_SIZE,
+        write_batch_delay: float = DEFAULT_WRITE_BATCH_DELAY,
+        user_cache_size: int = DEFAULT_USER_CACHE_SIZE,
+        user_cache_ttl: float | None = DEFAULT_USER_CACHE_TTL,
+        order_cache_size: int = DEFAULT_ORDER_CACHE_SIZE,
+    ) -> None:
         self.path = path
+        self.pragmas = pragmas or PragmaProfile()
+        self.pool = ConnectionPool(self._connect, size=pool_size)
+        self.writer = WriteQueue(self._connect, batch_size=write_batch_size, batch_delay=write_batch_delay)
+        self._checkpoint_task: asyncio.Task | None = None
+        self._order_listeners: list[Callable[[dict[str, Any]], None]] = []
+        self._profile_listeners: list[Callable[[dict[str, Any]], None]] = []
+        self._order_created_listeners: list[Callable[[dict[str, Any]], None]] = []
+        self._match_listeners: list[Callable[[dict[str, Any]], None]] = []
+        # Пользователи по tg_id; записи в users возвращают tg_id, по нему запись и сбрасывается
+        self.user_cache: LRUCache[int, dict[str, Any]] = LRUCache(user_cache_size, user_cache_ttl)
+        self._user_generation = 0
+        # Заказы со списками разделов; инвалидируются только записями в orders, поэтому без TTL
+        self.order_cache: LRUCache[int, dict[str, Any]] = LRUCache(order_cache_size)
+        self._order_generation = 0
 
     def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.path)
+        # Транзакции открываются явно: писатель сам ставит BEGIN/COMMIT
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
         conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
+        for pragma in self.pragmas.connection_pragmas():
+            conn.execute(pragma)
         return conn
 
-    async def execute_script(self, script: str) -> None:
+    async def close(self) -> None:
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+        await self.writer.close()
+        if self.pool.started and self.pragmas.journal_mode == "WAL":
+            await self.checkpoint("TRUNCATE")
+        await self.pool.close()
+
+    async def checkpoint(self, mode: str = "PASSIVE") -> tuple[int, int, int]:
+        mode = mode.upper()
+        if mode not in {"PASSIVE", "FULL", "RESTART", "TRUNCATE"}:
+            raise ValueError(f"Unsupported checkpoint mode: {mode}")
+
+        def _run(conn: sqlite3.Connection) -> tuple[int, int, int]:
+            busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            return busy, log_frames, checkpointed
+        return await self.pool.run(_run)
+
+    async def _checkpoint_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                busy, log_frames, checkpointed = await self.checkpoint()
+            except sqlite3.Error:
+                logger.exception("WAL checkpoint failed")
+                continue
+            logger.debug("WAL checkpoint: busy=%s log=%s checkpointed=%s", busy, log_frames, checkpointed)
+
+    async def health_check(self) -> bool:
+        if not await self.pool.health_check():
+            return False
+        try:
+            return await self.writer.run(lambda conn: conn.execute("SELECT 1").fetchone()[0] == 1)
+        except (RuntimeError, sqlite3.Error):
+            logger.exception("SQLite writer health check failed")
+            return False
+
+    def _active_transaction(self) -> _Transaction | None:
+        tx = _current_transaction.get()
+        if tx is not None and tx.db is self and tx.active:
+            return tx
+        return None
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        if self._active_transaction() is not None:
+            # Вложенный вызов присоединяется к внешней транзакции
+            yield
+            return
+        async with self.writer.exclusive() as worker:
+            tx = _Transaction(self, worker)
+            await tx.run(lambda conn: conn.execute("BEGIN IMMEDIATE"))
+            token = _current_transaction.set(tx)
+            try:
+                yield
+            except BaseException:
+                tx.active = False
+                await tx.run(lambda conn: conn.execute("ROLLBACK"))
+                raise
+            else:
+                tx.active = False
+                try:
+                    await tx.run(lambda conn: conn.execute("COMMIT"))
+                except BaseException:
+                    await tx.run(lambda conn: conn.in_transaction and conn.execute("ROLLBACK"))
+                    raise
+                for callback in tx.after_commit:
+                    callback()
+            finally:
+                _current_transaction.reset(token)
+
+    def _after_commit(self, callback: Callable[[], None]) -> None:
+        # Внутри транзакции откладываем до COMMIT, при откате колбэк не вызывается
+        tx = self._active_transaction()
+        if tx is not None:
+            tx.after_commit.append(callback)
+        else:
+            callback()
+
+    def add_order_listener(self, listener: Callable[[dict[str, Any]], None]) -> None:
+        """Подписка на изменения заказов: listener получает строку orders после фиксации."""
+        self._order_listeners.append(listener)
+
+    def add_order_created_listener(self, listener: Callable[[dict[str, Any]], None]) -> None:
+        """Подписка только на новые заказы (после фиксации), вызывается после add_order_listener."""
+        self._order_created_listeners.append(listener)
+
+    def add_profile_listener(self, listener: Callable[[dict[str, Any]], None]) -> None:
+        """Подписка на изменения анкет исполнителей (после фиксации)."""
+        self._profile_listeners.append(listener)
+
+    def add_match_listener(self, listener: Callable[[dict[str, Any]], None]) -> None:
+        """Подписка на решения исполнителей по заказам: listener получает order_id, executor_id и решение."""
+        self._match_listeners.append(listener)
+
+    def _executor_decided(self, order_id: int, executor_id: int, executor_decision: str | None) -> None:
+        if executor_decision is not None:
+            self._notify(
+                self._match_listeners,
+                {"order_id": order_id, "executor_id": executor_id, "executor_decision": executor_decision},
+            )
+
+    def _notify(self, listeners: list[Callable[[dict[str, Any]], None]], row: dict[str, Any] | None) -> None:
+        if row is None or not listeners:
+            return
+
         def _run() -> None:
-            with self._connect() as conn:
-                conn.executescript(script)
-        await asyncio.to_thread(_run)
+            for listener in listeners:
+                try:
+                    listener(row)
+                except Exception:
+                    logger.exception("Listener %r failed", listener)
+        self._after_commit(_run)
+
+    def _order_changed(self, row: dict[str, Any] | None) -> None:
+        self._notify(self._order_listeners, row)
+
+    async def _read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        tx = self._active_transaction()
+        if tx is not None:
+            return await tx.run(fn)
+        return await self.pool.run(fn)
+
+    async def read(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Выполнить fn(conn) на читающем соединении (или в текущей транзакции)."""
+        return await self._read(fn)
+
+    async def read_snapshot(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """Выполнить fn(conn) в одной читающей транзакции: все запросы видят один снимок БД."""
+        tx = self._active_transaction()
+        if tx is not None:
+            return await tx.run(fn)
+        return await self.pool.run(lambda conn: _in_read_snapshot(conn, fn))
+
+    async def execute_script(self, script: str) -> None:
+        if self._active_transaction() is not None:
+            raise RuntimeError("execute_script cannot run inside a transaction")
+
+        def _run(conn: sqlite3.Connection) -> None:
+            conn.executescript(script)
+        await self.writer.run(_run)
+
+    async def _write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        tx = self._active_transaction()
+        if tx is not None:
+            return await tx.run(fn)
+        return await self.writer.call(fn)
 
     async def execute(self, query: str, params: tuple[Any, ...] = ()) -> int:
-        def _run() -> int:
-            with self._connect() as conn:
-                cur = conn.execute(query, params)
-                conn.commit()
-                return cur.lastrowid
-        return await asyncio.to_thread(_run)
+        return await self._write(lambda conn: _execute_statement(conn, query, params, False))
+
+    async def execute_returning(self, query: str, params: tuple[Any, ...] = ()) -> dict[str, Any] | None:
+        return await self._write(lambda conn: _execute_statement(conn, query, params, True))
 
     async def fetchone(self, query: str, params: tuple[Any, ...] = ()) -> dict[str, Any] | None:
-        def _run() -> dict[str, Any] | None:
-            with self._connect() as conn:
-                cur = conn.execute(query, params)
-                return _row_to_dict(cur.fetchone())
-        return await asyncio.to_thread(_run)
+        def _run(conn: sqlite3.Connection) -> dict[str, Any] | None:
+            cur = conn.execute(query, params)
+            return _row_to_dict(cur.fetchone())
+        return await self._read(_run)
 
     async def fetchall(self, query: str, params: tuple[Any, ...] = ()) -> list[dict[str, Any]]:
-        def _run() -> list[dict[str, Any]]:
-            with self._connect() as conn:
-                cur = conn.execute(query, params)
-                return [dict(row) for row in cur.fetchall()]
-        return await asyncio.to_thread(_run)
+        def _run(conn: sqlite3.Connection) -> list[dict[str, Any]]:
+            cur = conn.execute(query, params)
+            return [dict(row) for row in cur.fetchall()]
+        return await self._read(_run)
 
     async def init(self) -> None:
-        await self.execute_script(SCHEMA_SQL)
+        def _run(conn: sqlite3.Connection) -> str:
+            # Пустой файл запоминает режим журнала только после первой записи,
+            # поэтому схема создается на том же соединении
+            mode = conn.execute(f"PRAGMA journal_mode = {self.pragmas.journal_mode}").fetchone()[0]
+            _init_schema(conn)
+            return mode
+
+        journal_mode = await self.writer.run(_run)
+        if journal_mode.upper() != self.pragmas.journal_mode:
+            logger.warning("SQLite journal_mode is %s, requested %s", journal_mode, self.pragmas.journal_mode)
+        interval = self.pragmas.checkpoint_interval
+        if journal_mode.upper() == "WAL" and interval > 0 and self._checkpoint_task is None:
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_loop(interval))
 
     async def seed_admin_whitelist(self, phones: list[str]) -> None:
         if not phones:
@@ -203,39 +1017,79 @@ class Database:
         return await self.fetchone("SELECT * FROM users WHERE phone = ?", (phone,))
 
     async def get_user_by_tg_id(self, tg_id: int) -> dict[str, Any] | None:
-        return await self.fetchone("SELECT * FROM users WHERE tg_id = ?", (tg_id,))
+        # Внутри транзакции кэш не используется: там могут быть незафиксированные изменения
+        in_transaction = self._active_transaction() is not None
+        if not in_transaction:
+            cached = self.user_cache.get(tg_id)
+            if cached is not None:
+                return dict(cached)
+        generation = self._user_generation
+        user = await self.fetchone("SELECT * FROM users WHERE tg_id = ?", (tg_id,))
+        # Запись, завершившаяся во время чтения, сменит поколение: такой результат не кэшируем
+        if user is not None and not in_transaction and generation == self._user_generation:
+            self.user_cache.set(tg_id, dict(user))
+        return user
+
+    def _invalidate_user(self, *tg_ids: int | None) -> None:
+        def _drop() -> None:
+            self._user_generation += 1
+            for tg_id in tg_ids:
+                if tg_id is not None:
+                    self.user_cache.pop(tg_id)
+        _drop()
+        tx = self._active_transaction()
+        if tx is not None:
+            # Повторно после COMMIT: между записью и фиксацией кэш могли заполнить старой строкой
+            tx.after_commit.append(_drop)
 
     async def get_user_by_id(self, user_id: int) -> dict[str, Any] | None:
         return await self.fetchone("SELECT * FROM users WHERE id = ?", (user_id,))
 
+    async def get_users_by_ids(self, user_ids: Iterable[int]) -> list[dict[str, Any]]:
+        """Пользователи одним запросом в порядке user_ids, без повторов и отсутствующих."""
+        ids = list(dict.fromkeys(user_ids))
+        if not ids:
+            return []
+        found = await self._read(lambda conn: _fetch_by_ids(conn, _fetch_rows, "users", ids))
+        return [found[user_id] for user_id in ids if user_id in found]
+
     async def create_user(self, tg_id: int, phone: str) -> dict[str, Any]:
         now = _now()
-        await self.execute(
+        return await self.execute_returning(
             """
             INSERT INTO users(tg_id, phone, created_at, updated_at)
             VALUES(?, ?, ?, ?)
+            RETURNING *
             """,
             (tg_id, phone, now, now),
         )
-        return await self.get_user_by_phone(phone)
+
+    async def _update_user(self, user_id: int, query: str, params: tuple[Any, ...]) -> dict[str, Any] | None:
+        """UPDATE users ... WHERE id = user_id RETURNING ... со сбросом кэша по возвращенному tg_id."""
+        user = await self.execute_returning(query, (*params, user_id))
+        self._invalidate_user(user["tg_id"] if user else None)
+        return user
 
     async def update_user_profile(
         self, user_id: int, first_name: str, last_name: str, org_name: str | None
     ) -> None:
-        await self.execute(
+        await self._update_user(
+            user_id,
             """
             UPDATE users
             SET first_name = ?, last_name = ?, org_name = ?, updated_at = ?
             WHERE id = ?
+            RETURNING tg_id
             """,
-            (first_name, last_name, org_name, _now(), user_id),
+            (first_name, last_name, org_name, _now()),
         )
 
     async def update_user_tg(self, user_id: int, tg_id: int) -> None:
-        await self.execute(
-            "UPDATE users SET tg_id = ?, updated_at = ? WHERE id = ?",
-            (tg_id, _now(), user_id),
-        )
+        def _run(conn: sqlite3.Connection) -> int | None:
+            old = conn.execute("SELECT tg_id FROM users WHERE id = ?", (user_id,)).fetchone()
+            conn.execute("UPDATE users SET tg_id = ?, updated_at = ? WHERE id = ?", (tg_id, _now(), user_id))
+            return old["tg_id"] if old else None
+        self._invalidate_user(await self._write(_run), tg_id)
 
     async def set_user_roles(
         self,
@@ -243,35 +1097,38 @@ class Database:
         is_customer: bool | None = None,
         is_executor: bool | None = None,
         is_admin: bool | None = None,
-    ) -> None:
-        user = await self.get_user_by_id(user_id)
-        if not user:
-            return
-        await self.execute(
+    ) -> dict[str, Any] | None:
+        return await self._update_user(
+            user_id,
             """
             UPDATE users
-            SET is_customer = ?, is_executor = ?, is_admin = ?, updated_at = ?
+            SET is_customer = COALESCE(?, is_customer),
+                is_executor = COALESCE(?, is_executor),
+                is_admin = COALESCE(?, is_admin),
+                updated_at = ?
             WHERE id = ?
+            RETURNING *
             """,
             (
-                int(is_customer if is_customer is not None else user["is_customer"]),
-                int(is_executor if is_executor is not None else user["is_executor"]),
-                int(is_admin if is_admin is not None else user["is_admin"]),
+                None if is_customer is None else int(is_customer),
+                None if is_executor is None else int(is_executor),
+                None if is_admin is None else int(is_admin),
                 _now(),
-                user_id,
             ),
         )
 
     async def set_last_role(self, user_id: int, role: str) -> None:
-        await self.execute(
-            "UPDATE users SET last_role = ?, updated_at = ? WHERE id = ?",
-            (role, _now(), user_id),
+        await self._update_user(
+            user_id,
+            "UPDATE users SET last_role = ?, updated_at = ? WHERE id = ? RETURNING tg_id",
+            (role, _now()),
         )
 
     async def set_blocked(self, user_id: int, blocked: bool) -> None:
-        await self.execute(
-            "UPDATE users SET blocked = ?, updated_at = ? WHERE id = ?",
-            (int(blocked), _now(), user_id),
+        await self._update_user(
+            user_id,
+            "UPDATE users SET blocked = ?, updated_at = ? WHERE id = ? RETURNING tg_id",
+            (int(blocked), _now()),
         )
 
     async def list_users(self) -> list[dict[str, Any]]:
@@ -294,158 +1151,383 @@ class Database:
         sections_capital: list[str],
         sections_linear: list[str],
     ) -> None:
-        now = _now()
-        await self.execute(
-            """
-            INSERT INTO executor_profiles(
-                user_id, experience, resume_link, resume_text,
-                doc_types, construction_types, sections_capital, sections_linear, updated_at
-            ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                experience = excluded.experience,
-                resume_link = excluded.resume_link,
-                resume_text = excluded.resume_text,
-                doc_types = excluded.doc_types,
-                construction_types = excluded.construction_types,
-                sections_capital = excluded.sections_capital,
-                sections_linear = excluded.sections_linear,
-                updated_at = excluded.updated_at
-            """,
-            (
-                user_id,
-                experience,
-                resume_link,
-                resume_text,
-                _json_dump(doc_types),
-                _json_dump(construction_types),
-                _json_dump(sections_capital),
-                _json_dump(sections_linear),
-                now,
-            ),
-        )
+        sections = {
+            "doc_types": doc_types,
+            "construction_types": construction_types,
+            "sections_capital": sections_capital,
+            "sections_linear": sections_linear,
+        }
+        _section_rows(sections)
+
+        def _run(conn: sqlite3.Connection) -> dict[str, Any]:
+            conn.execute(
+                """
+                INSERT INTO executor_profiles(user_id, experience, resume_link, resume_text, updated_at)
+                VALUES(?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    experience = excluded.experience,
+                    resume_link = excluded.resume_link,
+                    resume_text = excluded.resume_text,
+                    updated_at = excluded.updated_at
+                """,
+                (user_id, experience, resume_link, resume_text, _now()),
+            )
+            row = {"user_id": user_id}
+            row.update(_replace_sections(conn, "executor_sections", user_id, sections))
+            return row
+        self._notify(self._profile_listeners, await self._write(_run))
 
     async def get_executor_profile(self, user_id: int) -> dict[str, Any] | None:
-        row = await self.fetchone("SELECT * FROM executor_profiles WHERE user_id = ?", (user_id,))
-        if not row:
-            return None
-        row["doc_types"] = _json_load(row.get("doc_types"))
-        row["construction_types"] = _json_load(row.get("construction_types"))
-        row["sections_capital"] = _json_load(row.get("sections_capital"))
-        row["sections_linear"] = _json_load(row.get("sections_linear"))
-        return row
+        rows = await self._read(
+            lambda conn: _fetch_executor_profiles(
+                conn, "SELECT * FROM executor_profiles WHERE user_id = ?", (user_id,)
+            )
+        )
+        return rows[0] if rows else None
 
     async def list_executor_profiles(self) -> list[dict[str, Any]]:
-        rows = await self.fetchall(
-            """
-            SELECT e.*, u.first_name, u.last_name, u.org_name, u.phone, u.tg_id, u.blocked
-            FROM executor_profiles e
-            JOIN users u ON u.id = e.user_id
-            WHERE u.is_executor = 1
-            """
+        return await self._read(
+            lambda conn: _fetch_executor_profiles(
+                conn,
+                """
+                SELECT e.*, u.first_name, u.last_name, u.org_name, u.phone, u.tg_id, u.blocked
+                FROM executor_profiles e
+                JOIN users u ON u.id = e.user_id
+                WHERE u.is_executor = 1
+                """,
+            )
         )
-        for row in rows:
-            row["doc_types"] = _json_load(row.get("doc_types"))
-            row["construction_types"] = _json_load(row.get("construction_types"))
-            row["sections_capital"] = _json_load(row.get("sections_capital"))
-            row["sections_linear"] = _json_load(row.get("sections_linear"))
-        return rows
 
-    async def create_order(self, customer_id: int, data: dict[str, Any]) -> dict[str, Any]:
-        now = _now()
-        order_id = await self.execute(
+    async def next_executor_candidate(self, order_id: int) -> dict[str, Any] | None:
+        """Следующий подходящий исполнитель для открытого неназначенного заказа."""
+
+        def _run(conn: sqlite3.Connection) -> dict[str, Any] | None:
+            # По каждому разделу заказа идем по idx_executor_sections_item в порядке user_id
+            # до первого подходящего исполнителя и берем наименьшего из них: читаются только
+            # исполнители с общими разделами, а не все анкеты
+            row = conn.execute(
+                """
+                SELECT MIN((
+                    SELECT es.user_id
+                    FROM executor_sections es INDEXED BY idx_executor_sections_item
+                    CROSS JOIN executor_profiles e ON e.user_id = es.user_id
+                    CROSS JOIN users u ON u.id = es.user_id
+                    WHERE es.kind = os.kind AND es.item_id = os.item_id
+                      AND ((e.capital_mask & o.capital_mask) != 0 OR (e.linear_mask & o.linear_mask) != 0)
+                      AND u.is_executor = 1 AND u.blocked = 0
+                      AND NOT EXISTS (
+                          SELECT 1 FROM matches m
+                          WHERE m.order_id = o.id AND m.executor_id = es.user_id
+                            AND (m.customer_decision IS NOT NULL AND m.customer_decision != ''
+                                 OR m.executor_decision = ?)
+                      )
+                    ORDER BY es.user_id
+                    LIMIT 1
+                )) AS user_id
+                FROM orders o
+                JOIN order_sections os ON os.order_id = o.id AND os.kind IN (?, ?)
+                WHERE o.id = ? AND o.assigned_executor_id IS NULL
+                """,
+                (
+                    MATCH_DECISION_DECLINED,
+                    SECTION_KINDS["sections_capital"][0],
+                    SECTION_KINDS["sections_linear"][0],
+                    order_id,
+                ),
+            ).fetchone()
+            if row is None or row["user_id"] is None:
+                return None
+            rows = _fetch_executor_profiles(
+                conn,
+                """
+                SELECT e.*, u.first_name, u.last_name, u.org_name, u.phone, u.tg_id, u.blocked
+                FROM executor_profiles e JOIN users u ON u.id = e.user_id
+                WHERE e.user_id = ?
+                """,
+                (row["user_id"],),
+            )
+            return rows[0] if rows else None
+        return await self.read_snapshot(_run)
+
+    async def list_executors_for_section(self, field: str, value: str) -> list[int]:
+        kind = SECTION_KINDS[field][0]
+        rows = await self.fetchall(
             """
-            INSERT INTO orders(
-                customer_id, name, doc_types, construction_types,
-                sections_capital, sections_linear, description, deadline,
-                price, expertise_required, files_link, status, assigned_executor_id,
-                created_at, updated_at
-            ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            SELECT es.user_id FROM executor_sections es
+            JOIN users u ON u.id = es.user_id
+            WHERE es.kind = ? AND es.item_id = ? AND u.is_executor = 1
+            ORDER BY es.user_id
             """,
-            (
-                customer_id,
-                data["name"],
-                _json_dump(data["doc_types"]),
-                _json_dump(data["construction_types"]),
-                _json_dump(data.get("sections_capital", [])),
-                _json_dump(data.get("sections_linear", [])),
-                data.get("description"),
-                data.get("deadline"),
-                data.get("price"),
-                int(bool(data.get("expertise_required"))) if data.get("expertise_required") is not None else None,
-                data.get("files_link"),
-                data.get("status"),
-                data.get("assigned_executor_id"),
-                now,
-                now,
-            ),
+            (kind, section_id(field, value)),
         )
-        return await self.get_order(order_id)
-
-    async def update_order(self, order_id: int, data: dict[str, Any]) -> None:
-        await self.execute(
+        return [row["user_id"] for row in rows]
+
+    async def list_order_recipients(
+        self, order_id: int, after_user_id: int = 0, limit: int = 500
+    ) -> list[dict[str, Any]]:
+        """
+        Исполнители, которым нужно сообщить о новом заказе: user_id, tg_id и режим уведомлений.
+
+        Кандидаты ищутся через idx_executor_sections_item по разделам заказа, а маски
+        проверяют, что раздел относится к выбранному виду строительства. Страницы идут
+        по user_id: следующая начинается после последнего user_id предыдущей.
+        """
+        return await self.fetchall(
             """
-            UPDATE orders SET
-                name = ?, doc_types = ?, construction_types = ?, sections_capital = ?, sections_linear = ?,
-                description = ?, deadline = ?, price = ?, expertise_required = ?, files_link = ?, updated_at = ?
-            WHERE id = ?
+            SELECT es.user_id, u.tg_id, COALESCE(p.mode, ?) AS mode
+            FROM order_sections os
+            CROSS JOIN executor_sections es INDEXED BY idx_executor_sections_item
+                ON es.kind = os.kind AND es.item_id = os.item_id
+            JOIN orders o ON o.id = os.order_id
+            JOIN executor_profiles e ON e.user_id = es.user_id
+            JOIN users u ON u.id = es.user_id
+            LEFT JOIN notification_prefs p ON p.user_id = es.user_id
+            WHERE os.order_id = ? AND os.kind IN (?, ?) AND es.user_id > ?
+              AND ((e.capital_mask & o.capital_mask) != 0 OR (e.linear_mask & o.linear_mask) != 0)
+              AND u.is_executor = 1 AND u.blocked = 0 AND u.tg_id IS NOT NULL
+              AND u.id != o.customer_id
+              AND COALESCE(p.mode, ?) != ?
+            GROUP BY es.user_id
+            ORDER BY es.user_id
+            LIMIT ?
             """,
             (
-                data["name"],
-                _json_dump(data["doc_types"]),
-                _json_dump(data["construction_types"]),
-                _json_dump(data.get("sections_capital", [])),
-                _json_dump(data.get("sections_linear", [])),
-                data.get("description"),
-                data.get("deadline"),
-                data.get("price"),
-                int(bool(data.get("expertise_required"))) if data.get("expertise_required") is not None else None,
-                data.get("files_link"),
-                _now(),
+                NOTIFY_MODE_INSTANT,
                 order_id,
+                SECTION_KINDS["sections_capital"][0],
+                SECTION_KINDS["sections_linear"][0],
+                after_user_id,
+                NOTIFY_MODE_INSTANT,
+                NOTIFY_MODE_OFF,
+                limit,
             ),
         )
 
+    async def get_notify_mode(self, user_id: int) -> str:
+        row = await self.fetchone("SELECT mode FROM notification_prefs WHERE user_id = ?", (user_id,))
+        return row["mode"] if row else NOTIFY_MODE_INSTANT
+
+    async def set_notify_mode(self, user_id: int, mode: str) -> None:
+        if mode not in NOTIFY_MODES:
+            raise ValueError(f"Unknown notify mode: {mode}")
+
+        def _run(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                """
+                INSERT INTO notification_prefs(user_id, mode, updated_at) VALUES(?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET mode = excluded.mode, updated_at = excluded.updated_at
+                """,
+                (user_id, mode, _now()),
+            )
+            if mode != NOTIFY_MODE_DIGEST:
+                # Накопленная сводка больше не нужна: заказы видны в «Возможных заказах»
+                conn.execute("DELETE FROM order_digest WHERE user_id = ?", (user_id,))
+        await self._write(_run)
+
+    async def add_order_digest(self, order_id: int, user_ids: Iterable[int]) -> None:
+        now = _now()
+        rows = [(user_id, order_id, now) for user_id in user_ids]
+        if rows:
+            await self._write(
+                lambda conn: conn.executemany(
+                    "INSERT OR IGNORE INTO order_digest(user_id, order_id, created_at) VALUES(?, ?, ?)", rows
+                )
+            )
+
+    async def take_order_digest(self) -> list[dict[str, Any]]:
+        """
+        Забрать накопленную сводку: строки user_id, tg_id, order_id, name по порядку
+        пользователей и заказов. Заказы, уже закрытые или назначенные, и
+        заблокированные пользователи пропускаются, а все строки очереди удаляются.
+        """
+
+        def _run(conn: sqlite3.Connection) -> list[dict[str, Any]]:
+            rows = [
+                dict(row)
+                for row in conn.execute(
+                    """
+                    SELECT d.user_id, u.tg_id, d.order_id, o.name
+                    FROM order_digest d
+                    JOIN users u ON u.id = d.user_id
+                    JOIN orders o ON o.id = d.order_id
+                    WHERE u.blocked = 0 AND u.tg_id IS NOT NULL
+                      AND o.status != ? AND o.assigned_executor_id IS NULL
+                    ORDER BY d.user_id, d.order_id
+                    """,
+                    (ORDER_STATUS_CLOSED,),
+                )
+            ]
+            conn.execute("DELETE FROM order_digest")
+            return rows
+        return await self._write(_run)
+
+    async def create_order(self, customer_id: int, data: dict[str, Any]) -> dict[str, Any]:
+        _section_rows(data)
+        now = _now()
+
+        def _run(conn: sqlite3.Connection) -> dict[str, Any]:
+            row = _execute_statement(
+                conn,
+                """
+                INSERT INTO orders(
+                    customer_id, name, description, deadline,
+                    price, expertise_required, files_link, status, assigned_executor_id,
+                    created_at, updated_at
+                ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING *
+                """,
+                (
+                    customer_id,
+                    data["name"],
+                    data.get("description"),
+                    data.get("deadline"),
+                    data.get("price"),
+                    int(bool(data.get("expertise_required"))) if data.get("expertise_required") is not None else None,
+                    data.get("files_link"),
+                    data.get("status"),
+                    data.get("assigned_executor_id"),
+                    now,
+                    now,
+                ),
+                True,
+            )
+            row.update(_replace_sections(conn, "order_sections", row["id"], data))
+            return row
+        order = await self._write(_run)
+        self._order_changed(order)
+        self._notify(self._order_created_listeners, order)
+        return order
+
+    async def update_order(self, order_id: int, data: dict[str, Any]) -> None:
+        _section_rows(data)
+
+        def _run(conn: sqlite3.Connection) -> dict[str, Any] | None:
+            row = _execute_statement(
+                conn,
+                """
+                UPDATE orders SET
+                    name = ?, description = ?, deadline = ?, price = ?, expertise_required = ?,
+                    files_link = ?, updated_at = ?
+                WHERE id = ?
+                RETURNING *
+                """,
+                (
+                    data["name"],
+                    data.get("description"),
+                    data.get("deadline"),
+                    data.get("price"),
+                    int(bool(data.get("expertise_required"))) if data.get("expertise_required") is not None else None,
+                    data.get("files_link"),
+                    _now(),
+                    order_id,
+                ),
+                True,
+            )
+            if row is None:
+                return None
+            row.update(_replace_sections(conn, "order_sections", order_id, data))
+            return row
+        row = await self._write(_run)
+        self._invalidate_order(order_id)
+        self._order_changed(row)
+
     async def set_order_status(self, order_id: int, status: str) -> None:
-        await self.execute(
-            "UPDATE orders SET status = ?, updated_at = ? WHERE id = ?",
+        row = await self.execute_returning(
+            "UPDATE orders SET status = ?, updated_at = ? WHERE id = ? RETURNING *",
             (status, _now(), order_id),
         )
+        self._invalidate_order(order_id)
+        self._order_changed(row)
 
     async def assign_executor(self, order_id: int, executor_id: int | None) -> None:
-        await self.execute(
-            "UPDATE orders SET assigned_executor_id = ?, updated_at = ? WHERE id = ?",
+        row = await self.execute_returning(
+            "UPDATE orders SET assigned_executor_id = ?, updated_at = ? WHERE id = ? RETURNING *",
             (executor_id, _now(), order_id),
         )
+        self._invalidate_order(order_id)
+        self._order_changed(row)
 
     async def get_order(self, order_id: int) -> dict[str, Any] | None:
-        row = await self.fetchone("SELECT * FROM orders WHERE id = ?", (order_id,))
-        if not row:
+        in_transaction = self._active_transaction() is not None
+        if not in_transaction:
+            cached = self.order_cache.get(order_id)
+            if cached is not None:
+                return _copy_row(cached)
+        generation = self._order_generation
+        rows = await self._read(lambda conn: _fetch_orders(conn, "SELECT * FROM orders WHERE id = ?", (order_id,)))
+        if not rows:
             return None
-        return self._deserialize_order(row)
-
-    def _deserialize_order(self, row: dict[str, Any]) -> dict[str, Any]:
-        row["doc_types"] = _json_load(row.get("doc_types"))
-        row["construction_types"] = _json_load(row.get("construction_types"))
-        row["sections_capital"] = _json_load(row.get("sections_capital"))
-        row["sections_linear"] = _json_load(row.get("sections_linear"))
-        return row
+        if not in_transaction and generation == self._order_generation:
+            self.order_cache.set(order_id, _copy_row(rows[0]))
+        return rows[0]
+
+    async def get_orders_by_ids(self, order_ids: Iterable[int]) -> list[dict[str, Any]]:
+        """Заказы в порядке order_ids, без повторов и отсутствующих; промахи кэша — одним запросом."""
+        ids = list(dict.fromkeys(order_ids))
+        in_transaction = self._active_transaction() is not None
+        found: dict[int, dict[str, Any]] = {}
+        if not in_transaction:
+            for order_id in ids:
+                cached = self.order_cache.get(order_id)
+                if cached is not None:
+                    found[order_id] = _copy_row(cached)
+        missing = [order_id for order_id in ids if order_id not in found]
+        if missing:
+            generation = self._order_generation
+            fetched = await self._read(lambda conn: _fetch_by_ids(conn, _fetch_orders, "orders", missing))
+            if not in_transaction and generation == self._order_generation:
+                for order_id, row in fetched.items():
+                    self.order_cache.set(order_id, _copy_row(row))
+            found.update(fetched)
+        return [found[order_id] for order_id in ids if order_id in found]
+
+    def _invalidate_order(self, order_id: int) -> None:
+        def _drop() -> None:
+            self._order_generation += 1
+            self.order_cache.pop(order_id)
+        _drop()
+        tx = self._active_transaction()
+        if tx is not None:
+            tx.after_commit.append(_drop)
+
+    async def _list_orders(self, query: str, params: tuple[Any, ...] = ()) -> list[dict[str, Any]]:
+        return await self._read(lambda conn: _fetch_orders(conn, query, params))
 
     async def list_orders_by_customer(self, customer_id: int) -> list[dict[str, Any]]:
-        rows = await self.fetchall(
+        return await self._list_orders(
             "SELECT * FROM orders WHERE customer_id = ? ORDER BY created_at ASC",
             (customer_id,),
         )
-        return [self._deserialize_order(row) for row in rows]
 
     async def list_open_orders(self) -> list[dict[str, Any]]:
-        rows = await self.fetchall(
+        return await self._list_orders(
             "SELECT * FROM orders WHERE status != ? ORDER BY created_at ASC",
             (ORDER_STATUS_CLOSED,),
         )
-        return [self._deserialize_order(row) for row in rows]
+
+    async def list_open_orders_matching(self, capital_mask: int, linear_mask: int) -> list[dict[str, Any]]:
+        return await self._list_orders(
+            """
+            SELECT * FROM orders
+            WHERE status != ? AND assigned_executor_id IS NULL
+              AND ((capital_mask & ?) != 0 OR (linear_mask & ?) != 0)
+            ORDER BY created_at ASC
+            """,
+            (ORDER_STATUS_CLOSED, capital_mask, linear_mask),
+        )
+
+    async def list_open_order_masks(self) -> list[dict[str, Any]]:
+        return await self.fetchall(
+            """
+            SELECT id, customer_id, status, assigned_executor_id, capital_mask, linear_mask FROM orders
+            WHERE status != ? AND assigned_executor_id IS NULL
+            ORDER BY id
+            """,
+            (ORDER_STATUS_CLOSED,),
+        )
 
     async def list_orders_for_executor(self, executor_id: int) -> list[dict[str, Any]]:
-        rows = await self.fetchall(
+        return await self._list_orders(
             """
             SELECT o.* FROM orders o
             JOIN matches m ON m.order_id = o.id
@@ -457,24 +1539,58 @@ class Database:
             """,
             (executor_id, MATCH_DECISION_LIKED, MATCH_DECISION_LIKED, executor_id),
         )
-        return [self._deserialize_order(row) for row in rows]
 
     async def list_closed_orders_for_user(self, user_id: int, role: str) -> list[dict[str, Any]]:
         if role == "customer":
-            rows = await self.fetchall(
+            return await self._list_orders(
                 "SELECT * FROM orders WHERE customer_id = ? AND status = ? ORDER BY created_at ASC",
                 (user_id, ORDER_STATUS_CLOSED),
             )
-        else:
-            rows = await self.fetchall(
-                """
-                SELECT o.* FROM orders o
-                WHERE o.assigned_executor_id = ? AND o.status = ?
-                ORDER BY o.created_at ASC
-                """,
-                (user_id, ORDER_STATUS_CLOSED),
-            )
-        return [self._deserialize_order(row) for row in rows]
+        return await self._list_orders(
+            """
+            SELECT o.* FROM orders o
+            WHERE o.assigned_executor_id = ? AND o.status = ?
+            ORDER BY o.created_at ASC
+            """,
+            (user_id, ORDER_STATUS_CLOSED),
+        )
+
+    async def list_chosen_orders_for_executor(self, executor_id: int) -> list[dict[str, Any]]:
+        """Заказы, где заказчик выбрал исполнителя, а тот еще не ответил."""
+        return await self._list_orders(
+            """
+            SELECT o.* FROM matches m
+            JOIN orders o ON o.id = m.order_id
+            WHERE m.executor_id = ? AND m.customer_decision = ? AND COALESCE(m.executor_decision, '') = ''
+            ORDER BY m.id
+            """,
+            (executor_id, MATCH_DECISION_LIKED),
+        )
+
+    async def list_orders_declined_by_executor(self, executor_id: int) -> list[dict[str, Any]]:
+        return await self._list_orders(
+            """
+            SELECT o.* FROM matches m
+            JOIN orders o ON o.id = m.order_id
+            WHERE m.executor_id = ? AND m.executor_decision = ?
+            ORDER BY m.id
+            """,
+            (executor_id, MATCH_DECISION_DECLINED),
+        )
+
+    async def list_matches_with_executors(self, order_id: int, customer_decision: str) -> list[dict[str, Any]]:
+        """Отклики по заказу с данными исполнителя в колонках executor_*."""
+        return await self.fetchall(
+            """
+            SELECT m.*, u.first_name AS executor_first_name, u.last_name AS executor_last_name,
+                   u.phone AS executor_phone, u.tg_id AS executor_tg_id
+            FROM matches m
+            JOIN users u ON u.id = m.executor_id
+            WHERE m.order_id = ? AND m.customer_decision = ?
+            ORDER BY m.id
+            """,
+            (order_id, customer_decision),
+        )
 
     async def upsert_match(
         self,
@@ -495,6 +1611,7 @@ class Database:
             """,
             (order_id, executor_id, customer_decision, executor_decision, now, now),
         )
+        self._executor_decided(order_id, executor_id, executor_decision)
 
     async def update_match_decision(
         self,
@@ -513,6 +1630,7 @@ class Database:
             """,
             (customer_decision, executor_decision, _now(), order_id, executor_id),
         )
+        self._executor_decided(order_id, executor_id, executor_decision)
 
     async def get_match(self, order_id: int, executor_id: int) -> dict[str, Any] | None:
         return await self.fetchone(
@@ -579,6 +1697,33 @@ class Database:
             (from_user_id, role, text, _now()),
         )
 
+    async def get_fsm_record(self, key: str) -> dict[str, Any] | None:
+        return await self.fetchone("SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (key,))
+
+    async def save_fsm_records(
+        self, records: list[tuple[str, str | None, str, float]], deleted: list[str]
+    ) -> None:
+        """Записать пачку состояний FSM (key, state, data, updated_at) и удалить deleted одной записью."""
+
+        def _run(conn: sqlite3.Connection) -> None:
+            if records:
+                conn.executemany(
+                    """
+                    INSERT INTO fsm_states(key, state, data, updated_at) VALUES(?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+                    """,
+                    records,
+                )
+            if deleted:
+                conn.executemany("DELETE FROM fsm_states WHERE key = ?", [(key,) for key in deleted])
+        await self._write(_run)
+
+    async def purge_fsm_records(self, before: float) -> int:
+        return await self._write(
+            lambda conn: conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,)).rowcount
+        )
+
     async def count_stats(self) -> dict[str, int]:
         users = await self.fetchone("SELECT COUNT(*) as cnt FROM users")
         customers = await self.fetchone("SELECT COUNT(*) as cnt FROM users WHERE is_customer = 1")
@@ -1,10 +1,27 @@
 from __future__ import annotations
 
+from datetime import date, datetime
+from functools import lru_cache
 from io import BytesIO
+import math
+from typing import Any, BinaryIO, Iterable, Iterator, Sequence
 import zipfile
-from xml.sax.saxutils import escape
+from xml.sax.saxutils import escape, quoteattr
 
+# Сколько байт XML листа копится перед записью в поток zip-записи
+_FLUSH_SIZE = 64 * 1024
+# Таблица общих строк держится в памяти до конца листа, поэтому ограничена;
+# длинные и не поместившиеся строки пишутся в ячейку как inlineStr
+MAX_SHARED_STRINGS = 100_000
+_MAX_SHARED_LENGTH = 255
 
+# Индексы стилей из cellXfs
+_STYLE_DATE = 1
+_STYLE_DATETIME = 2
+_EPOCH = datetime(1899, 12, 30)
+
+
+@lru_cache(maxsize=None)
 def _col_letter(idx: int) -> str:
     letters = ""
     while idx > 0:
@@ -17,90 +34,213 @@ def _cell_ref(row: int, col: int) -> str:
     return f"{_col_letter(col)}{row}"
 
 
-def _sheet_xml(rows: list[list[str]]) -> str:
-    lines = [
-        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
-        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
-        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">',
-        "<sheetData>",
-    ]
-    for r_idx, row in enumerate(rows, start=1):
-        lines.append(f"<row r=\"{r_idx}\">")
-        for c_idx, value in enumerate(row, start=1):
-            text = "" if value is None else str(value)
-            text = escape(text)
-            cell = _cell_ref(r_idx, c_idx)
-            lines.append(
-                f"<c r=\"{cell}\" t=\"inlineStr\"><is><t>{text}</t></is></c>"
-            )
-        lines.append("</row>")
-    lines.append("</sheetData></worksheet>")
-    return "".join(lines)
-
-
-def build_xlsx(rows: list[list[str]], sheet_name: str = "Sheet1") -> bytes:
-    content_types = (
+def _content_types(sheet_count: int) -> str:
+    sheets = "".join(
+        f'<Override PartName="/xl/worksheets/sheet{idx}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for idx in range(1, sheet_count + 1)
+    )
+    return (
         '<?xml version="1.0" encoding="UTF-8"?>'
         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
         '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
         '<Default Extension="xml" ContentType="application/xml"/>'
         '<Override PartName="/xl/workbook.xml" '
         'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
-        '<Override PartName="/xl/worksheets/sheet1.xml" '
-        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        f"{sheets}"
         '<Override PartName="/xl/styles.xml" '
         'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
         "</Types>"
     )
 
-    rels = (
+
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+
+def _workbook_rels(sheet_count: int) -> str:
+    # rId1..rIdN — листы, следом стили и общие строки
+    sheets = "".join(
+        f'<Relationship Id="rId{idx}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{idx}.xml"/>'
+        for idx in range(1, sheet_count + 1)
+    )
+    return (
         '<?xml version="1.0" encoding="UTF-8"?>'
         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
-        '<Relationship Id="rId1" '
-        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
-        'Target="xl/workbook.xml"/>'
+        f"{sheets}"
+        f'<Relationship Id="rId{sheet_count + 1}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        f'<Relationship Id="rId{sheet_count + 2}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" '
+        'Target="sharedStrings.xml"/>'
         "</Relationships>"
     )
 
-    workbook = (
+
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd.mm.yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="dd.mm.yyyy hh:mm"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><color theme="1"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+class _SharedStrings:
+    """Таблица общих строк: одинаковые значения хранятся в книге один раз."""
+
+    def __init__(self, limit: int = MAX_SHARED_STRINGS) -> None:
+        self.limit = limit
+        self.index: dict[str, int] = {}
+        self.count = 0
+
+    def add(self, text: str) -> int | None:
+        # None — строку нужно записать прямо в ячейку
+        idx = self.index.get(text)
+        if idx is None:
+            if len(self.index) >= self.limit or len(text) > _MAX_SHARED_LENGTH:
+                return None
+            idx = self.index[text] = len(self.index)
+        self.count += 1
+        return idx
+
+    def xml_chunks(self) -> Iterator[str]:
+        yield (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            f'count="{self.count}" uniqueCount="{len(self.index)}">'
+        )
+        # Словарь хранит порядок вставки, он же порядок индексов
+        for text in self.index:
+            yield f'<si><t xml:space="preserve">{escape(text)}</t></si>'
+        yield "</sst>"
+
+
+def _serial(value: date) -> float:
+    if isinstance(value, datetime):
+        delta = value.replace(tzinfo=None) - _EPOCH
+        return delta.days + delta.seconds / 86400 + delta.microseconds / 86_400_000_000
+    return float((value - _EPOCH.date()).days)
+
+
+def _cell_xml(ref: str, value: Any, strings: _SharedStrings) -> str:
+    if type(value) is str:
+        text = value
+    elif isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    elif isinstance(value, int) or (isinstance(value, float) and math.isfinite(value)):
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    elif isinstance(value, date):
+        style = _STYLE_DATETIME if isinstance(value, datetime) else _STYLE_DATE
+        return f'<c r="{ref}" s="{style}"><v>{_serial(value)!r}</v></c>'
+    else:
+        text = str(value)
+    idx = strings.add(text)
+    if idx is None:
+        return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+    return f'<c r="{ref}" t="s"><v>{idx}</v></c>'
+
+
+def _workbook_xml(sheet_names: Sequence[str]) -> str:
+    sheets = "".join(
+        f'<sheet name={quoteattr(name)} sheetId="{idx}" r:id="rId{idx}"/>'
+        for idx, name in enumerate(sheet_names, start=1)
+    )
+    return (
         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
         '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
         'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
-        '<sheets>'
-        f'<sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/>'
-        '</sheets>'
-        '</workbook>'
+        f"<sheets>{sheets}</sheets>"
+        "</workbook>"
     )
 
-    workbook_rels = (
-        '<?xml version="1.0" encoding="UTF-8"?>'
-        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
-        '<Relationship Id="rId1" '
-        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
-        'Target="worksheets/sheet1.xml"/>'
-        "</Relationships>"
-    )
 
-    styles = (
+def _sheet_chunks(rows: Iterable[Iterable[Any]], strings: _SharedStrings) -> Iterator[str]:
+    yield (
         '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
-        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
-        '<fonts count="1"><font><sz val="11"/><color theme="1"/><name val="Calibri"/><family val="2"/></font></fonts>'
-        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
-        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
-        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
-        '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
-        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
-        '</styleSheet>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        "<sheetData>"
     )
+    for r_idx, row in enumerate(rows, start=1):
+        cells = [f"<row r=\"{r_idx}\">"]
+        for c_idx, value in enumerate(row, start=1):
+            # Пустые ячейки не пишутся
+            if value is None or value == "":
+                continue
+            cells.append(_cell_xml(_cell_ref(r_idx, c_idx), value, strings))
+        cells.append("</row>")
+        yield "".join(cells)
+    yield "</sheetData></worksheet>"
+
+
+def _write_chunks(stream: BinaryIO, chunks: Iterable[str]) -> None:
+    # XML пишется пачками: в памяти не больше _FLUSH_SIZE несжатых байт
+    pending: list[bytes] = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= _FLUSH_SIZE:
+            stream.write(b"".join(pending))
+            pending.clear()
+            size = 0
+    if pending:
+        stream.write(b"".join(pending))
+
+
+def write_workbook(fileobj: BinaryIO, sheets: Sequence[tuple[str, Iterable[Iterable[Any]]]]) -> None:
+    """
+    Пишет книгу из нескольких листов (имя, строки) в fileobj.
+
+    Строки каждого листа потребляются по одной. int и float становятся числовыми
+    ячейками, date и datetime — датами, остальные значения — строками из общей
+    для всех листов таблицы.
+    """
+    names = [name for name, _ in sheets]
+    if not names:
+        raise ValueError("workbook must have at least one sheet")
+    if len({name.lower() for name in names}) != len(names):
+        raise ValueError("sheet names must be unique")
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _content_types(len(names)))
+        zf.writestr("_rels/.rels", _RELS)
+        zf.writestr("xl/workbook.xml", _workbook_xml(names))
+        zf.writestr("xl/_rels/workbook.xml.rels", _workbook_rels(len(names)))
+        strings = _SharedStrings()
+        for idx, (_, rows) in enumerate(sheets, start=1):
+            with zf.open(f"xl/worksheets/sheet{idx}.xml", "w", force_zip64=True) as stream:
+                _write_chunks(stream, _sheet_chunks(rows, strings))
+        with zf.open("xl/sharedStrings.xml", "w", force_zip64=True) as stream:
+            _write_chunks(stream, strings.xml_chunks())
+        zf.writestr("xl/styles.xml", _STYLES)
+
+
+def write_xlsx(fileobj: BinaryIO, rows: Iterable[Iterable[Any]], sheet_name: str = "Sheet1") -> None:
+    """Пишет книгу с одним листом в fileobj, потребляя rows по одной строке."""
+    write_workbook(fileobj, [(sheet_name, rows)])
 
-    sheet_xml = _sheet_xml(rows)
 
+def build_xlsx(rows: Iterable[Iterable[Any]], sheet_name: str = "Sheet1") -> bytes:
     buffer = BytesIO()
-    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("[Content_Types].xml", content_types)
-        zf.writestr("_rels/.rels", rels)
-        zf.writestr("xl/workbook.xml", workbook)
-        zf.writestr("xl/_rels/workbook.xml.rels", workbook_rels)
-        zf.writestr("xl/worksheets/sheet1.xml", sheet_xml)
-        zf.writestr("xl/styles.xml", styles)
+    write_xlsx(buffer, rows, sheet_name)
     return buffer.getvalue()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import html
+from itertools import groupby
+import logging
+from operator import itemgetter
+from typing import Any
+
+from .constants import NOTIFY_MODE_DIGEST, ORDER_STATUS_CLOSED
+from .db import Database
+from .notifications import Notifier
+from .services import section_masks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FANOUT_PAGE_SIZE = 500
+DEFAULT_DIGEST_INTERVAL = 3600.0
+# Сколько заказов перечисляется в одной сводке, чтобы не упереться в длину сообщения
+_DIGEST_MAX_ORDERS = 20
+
+
+def _order_label(order_id: int, name: str | None) -> str:
+    return f"{order_id} {html.escape(name or '')}".strip()
+
+
+def _order_text(order: dict[str, Any]) -> str:
+    return (
+        f"Новый заказ по вашим разделам: {_order_label(order['id'], order.get('name'))}. "
+        "Ознакомьтесь в разделе Возможные заказы в пункте Подбор"
+    )
+
+
+def _digest_text(rows: list[dict[str, Any]]) -> str:
+    lines = [_order_label(row["order_id"], row["name"]) for row in rows[:_DIGEST_MAX_ORDERS]]
+    if len(rows) > _DIGEST_MAX_ORDERS:
+        lines.append(f"и еще {len(rows) - _DIGEST_MAX_ORDERS}")
+    return (
+        "Новые заказы по вашим разделам:\n"
+        + "\n".join(lines)
+        + "\nОзнакомьтесь в разделе Возможные заказы в пункте Подбор"
+    )
+
+
+class OrderFanout:
+    """
+    Рассылка новых заказов исполнителям с подходящими разделами.
+
+    Database вызывает submit() после фиксации нового заказа, и рассылка идет в
+    отдельной задаче, поэтому сохранение заказа ее не ждет. Получатели читаются
+    страницами по page_size через индекс разделов, сообщения встают в очередь
+    рассылок Notifier с ожиданием места и уходят после сообщений обработчиков,
+    с общими лимитами. Исполнителям с режимом
+    «сводка» заказы приходят одним сообщением раз в digest_interval секунд.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        notifier: Notifier,
+        page_size: int = DEFAULT_FANOUT_PAGE_SIZE,
+        digest_interval: float = DEFAULT_DIGEST_INTERVAL,
+    ) -> None:
+        if page_size < 1 or digest_interval <= 0:
+            raise ValueError("page_size and digest_interval must be positive")
+        self.db = db
+        self.notifier = notifier
+        self.page_size = page_size
+        self.digest_interval = digest_interval
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._digest_task: asyncio.Task[None] | None = None
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+    def attach(self) -> None:
+        """Подписаться на новые заказы и запустить отправку сводок."""
+        self.db.add_order_created_listener(self.submit)
+        if self._digest_task is None:
+            self._digest_task = asyncio.create_task(self._digest_loop())
+
+    def submit(self, order: dict[str, Any]) -> None:
+        if self._closed or order.get("status") == ORDER_STATUS_CLOSED or order.get("assigned_executor_id"):
+            return
+        if section_masks(order) == (0, 0):
+            return
+        task = asyncio.create_task(self._run(order))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, order: dict[str, Any]) -> None:
+        try:
+            count = await self.fan_out(order)
+        except Exception:
+            logger.exception("Fan-out of order %s failed", order["id"])
+        else:
+            logger.info("Order %s sent to %s executors", order["id"], count)
+
+    async def fan_out(self, order: dict[str, Any]) -> int:
+        """Разослать заказ подходящим исполнителям; возвращает число получателей."""
+        text = _order_text(order)
+        count = 0
+        after = 0
+        while True:
+            rows = await self.db.list_order_recipients(order["id"], after, self.page_size)
+            digest = []
+            for row in rows:
+                if row["mode"] == NOTIFY_MODE_DIGEST:
+                    digest.append(row["user_id"])
+                else:
+                    await self.notifier.enqueue_bulk(row["tg_id"], text)
+            await self.db.add_order_digest(order["id"], digest)
+            count += len(rows)
+            if len(rows) < self.page_size:
+                return count
+            after = rows[-1]["user_id"]
+
+    async def send_digests(self) -> int:
+        """Отправить накопленные сводки; возвращает число сообщений."""
+        sent = 0
+        for _, group in groupby(await self.db.take_order_digest(), key=itemgetter("user_id")):
+            rows = list(group)
+            await self.notifier.enqueue_bulk(rows[0]["tg_id"], _digest_text(rows))
+            sent += 1
+        return sent
+
+    async def _digest_loop(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.digest_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._closed:
+                return
+            try:
+                await self.send_digests()
+            except Exception:
+                logger.exception("Order digest failed")
+
+    async def join(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Остановить рассылки; вызывается до закрытия Notifier."""
+        if self._closed:
+            return
+        # Сводки остаются в таблице и уйдут после перезапуска
+        self._closed = True
+        self._wakeup.set()
+        if self._digest_task is not None:
+            await self._digest_task
+            self._digest_task = None
+        if self._tasks:
+            logger.warning("%s order fan-outs interrupted on shutdown", len(self._tasks))
+            for task in list(self._tasks):
+                task.cancel()
+            await self.join()
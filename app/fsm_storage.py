@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import logging
+import time
+from typing import Any, AsyncGenerator, Callable, Mapping
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseEventIsolation,
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+
+from .cache import LRUCache
+from .db import Database
+from .locks import KeyedLock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FSM_TTL = 7 * 24 * 3600
+DEFAULT_FSM_FLUSH_INTERVAL = 1.0
+DEFAULT_FSM_CACHE_SIZE = 4096
+# Сколько измененных ключей копится до внеочередного сброса
+DEFAULT_FSM_MAX_PENDING = 1024
+_PURGE_INTERVAL = 3600.0
+
+
+class _Record:
+    __slots__ = ("state", "data", "updated_at")
+
+    def __init__(self, state: str | None, data: dict[str, Any], updated_at: float) -> None:
+        self.state = state
+        self.data = data
+        self.updated_at = updated_at
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+_EMPTY = _Record(None, {}, 0.0)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище FSM aiogram в таблице fsm_states той же базы.
+
+    Изменения копятся в памяти и сбрасываются пачкой раз в flush_interval секунд,
+    поэтому серия update_data от одного пользователя дает одну запись. Прочитанные
+    состояния держатся в LRU-кэше; состояния старше ttl считаются пустыми и
+    периодически удаляются из таблицы. Изменения одного ключа идут под замком:
+    чтение записи из БД и слияние с ней не перемешиваются с другими изменениями.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        key_builder: KeyBuilder | None = None,
+        ttl: float | None = DEFAULT_FSM_TTL,
+        flush_interval: float = DEFAULT_FSM_FLUSH_INTERVAL,
+        cache_size: int = DEFAULT_FSM_CACHE_SIZE,
+        max_pending: int = DEFAULT_FSM_MAX_PENDING,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.db = db
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._clock = clock
+        self._cache: LRUCache[str, _Record] = LRUCache(cache_size)
+        # Измененные записи и пачка, которая сейчас пишется в БД: читаются раньше кэша
+        self._dirty: dict[str, _Record] = {}
+        self._flushing: dict[str, _Record] = {}
+        self._flush_lock = asyncio.Lock()
+        self._key_locks: KeyedLock[str] = KeyedLock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._last_purge = 0.0
+        self._closed = False
+
+    def _expired(self, record: _Record) -> bool:
+        return self.ttl is not None and record.updated_at + self.ttl < self._clock()
+
+    async def _record(self, key: str) -> _Record:
+        record = self._dirty.get(key) or self._flushing.get(key) or self._cache.get(key)
+        if record is None:
+            row = await self.db.get_fsm_record(key)
+            record = _EMPTY if row is None else _Record(row["state"], json.loads(row["data"]), row["updated_at"])
+            # Пока шло чтение, ключ мог измениться и даже записаться: свежая запись важнее прочитанной
+            record = self._dirty.get(key) or self._flushing.get(key) or self._cache.get(key) or record
+            if key not in self._cache:
+                self._cache.set(key, record)
+        return _EMPTY if self._expired(record) else record
+
+    def _put(self, key: str, state: str | None, data: dict[str, Any]) -> None:
+        if self._closed:
+            raise RuntimeError("FSM storage is closed")
+        self._dirty[key] = _Record(state, data, self._clock())
+        self._cache.pop(key)
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+        if len(self._dirty) >= self.max_pending:
+            self._wakeup.set()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        name = self.key_builder.build(key)
+        value = state.state if isinstance(state, State) else state
+        async with self._key_locks.lock(name):
+            record = await self._record(name)
+            self._put(name, value, record.data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._record(self.key_builder.build(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        name = self.key_builder.build(key)
+        async with self._key_locks.lock(name):
+            record = await self._record(name)
+            self._put(name, record.state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return (await self._record(self.key_builder.build(key))).data.copy()
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        name = self.key_builder.build(key)
+        async with self._key_locks.lock(name):
+            record = await self._record(name)
+            merged = {**record.data, **data}
+            self._put(name, record.state, merged)
+        return merged.copy()
+
+    async def flush(self) -> None:
+        """Записать накопленные изменения одной пачкой."""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            self._flushing = batch
+            try:
+                records = []
+                deleted = []
+                for key, record in batch.items():
+                    if record.empty:
+                        deleted.append(key)
+                        continue
+                    try:
+                        data = json.dumps(record.data, ensure_ascii=False)
+                    except (TypeError, ValueError):
+                        # Состояние остается только в памяти, остальная пачка пишется
+                        logger.exception("FSM data for %s is not JSON serializable", key)
+                        continue
+                    records.append((key, record.state, data, record.updated_at))
+                await self.db.save_fsm_records(records, deleted)
+            except BaseException:
+                # Более новые изменения, пришедшие во время записи, не затираются
+                for key, record in batch.items():
+                    self._dirty.setdefault(key, record)
+                raise
+            finally:
+                self._flushing = {}
+            for key, record in batch.items():
+                if key not in self._dirty:
+                    self._cache.set(key, record)
+
+    async def purge(self) -> int:
+        """Удалить из таблицы состояния, не менявшиеся дольше ttl."""
+        if self.ttl is None:
+            return 0
+        self._last_purge = self._clock()
+        return await self.db.purge_fsm_records(self._last_purge - self.ttl)
+
+    async def _flush_loop(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if self.ttl is not None and self._clock() - self._last_purge >= _PURGE_INTERVAL:
+                    await self.purge()
+            except Exception:
+                logger.exception("FSM storage flush failed")
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        # Цикл останавливается сам, а не отменой: отмена посреди записи потеряла бы пачку
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+class KeyedEventIsolation(BaseEventIsolation):
+    """
+    Апдейты одного ключа FSM (чат и пользователь) обрабатываются по очереди, разных — параллельно.
+
+    Передается в Dispatcher(events_isolation=...): FSMContextMiddleware берет замок
+    до чтения состояния, поэтому при handle_as_tasks второй апдейт пользователя
+    видит состояние, выставленное первым. Замок существует, пока у ключа есть
+    апдейты в работе, и апдейты выполняются в порядке поступления.
+    """
+
+    def __init__(self) -> None:
+        # Без __len__: Dispatcher проверяет events_isolation на истинность, пустой объект заменился бы заглушкой
+        self._locks: KeyedLock[StorageKey] = KeyedLock()
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        async with self._locks.lock(key):
+            yield
+
+    async def close(self) -> None:
+        pass
@@ -20,7 +20,7 @@ from ..keyboards import (
     profile_customer_keyboard,
     responses_menu_keyboard,
 )
-from ..services import format_customer_profile, format_executor_card, format_order, has_match
+from ..services import format_customer_profile, format_executor_card, format_order
 from .common import show_customer_menu
 from .registration import start_order_flow
 
@@ -36,8 +36,7 @@ def _is_customer_context(user: dict) -> bool:
 
 
 @router.message(F.text == "Мой профиль")
-async def customer_profile(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def customer_profile(message: Message, db, user) -> None:
     if not _is_customer_context(user):
         return
     text = format_customer_profile(user)
@@ -45,8 +44,7 @@ async def customer_profile(message: Message, db) -> None:
 
 
 @router.message(F.text == "Открытые заказы")
-async def customer_open_orders(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def customer_open_orders(message: Message, db, user) -> None:
     if not _is_customer_context(user):
         return
     orders = await db.list_orders_by_customer(user["id"])
@@ -78,8 +76,7 @@ async def customer_open_orders(message: Message, db) -> None:
 
 
 @router.message(F.text == "Закрытые заказы")
-async def customer_closed_orders(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def customer_closed_orders(message: Message, db, user) -> None:
     if not _is_customer_context(user):
         return
     orders = await db.list_orders_by_customer(user["id"])
@@ -101,8 +98,7 @@ async def customer_closed_orders(message: Message, db) -> None:
 
 
 @router.message(F.text == "Рейтинг")
-async def customer_rating(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def customer_rating(message: Message, db, user) -> None:
     if not _is_customer_context(user):
         return
     avg, cnt = await db.get_rating_summary(user["id"])
@@ -110,16 +106,14 @@ async def customer_rating(message: Message, db) -> None:
 
 
 @router.message(F.text == "Помощь")
-async def customer_help(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def customer_help(message: Message, db, user) -> None:
     if not _is_customer_context(user):
         return
     await message.answer("Помощь", reply_markup=help_keyboard())
 
 
 @router.callback_query(F.data == "become_executor")
-async def customer_become_executor(callback: CallbackQuery, db, state) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_become_executor(callback: CallbackQuery, db, state, user) -> None:
     if not user:
         await callback.answer()
         return
@@ -131,8 +125,7 @@ async def customer_become_executor(callback: CallbackQuery, db, state) -> None:
 
 
 @router.callback_query(F.data == "cust_back_main")
-async def customer_back_main(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_back_main(callback: CallbackQuery, db, user) -> None:
     if not _is_customer_context(user):
         await callback.answer()
         return
@@ -141,18 +134,16 @@ async def customer_back_main(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data == "cust_order_back_orders")
-async def customer_back_orders(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_back_orders(callback: CallbackQuery, db, user) -> None:
     if not _is_customer_context(user):
         await callback.answer()
         return
     await callback.answer()
-    await customer_open_orders(callback.message, db)
+    await customer_open_orders(callback.message, db, user)
 
 
 @router.callback_query(F.data == "cust_order_new")
-async def customer_new_order(callback: CallbackQuery, db, state) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_new_order(callback: CallbackQuery, db, state, user) -> None:
     if not _is_customer_context(user):
         await callback.answer()
         return
@@ -161,8 +152,7 @@ async def customer_new_order(callback: CallbackQuery, db, state) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_order:"))
-async def customer_order_detail(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_order_detail(callback: CallbackQuery, db, user) -> None:
     if not _is_customer_context(user):
         await callback.answer()
         return
@@ -187,8 +177,7 @@ async def customer_order_detail(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_order_edit:"))
-async def customer_order_edit(callback: CallbackQuery, db, state) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_order_edit(callback: CallbackQuery, db, state, user) -> None:
     if not _is_customer_context(user):
         await callback.answer()
         return
@@ -202,8 +191,7 @@ async def customer_order_edit(callback: CallbackQuery, db, state) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_order_responses:"))
-async def customer_order_responses(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_order_responses(callback: CallbackQuery, db, user) -> None:
     if not _is_customer_context(user):
         await callback.answer()
         return
@@ -220,8 +208,7 @@ async def customer_order_responses(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_order_close:"))
-async def customer_order_close(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_order_close(callback: CallbackQuery, db, user) -> None:
     if not _is_customer_context(user):
         await callback.answer()
         return
@@ -239,8 +226,7 @@ async def customer_order_close(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_close_yes:"))
-async def customer_close_yes(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def customer_close_yes(callback: CallbackQuery, db, user, notifier) -> None:
     if not _is_customer_context(user):
         await callback.answer()
         return
@@ -253,7 +239,7 @@ async def customer_close_yes(callback: CallbackQuery, db) -> None:
         await db.set_order_status(order_id, ORDER_STATUS_CLOSING_BY_CUSTOMER)
         executor = await db.get_user_by_id(order.get("assigned_executor_id"))
         if executor and executor.get("tg_id"):
-            await callback.bot.send_message(
+            await notifier.enqueue(
                 executor["tg_id"],
                 f"Добрый день! Заказчик закрыл заказ {order_id} {html.escape(order.get('name','') or '')}. Подтвердите закрытие.",
                 reply_markup=InlineKeyboardMarkup(
@@ -270,30 +256,12 @@ async def customer_close_yes(callback: CallbackQuery, db) -> None:
 
 
 async def _next_executor_candidate(order_id: int, db) -> dict | None:
-    order = await db.get_order(order_id)
-    if not order:
-        return None
-    if order.get("assigned_executor_id"):
-        return None
-    matches = await db.list_matches_for_order(order_id)
-    seen = {m["executor_id"] for m in matches if m.get("customer_decision")}
-    declined_by_executor = {m["executor_id"] for m in matches if m.get("executor_decision") == MATCH_DECISION_DECLINED}
-    executors = await db.list_executor_profiles()
-    for executor in executors:
-        if executor.get("blocked"):
-            continue
-        if executor["user_id"] in seen or executor["user_id"] in declined_by_executor:
-            continue
-        if not has_match(order, executor):
-            continue
-        return executor
-    return None
+    return await db.next_executor_candidate(order_id)
 
 
 @router.callback_query(F.data.startswith("cust_order_responses_new:"))
-async def customer_responses_new(callback: CallbackQuery, db) -> None:
+async def customer_responses_new(callback: CallbackQuery, db, user) -> None:
     order_id = int(callback.data.split(":", 1)[1])
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     order = await db.get_order(order_id)
     if not user or not order or order.get("customer_id") != user.get("id"):
         await callback.answer("Заказ не найден", show_alert=True)
@@ -327,11 +295,10 @@ async def customer_responses_new(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_candidate_yes:"))
-async def customer_candidate_yes(callback: CallbackQuery, db) -> None:
+async def customer_candidate_yes(callback: CallbackQuery, db, user, notifier) -> None:
     _, order_id, executor_id = callback.data.split(":")
     order_id = int(order_id)
     executor_id = int(executor_id)
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     order = await db.get_order(order_id)
     if not user or not order or order.get("customer_id") != user.get("id"):
         await callback.answer("Недостаточно прав", show_alert=True)
@@ -339,38 +306,36 @@ async def customer_candidate_yes(callback: CallbackQuery, db) -> None:
     await db.upsert_match(order_id, executor_id, customer_decision=MATCH_DECISION_LIKED)
     executor = await db.get_user_by_id(executor_id)
     if executor and executor.get("tg_id"):
-        await callback.bot.send_message(
+        await notifier.enqueue(
             executor["tg_id"],
             "Добрый день! Вас выбрали исполнителем. Ознакомитесь в разделе Возможные заказы в пункте Вас выбрали",
         )
     await callback.answer("Добавлено в принятые")
-    await customer_responses_new(callback, db)
+    await customer_responses_new(callback, db, user)
 
 
 @router.callback_query(F.data.startswith("cust_candidate_no:"))
-async def customer_candidate_no(callback: CallbackQuery, db) -> None:
+async def customer_candidate_no(callback: CallbackQuery, db, user) -> None:
     _, order_id, executor_id = callback.data.split(":")
     order_id = int(order_id)
     executor_id = int(executor_id)
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     order = await db.get_order(order_id)
     if not user or not order or order.get("customer_id") != user.get("id"):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
     await db.upsert_match(order_id, executor_id, customer_decision=MATCH_DECISION_DECLINED)
     await callback.answer("Добавлено в отказанные")
-    await customer_responses_new(callback, db)
+    await customer_responses_new(callback, db, user)
 
 
 @router.callback_query(F.data.startswith("cust_order_responses_liked:"))
-async def customer_responses_liked(callback: CallbackQuery, db) -> None:
+async def customer_responses_liked(callback: CallbackQuery, db, user) -> None:
     order_id = int(callback.data.split(":", 1)[1])
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     order = await db.get_order(order_id)
     if not user or not order or order.get("customer_id") != user.get("id"):
         await callback.answer("Заказ не найден", show_alert=True)
         return
-    matches = await db.list_customer_likes(order_id)
+    matches = await db.list_matches_with_executors(order_id, MATCH_DECISION_LIKED)
     if not matches:
         await callback.message.edit_text(
             "Принятых исполнителей нет.",
@@ -383,13 +348,12 @@ async def customer_responses_liked(callback: CallbackQuery, db) -> None:
     lines = []
     buttons = []
     for match in matches:
-        executor = await db.get_user_by_id(match["executor_id"])
         status = "принял" if match.get("executor_decision") == MATCH_DECISION_LIKED else "ожидает"
-        phone_line = f"Телефон: {executor.get('phone','-')}" if match.get("executor_decision") == MATCH_DECISION_LIKED else ""
+        phone_line = f"Телефон: {match.get('executor_phone') or '-'}" if match.get("executor_decision") == MATCH_DECISION_LIKED else ""
 
-        first_name_raw = executor.get("first_name", "") or ""
+        first_name_raw = match.get("executor_first_name") or ""
         first_name = html.escape(first_name_raw)
-        last_name = html.escape(executor.get("last_name", "") or "")
+        last_name = html.escape(match.get("executor_last_name") or "")
 
         lines.append(
             f"{first_name} {last_name} - {status} {phone_line}".strip()
@@ -399,7 +363,7 @@ async def customer_responses_liked(callback: CallbackQuery, db) -> None:
                 [
                     InlineKeyboardButton(
                         text=f"Подтвердить: {first_name_raw}",
-                        callback_data=f"cust_confirm_exec:{order_id}:{executor['id']}",
+                        callback_data=f"cust_confirm_exec:{order_id}:{match['executor_id']}",
                     )
                 ]
             )
@@ -412,11 +376,10 @@ async def customer_responses_liked(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_confirm_exec:"))
-async def customer_confirm_executor(callback: CallbackQuery, db) -> None:
+async def customer_confirm_executor(callback: CallbackQuery, db, user, notifier) -> None:
     _, order_id, executor_id = callback.data.split(":")
     order_id = int(order_id)
     executor_id = int(executor_id)
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     order = await db.get_order(order_id)
     if not user or not order or order.get("customer_id") != user.get("id"):
         await callback.answer("Недостаточно прав", show_alert=True)
@@ -425,7 +388,7 @@ async def customer_confirm_executor(callback: CallbackQuery, db) -> None:
     await callback.answer("Исполнитель подтвержден")
     executor = await db.get_user_by_id(executor_id)
     if executor and executor.get("tg_id"):
-        await callback.bot.send_message(
+        await notifier.enqueue(
             executor["tg_id"],
             f"Заказчик подтвердил исполнителя по заказу {order_id} {html.escape(order.get('name','') or '')}.",
         )
@@ -433,14 +396,13 @@ async def customer_confirm_executor(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_order_responses_declined:"))
-async def customer_responses_declined(callback: CallbackQuery, db) -> None:
+async def customer_responses_declined(callback: CallbackQuery, db, user) -> None:
     order_id = int(callback.data.split(":", 1)[1])
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     order = await db.get_order(order_id)
     if not user or not order or order.get("customer_id") != user.get("id"):
         await callback.answer("Заказ не найден", show_alert=True)
         return
-    matches = await db.list_customer_declines(order_id)
+    matches = await db.list_matches_with_executors(order_id, MATCH_DECISION_DECLINED)
     if not matches:
         await callback.message.edit_text(
             "Отказанных исполнителей нет.",
@@ -453,16 +415,15 @@ async def customer_responses_declined(callback: CallbackQuery, db) -> None:
     buttons = []
     lines = []
     for match in matches:
-        executor = await db.get_user_by_id(match["executor_id"])
-        first_name_raw = executor.get("first_name", "") or ""
+        first_name_raw = match.get("executor_first_name") or ""
         first_name = html.escape(first_name_raw)
-        last_name = html.escape(executor.get("last_name", "") or "")
+        last_name = html.escape(match.get("executor_last_name") or "")
         lines.append(f"{first_name} {last_name}")
         buttons.append(
             [
                 InlineKeyboardButton(
                     text=f"Изменить решение: {first_name_raw}",
-                    callback_data=f"cust_change_decision:{order_id}:{executor['id']}",
+                    callback_data=f"cust_change_decision:{order_id}:{match['executor_id']}",
                 )
             ]
         )
@@ -472,11 +433,10 @@ async def customer_responses_declined(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_change_decision:"))
-async def customer_change_decision(callback: CallbackQuery, db) -> None:
+async def customer_change_decision(callback: CallbackQuery, db, user, notifier) -> None:
     _, order_id, executor_id = callback.data.split(":")
     order_id = int(order_id)
     executor_id = int(executor_id)
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     order = await db.get_order(order_id)
     if not user or not order or order.get("customer_id") != user.get("id"):
         await callback.answer("Недостаточно прав", show_alert=True)
@@ -485,7 +445,7 @@ async def customer_change_decision(callback: CallbackQuery, db) -> None:
     await callback.answer("Исполнитель добавлен в принятые")
     executor = await db.get_user_by_id(executor_id)
     if executor and executor.get("tg_id"):
-        await callback.bot.send_message(
+        await notifier.enqueue(
             executor["tg_id"],
             "Добрый день! Вас выбрали исполнителем. Ознакомитесь в разделе Возможные заказы в пункте Вас выбрали",
         )
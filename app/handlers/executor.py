@@ -8,6 +8,7 @@ from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMar
 from ..constants import (
     MATCH_DECISION_DECLINED,
     MATCH_DECISION_LIKED,
+    NOTIFY_MODES,
     ORDER_STATUS_CLOSED,
     ORDER_STATUS_CLOSING_BY_EXECUTOR,
     ROLE_EXECUTOR,
@@ -20,7 +21,7 @@ from ..keyboards import (
     profile_executor_keyboard,
     rating_keyboard,
 )
-from ..services import format_executor_profile, format_order, has_match
+from ..services import format_executor_profile, format_order, section_masks
 from .common import show_executor_menu
 from .registration import start_customer_registration, start_executor_edit
 
@@ -36,26 +37,39 @@ def _is_executor_context(user: dict) -> bool:
 
 
 @router.message(F.text == "Мой профиль")
-async def executor_profile(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def executor_profile(message: Message, db, user, order_fanout=None) -> None:
     if not _is_executor_context(user):
         return
     profile = await db.get_executor_profile(user["id"])
     text = format_executor_profile(user, profile or {})
-    await message.answer(text, reply_markup=profile_executor_keyboard(not user.get("is_customer")))
+    # Переключатель уведомлений виден, только если рассылка новых заказов включена
+    notify_mode = await db.get_notify_mode(user["id"]) if order_fanout is not None else None
+    await message.answer(text, reply_markup=profile_executor_keyboard(not user.get("is_customer"), notify_mode))
+
+
+@router.callback_query(F.data == "exec_notify_mode")
+async def executor_notify_mode(callback: CallbackQuery, db, user, order_fanout=None) -> None:
+    if not _is_executor_context(user) or order_fanout is None:
+        await callback.answer()
+        return
+    current = await db.get_notify_mode(user["id"])
+    mode = NOTIFY_MODES[(NOTIFY_MODES.index(current) + 1) % len(NOTIFY_MODES)]
+    await db.set_notify_mode(user["id"], mode)
+    await callback.message.edit_reply_markup(
+        reply_markup=profile_executor_keyboard(not user.get("is_customer"), mode)
+    )
+    await callback.answer()
 
 
 @router.message(F.text == "Возможные заказы")
-async def executor_possible_orders(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def executor_possible_orders(message: Message, db, user) -> None:
     if not _is_executor_context(user):
         return
     await message.answer("Возможные заказы", reply_markup=possible_orders_keyboard())
 
 
 @router.message(F.text == "Открытые заказы")
-async def executor_open_orders(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def executor_open_orders(message: Message, db, user) -> None:
     if not _is_executor_context(user):
         return
     orders = await db.list_orders_for_executor(user["id"])
@@ -76,19 +90,15 @@ async def executor_open_orders(message: Message, db) -> None:
 
 
 @router.message(F.text == "Закрытые заказы")
-async def executor_closed_orders(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def executor_closed_orders(message: Message, db, user) -> None:
     if not _is_executor_context(user):
         return
     orders = await db.list_closed_orders_for_user(user["id"], role="executor")
     order_ids = {o["id"] for o in orders}
-    matches = await db.list_matches_for_executor(user["id"])
-    for match in matches:
-        if match.get("executor_decision") == MATCH_DECISION_DECLINED:
-            order = await db.get_order(match["order_id"])
-            if order and order["id"] not in order_ids:
-                orders.append(order)
-                order_ids.add(order["id"])
+    for order in await db.list_orders_declined_by_executor(user["id"]):
+        if order["id"] not in order_ids:
+            orders.append(order)
+            order_ids.add(order["id"])
     if not orders:
         await message.answer("Закрытых заказов нет.")
         return
@@ -106,8 +116,7 @@ async def executor_closed_orders(message: Message, db) -> None:
 
 
 @router.message(F.text == "Рейтинг")
-async def executor_rating(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def executor_rating(message: Message, db, user) -> None:
     if not _is_executor_context(user):
         return
     avg, cnt = await db.get_rating_summary(user["id"])
@@ -115,16 +124,14 @@ async def executor_rating(message: Message, db) -> None:
 
 
 @router.message(F.text == "Помощь")
-async def executor_help(message: Message, db) -> None:
-    user = await db.get_user_by_tg_id(message.from_user.id)
+async def executor_help(message: Message, db, user) -> None:
     if not _is_executor_context(user):
         return
     await message.answer("Помощь", reply_markup=help_keyboard())
 
 
 @router.callback_query(F.data == "become_customer")
-async def executor_become_customer(callback: CallbackQuery, db, state) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def executor_become_customer(callback: CallbackQuery, db, state, user) -> None:
     if not user:
         await callback.answer()
         return
@@ -134,8 +141,7 @@ async def executor_become_customer(callback: CallbackQuery, db, state) -> None:
 
 
 @router.callback_query(F.data == "edit_executor")
-async def executor_edit(callback: CallbackQuery, db, state) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def executor_edit(callback: CallbackQuery, db, state, user) -> None:
     if not _is_executor_context(user):
         await callback.answer()
         return
@@ -144,8 +150,7 @@ async def executor_edit(callback: CallbackQuery, db, state) -> None:
 
 
 @router.callback_query(F.data == "exec_back_main")
-async def exec_back_main(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_back_main(callback: CallbackQuery, db, user) -> None:
     if not _is_executor_context(user):
         await callback.answer()
         return
@@ -154,18 +159,16 @@ async def exec_back_main(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data == "exec_order_back_orders")
-async def exec_back_orders(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_back_orders(callback: CallbackQuery, db, user) -> None:
     if not _is_executor_context(user):
         await callback.answer()
         return
     await callback.answer()
-    await executor_open_orders(callback.message, db)
+    await executor_open_orders(callback.message, db, user)
 
 
 @router.callback_query(F.data.startswith("exec_order:"))
-async def exec_order_detail(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_order_detail(callback: CallbackQuery, db, user) -> None:
     if not _is_executor_context(user):
         await callback.answer()
         return
@@ -209,8 +212,7 @@ async def exec_order_close(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("exec_close_yes:"))
-async def exec_close_yes(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_close_yes(callback: CallbackQuery, db, user, notifier) -> None:
     if not _is_executor_context(user):
         await callback.answer()
         return
@@ -225,7 +227,7 @@ async def exec_close_yes(callback: CallbackQuery, db) -> None:
     await db.set_order_status(order_id, ORDER_STATUS_CLOSING_BY_EXECUTOR)
     customer = await db.get_user_by_id(order["customer_id"])
     if customer and customer.get("tg_id"):
-        await callback.bot.send_message(
+        await notifier.enqueue(
             customer["tg_id"],
         f"Добрый день! Исполнитель закрыл заказ {order_id} {html.escape(order.get('name','') or '')}. Подтвердите закрытие.",
             reply_markup=InlineKeyboardMarkup(
@@ -239,18 +241,11 @@ async def exec_close_yes(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data == "exec_chosen_list")
-async def exec_chosen_list(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_chosen_list(callback: CallbackQuery, db, user) -> None:
     if not _is_executor_context(user):
         await callback.answer()
         return
-    matches = await db.list_matches_for_executor(user["id"])
-    orders = []
-    for match in matches:
-        if match.get("customer_decision") == MATCH_DECISION_LIKED and not match.get("executor_decision"):
-            order = await db.get_order(match["order_id"])
-            if order:
-                orders.append(order)
+    orders = await db.list_chosen_orders_for_executor(user["id"])
     if not orders:
         await callback.message.edit_text(
             "Нет заказов, где вас выбрали.",
@@ -292,15 +287,14 @@ async def exec_chosen_order(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("exec_chosen_yes:"))
-async def exec_chosen_yes(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_chosen_yes(callback: CallbackQuery, db, user, notifier) -> None:
     order_id = int(callback.data.split(":", 1)[1])
     await db.upsert_match(order_id, user["id"], executor_decision=MATCH_DECISION_LIKED)
     order = await db.get_order(order_id)
     if order:
         customer = await db.get_user_by_id(order["customer_id"])
         if customer and customer.get("tg_id"):
-            await callback.bot.send_message(
+            await notifier.enqueue(
                 customer["tg_id"],
                 f"Исполнитель принял заказ {order_id} {html.escape(order.get('name','') or '')}.",
             )
@@ -309,40 +303,51 @@ async def exec_chosen_yes(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("exec_chosen_no:"))
-async def exec_chosen_no(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_chosen_no(callback: CallbackQuery, db, user) -> None:
     order_id = int(callback.data.split(":", 1)[1])
     await db.upsert_match(order_id, user["id"], executor_decision=MATCH_DECISION_DECLINED)
     await callback.message.edit_text("Заказ отклонен.")
     await callback.answer()
 
 
-async def _next_order_candidate(executor_id: int, db) -> dict | None:
+async def _next_order_candidate(executor_id: int, db, matching=None) -> dict | None:
+    if matching is not None and matching.has_session(executor_id):
+        order_id = matching.current(executor_id)
+        return await db.get_order(order_id) if order_id is not None else None
     profile = await db.get_executor_profile(executor_id)
     if not profile:
         return None
-    orders = await db.list_open_orders()
+    capital_mask, linear_mask = section_masks(profile)
+    if matching is not None:
+        matches = await db.list_matches_for_executor(executor_id)
+        seen = {m["order_id"] for m in matches if m.get("executor_decision")}
+        order_id = matching.start_session(executor_id, capital_mask, linear_mask, seen)
+        return await db.get_order(order_id) if order_id is not None else None
+    orders = await db.list_open_orders_matching(capital_mask, linear_mask)
     matches = await db.list_matches_for_executor(executor_id)
     seen = {m["order_id"] for m in matches if m.get("executor_decision")}
     for order in orders:
-        if order.get("assigned_executor_id"):
-            continue
         if order["customer_id"] == executor_id:
             continue
         if order["id"] in seen:
             continue
-        if has_match(order, profile):
-            return order
+        return order
     return None
 
 
 @router.callback_query(F.data == "exec_match_list")
-async def exec_match_list(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_match_list(callback: CallbackQuery, db, user, matching=None) -> None:
+    if matching is not None and user:
+        # Вход из меню открывает новую сессию просмотра
+        matching.end_session(user["id"])
+    await _show_next_order(callback, db, user, matching)
+
+
+async def _show_next_order(callback: CallbackQuery, db, user: dict | None, matching=None) -> None:
     if not _is_executor_context(user):
         await callback.answer()
         return
-    order = await _next_order_candidate(user["id"], db)
+    order = await _next_order_candidate(user["id"], db, matching)
     if not order:
         await callback.message.edit_text(
             "Доступные заказы закончились",
@@ -368,35 +373,36 @@ async def exec_match_list(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("exec_match_yes:"))
-async def exec_match_yes(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_match_yes(callback: CallbackQuery, db, user, notifier, matching=None) -> None:
     order_id = int(callback.data.split(":", 1)[1])
     await db.upsert_match(order_id, user["id"], executor_decision=MATCH_DECISION_LIKED)
+    if matching is not None:
+        matching.advance(user["id"], order_id)
     order = await db.get_order(order_id)
     customer = await db.get_user_by_id(order["customer_id"])
     if customer and customer.get("tg_id"):
-        await callback.bot.send_message(
+        await notifier.enqueue(
             customer["tg_id"],
             f"Исполнитель откликнулся на заказ {order_id} {html.escape(order.get('name','') or '')}.",
         )
     await callback.answer("Отклик отправлен")
-    await exec_match_list(callback, db)
+    await _show_next_order(callback, db, user, matching)
 
 
 @router.callback_query(F.data.startswith("exec_match_no:"))
-async def exec_match_no(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def exec_match_no(callback: CallbackQuery, db, user, matching=None) -> None:
     order_id = int(callback.data.split(":", 1)[1])
     await db.upsert_match(order_id, user["id"], executor_decision=MATCH_DECISION_DECLINED)
+    if matching is not None:
+        matching.advance(user["id"], order_id)
     await callback.answer("Отклонено")
-    await exec_match_list(callback, db)
+    await _show_next_order(callback, db, user, matching)
 
 
 @router.callback_query(F.data.startswith("exec_close_confirm:"))
-async def exec_close_confirm(callback: CallbackQuery, db) -> None:
+async def exec_close_confirm(callback: CallbackQuery, db, user, notifier) -> None:
     order_id = int(callback.data.split(":", 1)[1])
     order = await db.get_order(order_id)
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     if not order or not user or order.get("assigned_executor_id") != user.get("id"):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
@@ -405,7 +411,7 @@ async def exec_close_confirm(callback: CallbackQuery, db) -> None:
     if order and order.get("assigned_executor_id"):
         customer = await db.get_user_by_id(order["customer_id"])
         if customer and customer.get("tg_id"):
-            await callback.bot.send_message(
+            await notifier.enqueue(
                 customer["tg_id"],
                 "Заказ закрыт. Оцените исполнителя.",
                 reply_markup=rating_keyboard(f"rate:{order_id}:{order.get('assigned_executor_id')}"),
@@ -414,10 +420,9 @@ async def exec_close_confirm(callback: CallbackQuery, db) -> None:
 
 
 @router.callback_query(F.data.startswith("cust_close_confirm:"))
-async def cust_close_confirm(callback: CallbackQuery, db) -> None:
+async def cust_close_confirm(callback: CallbackQuery, db, user, notifier) -> None:
     order_id = int(callback.data.split(":", 1)[1])
     order = await db.get_order(order_id)
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     if not order or not user or order.get("customer_id") != user.get("id"):
         await callback.answer("Недостаточно прав", show_alert=True)
         return
@@ -428,7 +433,7 @@ async def cust_close_confirm(callback: CallbackQuery, db) -> None:
         if executor_id:
             executor = await db.get_user_by_id(executor_id)
             if executor and executor.get("tg_id"):
-                await callback.bot.send_message(
+                await notifier.enqueue(
                     executor["tg_id"],
                     "Заказ закрыт. Оцените заказчика.",
                     reply_markup=rating_keyboard(f"rate:{order_id}:{order.get('customer_id')}"),
@@ -10,8 +10,7 @@ router = Router()
 
 
 @router.callback_query(F.data == "help_new")
-async def help_new(callback: CallbackQuery, state: FSMContext, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def help_new(callback: CallbackQuery, state: FSMContext, db, user) -> None:
     if not user:
         await callback.answer()
         return
@@ -22,7 +21,7 @@ async def help_new(callback: CallbackQuery, state: FSMContext, db) -> None:
 
 
 @router.message(HelpState.waiting_text)
-async def help_text(message: Message, state: FSMContext, db) -> None:
+async def help_text(message: Message, state: FSMContext, db, notifier) -> None:
     text = (message.text or "").strip()
     if not text:
         await message.answer("Сообщение не может быть пустым")
@@ -32,7 +31,7 @@ async def help_text(message: Message, state: FSMContext, db) -> None:
     admins = [u for u in await db.list_users() if u.get("is_admin")]
     for admin in admins:
         if admin.get("tg_id"):
-            await message.bot.send_message(
+            await notifier.enqueue(
                 admin["tg_id"],
                 f"Новое сообщение в помощь от {message.from_user.full_name} ({data.get('role')}):\n{text}",
             )
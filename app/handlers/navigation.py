@@ -10,8 +10,7 @@ router = Router()
 
 
 @router.callback_query(F.data == "back_main")
-async def back_main(callback: CallbackQuery, db) -> None:
-    user = await db.get_user_by_tg_id(callback.from_user.id)
+async def back_main(callback: CallbackQuery, db, user) -> None:
     if not user:
         await callback.answer()
         return
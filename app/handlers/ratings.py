@@ -27,12 +27,11 @@ async def rate_callback(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @router.message(RatingState.waiting_review)
-async def rate_review(message: Message, state: FSMContext, db) -> None:
+async def rate_review(message: Message, state: FSMContext, db, user) -> None:
     data = await state.get_data()
     review = (message.text or "").strip()
     if review == "-":
         review = None
-    user = await db.get_user_by_tg_id(message.from_user.id)
     if not user:
         await message.answer("Пользователь не найден.")
         await state.clear()
@@ -425,23 +425,12 @@ async def order_files(message: Message, state: FSMContext, db) -> None:
     data = await state.get_data()
     flow = data.get("flow")
     user_id = data.get("user_id")
-    if flow == "customer_registration":
-        phone = data.get("phone")
-        tg_id = data.get("tg_id")
-        user = await db.get_user_by_phone(phone)
-        if not user:
-            user = await db.create_user(tg_id, phone)
-        await db.update_user_profile(user["id"], data.get("first_name"), data.get("last_name"), data.get("org_name"))
-        await db.set_user_roles(user["id"], is_customer=True)
-        user_id = user["id"]
-    elif flow == "new_order":
+    if flow == "new_order":
         user = await db.get_user_by_id(user_id)
         if not user:
             await state.clear()
             await message.answer("Пользователь не найден. Начните сначала.")
             return
-    elif flow == "edit_order":
-        pass
 
     order_payload = {
         "name": data.get("order_name"),
@@ -472,7 +461,16 @@ async def order_files(message: Message, state: FSMContext, db) -> None:
         )
         return
 
-    await db.create_order(user_id, order_payload)
+    async with db.transaction():
+        if flow == "customer_registration":
+            phone = data.get("phone")
+            user = await db.get_user_by_phone(phone)
+            if not user:
+                user = await db.create_user(data.get("tg_id"), phone)
+            await db.update_user_profile(user["id"], data.get("first_name"), data.get("last_name"), data.get("org_name"))
+            await db.set_user_roles(user["id"], is_customer=True)
+            user_id = user["id"]
+        await db.create_order(user_id, order_payload)
     await message.answer("Заказ создан.")
     await state.clear()
     user = await db.get_user_by_id(user_id)
@@ -480,7 +478,7 @@ async def order_files(message: Message, state: FSMContext, db) -> None:
 
 
 @router.callback_query(F.data.startswith("order_save:"))
-async def order_save(callback: CallbackQuery, state: FSMContext, db) -> None:
+async def order_save(callback: CallbackQuery, state: FSMContext, db, user) -> None:
     data = await state.get_data()
     order_id = data.get("edit_order_id")
     payload = data.get("pending_order_payload")
@@ -489,7 +487,6 @@ async def order_save(callback: CallbackQuery, state: FSMContext, db) -> None:
         return
     await db.update_order(order_id, payload)
     await state.clear()
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     await callback.message.edit_text("Заказ обновлен.")
     if user:
         await show_customer_menu(callback.message, user, db)
@@ -511,9 +508,8 @@ async def order_discard(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @router.callback_query(F.data == "order_discard_no")
-async def order_discard_no(callback: CallbackQuery, state: FSMContext, db) -> None:
+async def order_discard_no(callback: CallbackQuery, state: FSMContext, db, user) -> None:
     await state.clear()
-    user = await db.get_user_by_tg_id(callback.from_user.id)
     if user:
         await show_customer_menu(callback.message, user, db)
     await callback.answer()
@@ -526,29 +522,30 @@ async def _finish_executor_registration(message: Message, state: FSMContext, db)
     tg_id = data.get("tg_id")
     user = None
     if flow in {"executor_registration", "executor_edit"}:
-        if phone:
-            user = await db.get_user_by_phone(phone)
-        if not user and data.get("user_id"):
-            user = await db.get_user_by_id(data.get("user_id"))
-        if not user:
-            user = await db.create_user(tg_id, phone)
-        await db.update_user_profile(
-            user["id"],
-            data.get("first_name") or user.get("first_name") or "-",
-            data.get("last_name") or user.get("last_name") or "-",
-            data.get("org_name"),
-        )
-        await db.set_user_roles(user["id"], is_executor=True)
-        await db.upsert_executor_profile(
-            user["id"],
-            data.get("experience"),
-            data.get("resume_link"),
-            data.get("resume_text"),
-            data.get("doc_types", []),
-            data.get("construction_types", []),
-            data.get("sections_capital", []),
-            data.get("sections_linear", []),
-        )
+        async with db.transaction():
+            if phone:
+                user = await db.get_user_by_phone(phone)
+            if not user and data.get("user_id"):
+                user = await db.get_user_by_id(data.get("user_id"))
+            if not user:
+                user = await db.create_user(tg_id, phone)
+            await db.update_user_profile(
+                user["id"],
+                data.get("first_name") or user.get("first_name") or "-",
+                data.get("last_name") or user.get("last_name") or "-",
+                data.get("org_name"),
+            )
+            await db.set_user_roles(user["id"], is_executor=True)
+            await db.upsert_executor_profile(
+                user["id"],
+                data.get("experience"),
+                data.get("resume_link"),
+                data.get("resume_text"),
+                data.get("doc_types", []),
+                data.get("construction_types", []),
+                data.get("sections_capital", []),
+                data.get("sections_linear", []),
+            )
         await state.clear()
         await message.answer("Профиль исполнителя сохранен.")
         await show_executor_menu(message, user, db)
@@ -22,9 +22,8 @@ INTRO_TEXT = (
 
 
 @router.message(CommandStart())
-async def command_start(message: Message, state: FSMContext, db, config) -> None:
+async def command_start(message: Message, state: FSMContext, db, config, user) -> None:
     await state.clear()
-    user = await db.get_user_by_tg_id(message.from_user.id)
     if user:
         if user.get("blocked"):
             await message.answer("Вы заблокированы администрацией.")
@@ -100,13 +99,13 @@ async def admin_code_entered(message: Message, state: FSMContext, db, config) ->
     if code != config.admin_code:
         await message.answer("Неверный код. Попробуйте еще раз.")
         return
-    user = await db.get_user_by_phone(phone)
-    if not user:
-        user = await db.create_user(tg_id, phone)
-    await db.set_user_roles(user["id"], is_admin=True)
-    await db.update_user_tg(user["id"], tg_id)
+    async with db.transaction():
+        user = await db.get_user_by_phone(phone)
+        if not user:
+            user = await db.create_user(tg_id, phone)
+        await db.update_user_tg(user["id"], tg_id)
+        user = await db.set_user_roles(user["id"], is_admin=True)
     await state.clear()
-    user = await db.get_user_by_phone(phone)
     await show_admin_menu(message, user, db)
 
 
@@ -125,18 +124,16 @@ async def choose_executor(message: Message, state: FSMContext, db) -> None:
 
 
 @router.message(F.text == "Заказчик")
-async def switch_to_customer(message: Message, state: FSMContext, db) -> None:
+async def switch_to_customer(message: Message, state: FSMContext, db, user) -> None:
     if await state.get_state():
         return
-    user = await db.get_user_by_tg_id(message.from_user.id)
     if user and user.get("is_customer"):
         await show_customer_menu(message, user, db)
 
 
 @router.message(F.text == "Исполнитель")
-async def switch_to_executor(message: Message, state: FSMContext, db) -> None:
+async def switch_to_executor(message: Message, state: FSMContext, db, user) -> None:
     if await state.get_state():
         return
-    user = await db.get_user_by_tg_id(message.from_user.id)
     if user and user.get("is_executor"):
         await show_executor_menu(message, user, db)
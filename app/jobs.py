@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+import logging
+from typing import Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_CONCURRENCY = 1
+DEFAULT_REPORTS_PER_ADMIN = 1
+
+
+class ReportRunner:
+    """
+    Фоновые задачи формирования отчетов.
+
+    Обработчик ставит задачу и сразу отвечает пользователю. Одновременно
+    выполняется не больше concurrency задач, чтобы отчеты не занимали все
+    читающие соединения пула, и не больше per_owner задач одного владельца.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_REPORT_CONCURRENCY,
+        per_owner: int = DEFAULT_REPORTS_PER_ADMIN,
+    ) -> None:
+        if concurrency < 1 or per_owner < 1:
+            raise ValueError("report limits must be positive")
+        self.per_owner = per_owner
+        self._slots = asyncio.Semaphore(concurrency)
+        self._running: Counter[Hashable] = Counter()
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def running(self, owner: Hashable) -> int:
+        return self._running[owner]
+
+    def submit(
+        self,
+        owner: Hashable,
+        job: Callable[[], Awaitable[None]],
+        on_error: Callable[[], Awaitable[None]] | None = None,
+    ) -> bool:
+        """Запустить job в фоне; False, если у владельца уже per_owner задач."""
+        if self._running[owner] >= self.per_owner:
+            return False
+        self._running[owner] += 1
+        task = asyncio.create_task(self._run(owner, job, on_error))
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._finished(owner, done))
+        return True
+
+    def _finished(self, owner: Hashable, task: asyncio.Task[None]) -> None:
+        # Задача могла быть отменена до старта, поэтому счетчик снимается здесь, а не в _run
+        self._tasks.discard(task)
+        self._running[owner] -= 1
+        if self._running[owner] <= 0:
+            del self._running[owner]
+
+    async def _run(
+        self,
+        owner: Hashable,
+        job: Callable[[], Awaitable[None]],
+        on_error: Callable[[], Awaitable[None]] | None,
+    ) -> None:
+        try:
+            async with self._slots:
+                await job()
+        except Exception:
+            logger.exception("Report job for %s failed", owner)
+            if on_error is not None:
+                try:
+                    await on_error()
+                except Exception:
+                    logger.exception("Report error callback for %s failed", owner)
+
+    async def join(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await self.join()
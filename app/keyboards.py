@@ -7,6 +7,14 @@ from aiogram.types import (
     ReplyKeyboardMarkup,
 )
 
+from .constants import NOTIFY_MODE_DIGEST, NOTIFY_MODE_INSTANT, NOTIFY_MODE_OFF
+
+NOTIFY_MODE_LABELS = {
+    NOTIFY_MODE_INSTANT: "Новые заказы: сразу",
+    NOTIFY_MODE_DIGEST: "Новые заказы: сводкой",
+    NOTIFY_MODE_OFF: "Новые заказы: не присылать",
+}
+
 
 def start_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
@@ -61,6 +69,7 @@ def admin_main_keyboard() -> ReplyKeyboardMarkup:
             [KeyboardButton(text="Отчет по исполнителям")],
             [KeyboardButton(text="Отчет по принятым двум сторонами заказами")],
             [KeyboardButton(text="Статистика бота")],
+            [KeyboardButton(text="Полная выгрузка")],
         ],
         resize_keyboard=True,
     )
@@ -74,11 +83,14 @@ def profile_customer_keyboard(can_become_executor: bool) -> InlineKeyboardMarkup
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def profile_executor_keyboard(can_become_customer: bool) -> InlineKeyboardMarkup:
+def profile_executor_keyboard(can_become_customer: bool, notify_mode: str | None = None) -> InlineKeyboardMarkup:
     buttons = []
     if can_become_customer:
         buttons.append([InlineKeyboardButton(text="Стать заказчиком", callback_data="become_customer")])
     buttons.append([InlineKeyboardButton(text="Редактировать", callback_data="edit_executor")])
+    if notify_mode is not None:
+        # Кнопка переключает режимы по кругу
+        buttons.append([InlineKeyboardButton(text=NOTIFY_MODE_LABELS[notify_mode], callback_data="exec_notify_mode")])
     buttons.append([InlineKeyboardButton(text="Назад", callback_data="back_main")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class _Entry:
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        # Сколько задач держат или ждут замок; на нуле замок удаляется
+        self.users = 0
+
+
+class KeyedLock(Generic[K]):
+    """
+    Замки asyncio.Lock по ключу.
+
+    Замок существует, пока его кто-то держит или ждет, поэтому память не растет
+    с числом ключей. Ожидающие получают замок в порядке очереди.
+    """
+
+    def __init__(self) -> None:
+        self._locks: dict[K, _Entry] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def lock(self, key: K) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _Entry()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[key]
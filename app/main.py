@@ -6,13 +6,18 @@ import sys
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.utils.callback_answer import CallbackAnswerMiddleware
 
 from .config import load_config
 from .db import Database
+from .fanout import OrderFanout
+from .fsm_storage import KeyedEventIsolation, SQLiteStorage
+from .jobs import ReportRunner
+from .matching import MatchingEngine
 from .handlers import admin, customer, executor, help as help_handlers, navigation, ratings, registration, start
 from .middleware import BlockedMiddleware
+from .notifications import Notifier
+from .webhook import run_webhook
 
 
 async def main() -> None:
@@ -20,15 +25,61 @@ async def main() -> None:
     config = load_config()
 
     os.makedirs(os.path.dirname(config.db_path), exist_ok=True)
-    db = Database(config.db_path)
+    db = Database(
+        config.db_path,
+        pool_size=config.db_pool_size,
+        pragmas=config.db_pragmas,
+        write_batch_size=config.db_write_batch_size,
+        write_batch_delay=config.db_write_batch_delay_ms / 1000,
+        user_cache_size=config.user_cache_size,
+        user_cache_ttl=config.user_cache_ttl,
+        order_cache_size=config.order_cache_size,
+    )
     await db.init()
+    if not await db.health_check():
+        raise RuntimeError(f"Database {config.db_path} is not available")
     await db.seed_admin_whitelist(config.admin_phones)
+    # TTL 0 — сессии просмотра вытесняются только по размеру
+    matching = MatchingEngine(config.swipe_session_cache_size, config.swipe_session_ttl or None)
+    matching.attach(db)
+    await matching.load(db)
 
     bot = Bot(token=config.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    dp = Dispatcher(storage=MemoryStorage())
+    # TTL 0 — не удалять брошенные состояния
+    storage = SQLiteStorage(
+        db,
+        ttl=config.fsm_ttl or None,
+        flush_interval=config.fsm_flush_interval,
+        cache_size=config.fsm_cache_size,
+    )
+    # Апдейты обрабатываются задачами параллельно, но по одному на чат и пользователя
+    dp = Dispatcher(storage=storage, events_isolation=KeyedEventIsolation())
 
     dp["db"] = db
     dp["config"] = config
+    dp["matching"] = matching
+    report_runner = ReportRunner(config.report_concurrency, config.reports_per_admin)
+    dp["report_runner"] = report_runner
+    notifier = Notifier(
+        bot,
+        maxsize=config.notify_queue_size,
+        global_rate=config.notify_global_rate,
+        chat_rate=config.notify_chat_rate,
+    )
+    dp["notifier"] = notifier
+    if config.order_fanout:
+        order_fanout = OrderFanout(
+            db,
+            notifier,
+            page_size=config.order_fanout_page_size,
+            digest_interval=config.order_digest_interval,
+        )
+        order_fanout.attach()
+        dp["order_fanout"] = order_fanout
+        # Рассылка ставит сообщения в очередь уведомлений, поэтому останавливается раньше нее
+        dp.shutdown.register(order_fanout.close)
+    # Очередь уведомлений дописывается до того, как start_polling закроет сессию бота
+    dp.shutdown.register(notifier.close)
 
     dp.message.middleware(BlockedMiddleware())
     dp.callback_query.middleware(BlockedMiddleware())
@@ -43,7 +94,31 @@ async def main() -> None:
     dp.include_router(navigation.router)
     dp.include_router(ratings.router)
 
-    await dp.start_polling(bot)
+    try:
+        if config.run_mode == "webhook":
+            await run_webhook(
+                dp,
+                bot,
+                url=config.webhook_url + config.webhook_path,
+                path=config.webhook_path,
+                secret_token=config.webhook_secret,
+                host=config.webhook_host,
+                port=config.webhook_port,
+                max_connections=config.webhook_max_connections,
+                concurrency=config.update_concurrency or None,
+            )
+        else:
+            # Оставшийся от режима webhook вебхук не дал бы получать обновления опросом
+            await bot.delete_webhook()
+            await dp.start_polling(
+                bot,
+                handle_as_tasks=True,
+                tasks_concurrency_limit=config.update_concurrency or None,
+            )
+    finally:
+        await report_runner.close()
+        await storage.close()
+        await db.close()
 
 
 if __name__ == "__main__":
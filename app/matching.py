@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+import heapq
+import logging
+from typing import Any, Collection, Iterator
+
+from .cache import LRUCache
+from .constants import ORDER_STATUS_CLOSED
+from .services import masks_match, section_masks
+
+logger = logging.getLogger(__name__)
+
+# Ключ индекса: (вид строительства, раздел) — 0 для капитального, 1 для линейного,
+# раздел — номер бита в маске (индекс в app.constants)
+IndexKey = tuple[int, int]
+
+DEFAULT_SWIPE_SESSIONS = 1024
+DEFAULT_SWIPE_SESSION_TTL = 1800.0
+
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _keys(capital_mask: int, linear_mask: int) -> list[IndexKey]:
+    return [(0, bit) for bit in _bits(capital_mask)] + [(1, bit) for bit in _bits(linear_mask)]
+
+
+class SwipeCursor:
+    """Заранее посчитанная очередь заказов для одной сессии просмотра исполнителя."""
+
+    __slots__ = ("capital_mask", "linear_mask", "order_ids", "position")
+
+    def __init__(self, capital_mask: int, linear_mask: int, order_ids: list[int]) -> None:
+        self.capital_mask = capital_mask
+        self.linear_mask = linear_mask
+        self.order_ids = order_ids
+        self.position = 0
+
+
+class MatchingEngine:
+    """Инвертированный индекс открытых неназначенных заказов для подбора исполнителю."""
+
+    def __init__(
+        self, max_sessions: int = DEFAULT_SWIPE_SESSIONS, session_ttl: float | None = DEFAULT_SWIPE_SESSION_TTL
+    ) -> None:
+        self._index: dict[IndexKey, list[int]] = {}
+        # id заказа -> (заказчик, маска кап., маска лин.)
+        self._orders: dict[int, tuple[int, int, int]] = {}
+        # Вытесненная или истекшая сессия просто пересобирается при следующем показе
+        self._sessions: LRUCache[int, SwipeCursor] = LRUCache(max_sessions, session_ttl)
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._orders
+
+    async def load(self, db) -> None:
+        self._index.clear()
+        self._orders.clear()
+        self._sessions.clear()
+        for row in await db.list_open_order_masks():
+            self.update(row)
+        logger.info("Matching index loaded: %s open orders", len(self._orders))
+
+    def attach(self, db) -> None:
+        db.add_order_listener(self.update)
+        db.add_profile_listener(lambda profile: self.end_session(profile["user_id"]))
+        # Решения, принятые не из просмотра (например, в списке «Вас выбрали»), тоже убирают заказ из очереди
+        db.add_match_listener(lambda match: self.mark_seen(match["executor_id"], match["order_id"]))
+
+    def update(self, order: dict[str, Any]) -> None:
+        order_id = order["id"]
+        self.discard(order_id)
+        if order.get("status") == ORDER_STATUS_CLOSED or order.get("assigned_executor_id"):
+            return
+        capital_mask, linear_mask = section_masks(order)
+        if not capital_mask and not linear_mask:
+            return
+        self._orders[order_id] = (order["customer_id"], capital_mask, linear_mask)
+        for key in _keys(capital_mask, linear_mask):
+            insort(self._index.setdefault(key, []), order_id)
+        # Новый или измененный заказ может встать в середину очереди: такие сессии пересчитываются.
+        # Закрытые и назначенные заказы курсор пропускает сам, без пересчета
+        stale = [
+            executor_id
+            for executor_id, cursor in self._sessions.items()
+            if executor_id != order["customer_id"]
+            and masks_match((capital_mask, linear_mask), (cursor.capital_mask, cursor.linear_mask))
+        ]
+        for executor_id in stale:
+            self._sessions.pop(executor_id)
+
+    def discard(self, order_id: int) -> None:
+        entry = self._orders.pop(order_id, None)
+        if entry is None:
+            return
+        _, capital_mask, linear_mask = entry
+        for key in _keys(capital_mask, linear_mask):
+            ids = self._index[key]
+            del ids[bisect_left(ids, order_id)]
+            if not ids:
+                del self._index[key]
+
+    def candidates(self, executor_id: int, capital_mask: int, linear_mask: int) -> Iterator[int]:
+        """Подходящие заказы по возрастанию id, без собственных заказов исполнителя."""
+        lists = [self._index[key] for key in _keys(capital_mask, linear_mask) if key in self._index]
+        last = None
+        for order_id in heapq.merge(*lists):
+            if order_id == last:
+                continue
+            last = order_id
+            if self._orders[order_id][0] == executor_id:
+                continue
+            yield order_id
+
+    def start_session(
+        self, executor_id: int, capital_mask: int, linear_mask: int, seen: Collection[int] = ()
+    ) -> int | None:
+        order_ids = [
+            order_id for order_id in self.candidates(executor_id, capital_mask, linear_mask) if order_id not in seen
+        ]
+        self._sessions.set(executor_id, SwipeCursor(capital_mask, linear_mask, order_ids))
+        return self.current(executor_id)
+
+    def has_session(self, executor_id: int) -> bool:
+        return executor_id in self._sessions
+
+    def current(self, executor_id: int) -> int | None:
+        cursor = self._sessions.get(executor_id)
+        if cursor is None:
+            return None
+        masks = (cursor.capital_mask, cursor.linear_mask)
+        while cursor.position < len(cursor.order_ids):
+            entry = self._orders.get(cursor.order_ids[cursor.position])
+            if entry is not None and masks_match(entry[1:], masks):
+                return cursor.order_ids[cursor.position]
+            cursor.position += 1
+        return None
+
+    def advance(self, executor_id: int, order_id: int) -> None:
+        """Решение по заказу принято: курсор сдвигается на следующую карточку."""
+        cursor = self._sessions.get(executor_id)
+        if cursor is not None and self.current(executor_id) == order_id:
+            cursor.position += 1
+        else:
+            # Ответ по устаревшей карточке: очередь надо пересобрать
+            self.end_session(executor_id)
+
+    def mark_seen(self, executor_id: int, order_id: int) -> None:
+        """Исполнитель принял решение по заказу: заказ больше не показывается в его сессии."""
+        cursor = self._sessions.get(executor_id)
+        if cursor is None:
+            return
+        # order_ids упорядочены по возрастанию. Текущую карточку сдвигает advance()
+        idx = bisect_left(cursor.order_ids, order_id)
+        if idx > cursor.position and idx < len(cursor.order_ids) and cursor.order_ids[idx] == order_id:
+            del cursor.order_ids[idx]
+
+    def end_session(self, executor_id: int) -> None:
+        self._sessions.pop(executor_id, None)
@@ -13,6 +13,8 @@ class BlockedMiddleware(BaseMiddleware):
         event: Any,
         data: dict[str, Any],
     ) -> Any:
+        # Пользователь загружается один раз на апдейт и передается обработчику как `user`
+        data["user"] = None
         db = data.get("db")
         if db is None:
             return await handler(event, data)
@@ -20,6 +22,7 @@ class BlockedMiddleware(BaseMiddleware):
         if not from_user:
             return await handler(event, data)
         user = await db.get_user_by_tg_id(from_user.id)
+        data["user"] = user
         if user and user.get("blocked"):
             if isinstance(event, Message):
                 await event.answer("Вы заблокированы администрацией.")
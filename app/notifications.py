@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter, deque
+from dataclasses import dataclass, field
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Ограничения Telegram Bot API: около 30 сообщений в секунду всего и 1 в секунду в один чат
+DEFAULT_NOTIFY_QUEUE_SIZE = 1000
+DEFAULT_GLOBAL_RATE = 30.0
+DEFAULT_CHAT_RATE = 1.0
+DEFAULT_CHAT_BURST = 3
+DEFAULT_MAX_RETRIES = 5
+# Первая пауза перед повтором после сетевой ошибки, дальше удваивается
+_RETRY_BASE_DELAY = 1.0
+_CHAT_BUCKETS = 10_000
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity в запасе."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_clock")
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic) -> None:
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._clock = clock
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Через сколько секунд появится токен; 0 — токен есть."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Не выдавать токенов ближайшие seconds секунд."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+@dataclass(order=True)
+class _Notification:
+    ready_at: float
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: dict[str, Any] = field(compare=False, default_factory=dict)
+    attempts: int = field(compare=False, default=0)
+
+
+class Notifier:
+    """
+    Очередь исходящих сообщений Telegram.
+
+    Обработчики ставят сообщения через enqueue(): при полной очереди он ждет места,
+    и сообщение не теряется. notify() не ждет и при полной очереди отбрасывает
+    сообщение — только для необязательных уведомлений. Массовые рассылки идут
+    через enqueue_bulk() в отдельную очередь: она берется, только когда очередь
+    обработчиков пуста, поэтому рассылка не вытесняет ответы пользователям.
+    Отправкой занимается одна фоновая задача: она соблюдает общий лимит и лимит
+    на чат, при TelegramRetryAfter откладывает сообщение и приостанавливает общий
+    лимит, после сетевых ошибок повторяет сообщение с нарастающей паузой. Когда
+    задача остановлена после close(), сообщения пишутся в лог и отбрасываются.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        maxsize: int = DEFAULT_NOTIFY_QUEUE_SIZE,
+        bulk_maxsize: int | None = None,
+        global_rate: float = DEFAULT_GLOBAL_RATE,
+        chat_rate: float = DEFAULT_CHAT_RATE,
+        chat_burst: int = DEFAULT_CHAT_BURST,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.bot = bot
+        self.max_retries = max_retries
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._clock = clock
+        self._queue: asyncio.Queue[_Notification] = asyncio.Queue(maxsize)
+        self._bulk: asyncio.Queue[_Notification] = asyncio.Queue(maxsize if bulk_maxsize is None else bulk_maxsize)
+        # Будит фоновую задачу при новом сообщении в любой из очередей и при закрытии
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        # Отложенные сообщения: куча по времени готовности, в ней не больше одного на чат.
+        # Остальные сообщения такого чата ждут за ним в _held, чтобы не нарушать порядок
+        self._deferred: list[_Notification] = []
+        self._held: dict[int, deque[_Notification]] = {}
+        self._seq = itertools.count()
+        self._global = TokenBucket(global_rate, global_rate, clock)
+        self._chats: LRUCache[int, TokenBucket] = LRUCache(_CHAT_BUCKETS)
+        self._task: asyncio.Task[None] | None = None
+        self._closed = False
+        self._drain_until = float("inf")
+        self.metrics: Counter[str] = Counter()
+
+    @property
+    def _stopped(self) -> bool:
+        # После close() сообщения принимаются, пока фоновая задача дописывает очередь
+        return self._closed and (self._task is None or self._task.done())
+
+    def _drop(self, chat_id: int, reason: str) -> bool:
+        self.metrics["dropped"] += 1
+        logger.warning("Notification to %s dropped: %s", chat_id, reason)
+        return False
+
+    def notify(self, chat_id: int, text: str, **kwargs: Any) -> bool:
+        """Поставить send_message(chat_id, text, **kwargs) в очередь; False, если очередь переполнена или закрыта."""
+        if self._stopped:
+            return self._drop(chat_id, "notifier is closed")
+        item = _Notification(self._clock(), next(self._seq), chat_id, text, kwargs)
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            return self._drop(chat_id, "queue is full")
+        self._queued()
+        return True
+
+    async def enqueue(self, chat_id: int, text: str, **kwargs: Any) -> bool:
+        """
+        Как notify(), но при полной очереди ждет места: сообщение не отбрасывается.
+
+        False — только если Notifier остановлен и отправлять уже некому.
+        """
+        return await self._put(self._queue, _Notification(self._clock(), next(self._seq), chat_id, text, kwargs))
+
+    async def enqueue_bulk(self, chat_id: int, text: str, **kwargs: Any) -> bool:
+        """Как enqueue(), но в очередь массовых рассылок: она ждет, пока не отправлены сообщения обработчиков."""
+        return await self._put(self._bulk, _Notification(self._clock(), next(self._seq), chat_id, text, kwargs))
+
+    async def _put(self, queue: asyncio.Queue[_Notification], item: _Notification) -> bool:
+        while not self._stopped:
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Будится, когда фоновая задача берет сообщение или останавливается
+                self._space.clear()
+                await self._space.wait()
+                continue
+            self._queued()
+            return True
+        return self._drop(item.chat_id, "notifier is closed")
+
+    def _queued(self) -> None:
+        self.metrics["queued"] += 1
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queue": self._queue.qsize(),
+            "bulk": self._bulk.qsize(),
+            "deferred": len(self._deferred) + sum(len(waiting) for waiting in self._held.values()),
+            **{name: self.metrics[name] for name in ("queued", "sent", "retried", "failed", "dropped")},
+        }
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst, self._clock)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    def _defer(self, item: _Notification, delay: float) -> None:
+        item.ready_at = self._clock() + delay
+        heapq.heappush(self._deferred, item)
+        self._held.setdefault(item.chat_id, deque())
+
+    def _release(self, chat_id: int) -> None:
+        waiting = self._held.get(chat_id)
+        if waiting is None:
+            return
+        if waiting:
+            self._defer(waiting.popleft(), 0.0)
+        else:
+            del self._held[chat_id]
+
+    async def _next(self) -> tuple[_Notification, bool] | None:
+        # Второй элемент — сообщение взято из кучи отложенных
+        while True:
+            now = self._clock()
+            if self._closed and (
+                now >= self._drain_until or (self._queue.empty() and self._bulk.empty() and not self._deferred)
+            ):
+                return None
+            if self._deferred and self._deferred[0].ready_at <= now:
+                return heapq.heappop(self._deferred), True
+            # Сообщения обработчиков вперед рассылок
+            for queue in (self._queue, self._bulk):
+                if not queue.empty():
+                    self._space.set()
+                    return queue.get_nowait(), False
+            timeout = None
+            if self._deferred:
+                timeout = self._deferred[0].ready_at - now
+            if self._closed:
+                timeout = min(timeout if timeout is not None else float("inf"), self._drain_until - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _loop(self) -> None:
+        while True:
+            found = await self._next()
+            if found is None:
+                return
+            item, deferred = found
+            if not deferred and item.chat_id in self._held:
+                self._held[item.chat_id].append(item)
+                continue
+            chat = self._chat_bucket(item.chat_id)
+            wait = chat.delay()
+            if wait > 0:
+                # Чат исчерпал лимит: сообщение ждет в куче, не задерживая другие чаты
+                self._defer(item, wait)
+                continue
+            wait = self._global.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            chat.take()
+            self._global.take()
+            if not await self._send(item):
+                self._release(item.chat_id)
+
+    async def _send(self, item: _Notification) -> bool:
+        """Отправить сообщение; True, если оно отложено для повтора."""
+        try:
+            await self.bot.send_message(item.chat_id, item.text, **item.kwargs)
+        except TelegramRetryAfter as exc:
+            # Лимит частоты общий для бота: остальные сообщения тоже ждут, а не получают тот же отказ
+            self._global.pause(float(exc.retry_after))
+            return self._retry(item, float(exc.retry_after))
+        except (TelegramNetworkError, TelegramServerError):
+            return self._retry(item, _RETRY_BASE_DELAY * 2 ** item.attempts)
+        except Exception:
+            self.metrics["failed"] += 1
+            logger.exception("Failed to deliver notification to %s", item.chat_id)
+        else:
+            self.metrics["sent"] += 1
+        return False
+
+    def _retry(self, item: _Notification, delay: float) -> bool:
+        item.attempts += 1
+        if item.attempts > self.max_retries:
+            self.metrics["failed"] += 1
+            logger.warning("Notification to %s dropped after %s attempts", item.chat_id, item.attempts)
+            return False
+        self.metrics["retried"] += 1
+        self._defer(item, delay)
+        return True
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Дождаться отправки очереди (не дольше timeout) и остановить фоновую задачу."""
+        if self._closed:
+            return
+        self._closed = True
+        self._drain_until = self._clock() + timeout
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        # Ожидающие места в очереди больше его не дождутся
+        self._space.set()
+        stats = self.stats()
+        left = stats["queue"] + stats["bulk"] + stats["deferred"]
+        if left:
+            logger.warning("Notification queue closed with %s undelivered messages", left)
+        logger.info("Notifications: %s", self.stats())
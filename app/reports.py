@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from itertools import groupby
+from operator import itemgetter
+import sqlite3
+from typing import Any, Callable, Iterable, Iterator
+
+from .constants import MATCH_DECISION_LIKED, ORDER_STATUS_CLOSED
+from .db import SECTION_KINDS
+
+# Отчеты строятся несколькими агрегирующими запросами на одном соединении:
+# функции синхронные и выполняются в потоке БД через Database.read.
+# Построчные отчеты — генераторы: строки курсора сразу уходят в excel.write_xlsx в том же потоке.
+# Счетчики и даты отдаются как int и date/datetime, чтобы в книге они были числовыми ячейками
+
+_SECTION_NAMES = {
+    SECTION_KINDS["sections_capital"][0]: SECTION_KINDS["sections_capital"][1],
+    SECTION_KINDS["sections_linear"][0]: SECTION_KINDS["sections_linear"][1],
+}
+
+CUSTOMERS_HEADER = [
+    "№",
+    "Номер телефона",
+    "Имя Фамилия",
+    "Количество заказов",
+    "Открытые заказы (исполнитель)",
+    "Количество закрытых заказов",
+    "Количество исполнителей и разделы по заказу",
+    "Рейтинг",
+]
+
+
+def _full_name(user: dict[str, Any]) -> str:
+    return f"{user.get('first_name','')} {user.get('last_name','')}".strip()
+
+
+def _rating(avg: float | None, cnt: int | None) -> str:
+    if not cnt:
+        return f"{0.0:.2f} (0)"
+    return f"{float(avg or 0.0):.2f} ({int(cnt)})"
+
+
+def _date(value: str | None) -> date | str | None:
+    # Даты в БД хранятся в ISO-формате; нераспознанное значение остается строкой
+    if not value:
+        return value
+    for parse in (date.fromisoformat, datetime.fromisoformat):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return value
+
+
+class _GroupedRows:
+    """Строки курсора, упорядоченного по ключу, выдаются группами по возрастанию ключа."""
+
+    def __init__(self, rows: Iterable[Any], key: Callable[[Any], Any]) -> None:
+        self._groups: Iterator = groupby(rows, key=key)
+        self._current = next(self._groups, None)
+
+    def take(self, value: Any) -> list[Any]:
+        while self._current is not None and self._current[0] < value:
+            self._current = next(self._groups, None)
+        if self._current is None or self._current[0] != value:
+            return []
+        rows = list(self._current[1])
+        self._current = next(self._groups, None)
+        return rows
+
+
+_SECTION_KINDS_SQL = ", ".join("?" * len(_SECTION_NAMES))
+
+
+def _section_names(rows: Iterable[sqlite3.Row]) -> str:
+    # Разделы капитального строительства, затем линейных объектов, каждые в порядке выбора —
+    # как в sections_capital + sections_linear
+    return ", ".join(_SECTION_NAMES[row["kind"]][row["item_id"]] for row in rows)
+
+
+def customers_report(conn: sqlite3.Connection) -> Iterator[list[Any]]:
+    yield CUSTOMERS_HEADER
+    # Разделы идут в том же порядке, что и заказы, и читаются параллельно с ними
+    sections = conn.execute(
+        f"""
+        SELECT o.customer_id, o.created_at, os.order_id, os.kind, os.item_id
+        FROM order_sections os
+        JOIN orders o ON o.id = os.order_id
+        WHERE os.kind IN ({_SECTION_KINDS_SQL})
+        ORDER BY o.customer_id, o.created_at, os.order_id, os.kind, os.position, os.item_id
+        """,
+        tuple(_SECTION_NAMES),
+    )
+    orders = conn.execute(
+        """
+        SELECT o.id, o.customer_id, o.created_at, o.status, o.assigned_executor_id,
+               e.phone AS executor_phone, e.first_name AS executor_first_name, e.last_name AS executor_last_name,
+               COALESCE(l.liked, 0) AS liked
+        FROM orders o
+        JOIN users c ON c.id = o.customer_id AND c.is_customer = 1
+        LEFT JOIN users e ON e.id = o.assigned_executor_id
+        LEFT JOIN (
+            SELECT order_id, COUNT(DISTINCT executor_id) AS liked FROM matches
+            WHERE customer_decision = ?
+            GROUP BY order_id
+        ) l ON l.order_id = o.id
+        ORDER BY o.customer_id, o.created_at, o.id
+        """,
+        (MATCH_DECISION_LIKED,),
+    )
+    customers = conn.execute(
+        """
+        SELECT u.*,
+               COUNT(o.id) AS orders_total,
+               COALESCE(SUM(o.status = ?), 0) AS orders_closed,
+               r.avg_rating, r.cnt AS rating_count
+        FROM users u
+        LEFT JOIN orders o ON o.customer_id = u.id
+        LEFT JOIN (
+            SELECT to_user_id, AVG(stars) AS avg_rating, COUNT(*) AS cnt FROM ratings GROUP BY to_user_id
+        ) r ON r.to_user_id = u.id
+        WHERE u.is_customer = 1
+        GROUP BY u.id
+        ORDER BY u.id
+        """,
+        (ORDER_STATUS_CLOSED,),
+    )
+    # Курсоры упорядочены по заказчику: заказы и разделы читаются параллельно, без выборки в память
+    orders_by_customer = _GroupedRows(orders, itemgetter("customer_id"))
+    sections_by_order = _GroupedRows(sections, itemgetter("customer_id", "created_at", "order_id"))
+    for idx, customer in enumerate(customers, start=1):
+        customer = dict(customer)
+        open_info = []
+        execs_info = []
+        for order in orders_by_customer.take(customer["id"]):
+            if order["status"] != ORDER_STATUS_CLOSED:
+                if order["assigned_executor_id"]:
+                    executor = {
+                        "first_name": order["executor_first_name"],
+                        "last_name": order["executor_last_name"],
+                    }
+                    open_info.append(f"#{order['id']}: {order['executor_phone']} {_full_name(executor)}")
+                else:
+                    open_info.append(f"#{order['id']}: исполнитель не подтвержден")
+            order_sections = _section_names(
+                sections_by_order.take((order["customer_id"], order["created_at"], order["id"]))
+            )
+            execs_info.append(f"#{order['id']}: {order['liked']}, разделы: {order_sections}")
+        yield [
+            idx,
+            customer.get("phone", ""),
+            _full_name(customer),
+            customer["orders_total"],
+            "; ".join(open_info),
+            customer["orders_closed"],
+            "; ".join(execs_info),
+            _rating(customer["avg_rating"], customer["rating_count"]),
+        ]
+
+
+EXECUTORS_HEADER = [
+    "№",
+    "Номер телефона",
+    "Имя Фамилия",
+    "Разрабатываемые разделы",
+    "Количество принятых заказов",
+    "Количество возможных заказов",
+    "Открытые заказы (заказчик)",
+    "Количество выполненных заказов",
+    "Рейтинг",
+]
+
+
+def _possible_counter(conn: sqlite3.Connection) -> Callable[[int, int], int]:
+    # Матрица совпадений строится по различным парам масок, а не по каждому исполнителю и заказу:
+    # пар масок у открытых заказов и у исполнителей намного меньше, чем самих записей
+    order_masks = conn.execute(
+        """
+        SELECT capital_mask, linear_mask, COUNT(*) FROM orders
+        WHERE status != ? AND assigned_executor_id IS NULL AND (capital_mask != 0 OR linear_mask != 0)
+        GROUP BY capital_mask, linear_mask
+        """,
+        (ORDER_STATUS_CLOSED,),
+    ).fetchall()
+    counts: dict[tuple[int, int], int] = {}
+
+    def count(capital_mask: int, linear_mask: int) -> int:
+        key = (capital_mask, linear_mask)
+        if key not in counts:
+            counts[key] = sum(
+                cnt
+                for order_capital, order_linear, cnt in order_masks
+                if order_capital & capital_mask or order_linear & linear_mask
+            )
+        return counts[key]
+    return count
+
+
+def executors_report(conn: sqlite3.Connection) -> Iterator[list[Any]]:
+    yield EXECUTORS_HEADER
+    sections = conn.execute(
+        f"""
+        SELECT user_id, kind, item_id FROM executor_sections
+        WHERE kind IN ({_SECTION_KINDS_SQL})
+        ORDER BY user_id, kind, position, item_id
+        """,
+        tuple(_SECTION_NAMES),
+    )
+    possible = _possible_counter(conn)
+    accepted_open = conn.execute(
+        """
+        SELECT m.executor_id, o.id AS order_id,
+               c.phone AS customer_phone, c.first_name AS customer_first_name, c.last_name AS customer_last_name
+        FROM matches m
+        JOIN orders o ON o.id = m.order_id
+        LEFT JOIN users c ON c.id = o.customer_id
+        WHERE m.customer_decision = ? AND m.executor_decision = ? AND o.status != ?
+        ORDER BY m.executor_id, m.id
+        """,
+        (MATCH_DECISION_LIKED, MATCH_DECISION_LIKED, ORDER_STATUS_CLOSED),
+    )
+    executors = conn.execute(
+        """
+        SELECT u.*, p.user_id AS profile_user_id, p.capital_mask, p.linear_mask,
+               COALESCE(a.accepted, 0) AS accepted, COALESCE(d.done, 0) AS done,
+               r.avg_rating, r.cnt AS rating_count
+        FROM users u
+        LEFT JOIN executor_profiles p ON p.user_id = u.id
+        LEFT JOIN (
+            SELECT executor_id, COUNT(*) AS accepted FROM matches
+            WHERE customer_decision = ? AND executor_decision = ?
+            GROUP BY executor_id
+        ) a ON a.executor_id = u.id
+        LEFT JOIN (
+            SELECT assigned_executor_id, COUNT(*) AS done FROM orders
+            WHERE status = ? AND assigned_executor_id IS NOT NULL
+            GROUP BY assigned_executor_id
+        ) d ON d.assigned_executor_id = u.id
+        LEFT JOIN (
+            SELECT to_user_id, AVG(stars) AS avg_rating, COUNT(*) AS cnt FROM ratings GROUP BY to_user_id
+        ) r ON r.to_user_id = u.id
+        WHERE u.is_executor = 1
+        ORDER BY u.id
+        """,
+        (MATCH_DECISION_LIKED, MATCH_DECISION_LIKED, ORDER_STATUS_CLOSED),
+    )
+    open_by_executor = _GroupedRows(accepted_open, itemgetter("executor_id"))
+    sections_by_executor = _GroupedRows(sections, itemgetter("user_id"))
+    for idx, executor in enumerate(executors, start=1):
+        executor = dict(executor)
+        has_profile = executor["profile_user_id"] is not None
+        open_orders = []
+        for match in open_by_executor.take(executor["id"]):
+            customer = {"first_name": match["customer_first_name"], "last_name": match["customer_last_name"]}
+            open_orders.append(f"#{match['order_id']}: {match['customer_phone']} {_full_name(customer)}")
+        executor_sections = sections_by_executor.take(executor["id"])
+        yield [
+            idx,
+            executor.get("phone", ""),
+            _full_name(executor),
+            _section_names(executor_sections) if has_profile else "",
+            executor["accepted"],
+            possible(executor["capital_mask"], executor["linear_mask"]) if has_profile else 0,
+            "; ".join(open_orders),
+            executor["done"],
+            _rating(executor["avg_rating"], executor["rating_count"]),
+        ]
+
+
+MUTUAL_HEADER = ["№", "Телефон заказчика", "Имя заказчика", "Телефон исполнителя", "Имя исполнителя", "Срок"]
+
+REVIEWS_HEADER = ["№", "Заказ", "От кого", "Кому", "Оценка", "Отзыв", "Дата"]
+
+
+def mutual_report(conn: sqlite3.Connection) -> Iterator[list[Any]]:
+    yield MUTUAL_HEADER
+    cur = conn.execute(
+        """
+        SELECT c.phone AS customer_phone, c.first_name AS customer_first_name, c.last_name AS customer_last_name,
+               e.phone AS executor_phone, e.first_name AS executor_first_name, e.last_name AS executor_last_name,
+               o.deadline
+        FROM matches m
+        JOIN orders o ON o.id = m.order_id
+        LEFT JOIN users c ON c.id = o.customer_id
+        LEFT JOIN users e ON e.id = m.executor_id
+        WHERE m.customer_decision = ? AND m.executor_decision = ?
+        ORDER BY m.id
+        """,
+        (MATCH_DECISION_LIKED, MATCH_DECISION_LIKED),
+    )
+    for idx, row in enumerate(cur, start=1):
+        customer = {"first_name": row["customer_first_name"], "last_name": row["customer_last_name"]}
+        executor = {"first_name": row["executor_first_name"], "last_name": row["executor_last_name"]}
+        yield [
+            idx,
+            row["customer_phone"],
+            _full_name(customer),
+            row["executor_phone"],
+            _full_name(executor),
+            _date(row["deadline"]),
+        ]
+
+
+def _person(row: sqlite3.Row, prefix: str) -> str:
+    # Удаленный пользователь выводится пустым, как раньше с get_user_by_id(...) or {}
+    if row[f"{prefix}_id"] is None:
+        return " "
+    user = {"first_name": row[f"{prefix}_first_name"], "last_name": row[f"{prefix}_last_name"]}
+    return f"{row[f'{prefix}_phone']} {_full_name(user)}"
+
+
+def reviews_report(conn: sqlite3.Connection) -> Iterator[list[Any]]:
+    yield REVIEWS_HEADER
+    cur = conn.execute(
+        """
+        SELECT r.order_id, r.stars, r.review, r.created_at,
+               f.id AS from_id, f.phone AS from_phone, f.first_name AS from_first_name, f.last_name AS from_last_name,
+               t.id AS to_id, t.phone AS to_phone, t.first_name AS to_first_name, t.last_name AS to_last_name
+        FROM ratings r
+        LEFT JOIN users f ON f.id = r.from_user_id
+        LEFT JOIN users t ON t.id = r.to_user_id
+        ORDER BY r.id
+        """
+    )
+    for idx, row in enumerate(cur, start=1):
+        yield [
+            idx,
+            row["order_id"],
+            _person(row, "from"),
+            _person(row, "to"),
+            row["stars"],
+            row["review"] or "",
+            _date(row["created_at"]),
+        ]
+
+
+STATS_HEADER = [
+    "Количество пользователей",
+    "Количество заказчиков",
+    "Количество исполнителей",
+    "Количество заказов",
+    "Количество заказов в работе",
+]
+
+
+def stats_report(conn: sqlite3.Connection) -> list[list[Any]]:
+    row = conn.execute(
+        """
+        SELECT
+            (SELECT COUNT(*) FROM users) AS users,
+            (SELECT COUNT(*) FROM users WHERE is_customer = 1) AS customers,
+            (SELECT COUNT(*) FROM users WHERE is_executor = 1) AS executors,
+            (SELECT COUNT(*) FROM orders) AS orders,
+            (SELECT COUNT(*) FROM orders WHERE status != ?) AS in_work
+        """,
+        (ORDER_STATUS_CLOSED,),
+    ).fetchone()
+    return [STATS_HEADER, [row["users"], row["customers"], row["executors"], row["orders"], row["in_work"]]]
+
+
+def full_export(conn: sqlite3.Connection) -> list[tuple[str, Iterable[list[Any]]]]:
+    # Все листы строятся на одном соединении; вызывать через Database.read_snapshot,
+    # чтобы цифры на листах сходились между собой. Построчные листы — генераторы:
+    # запросы выполняются, только когда write_xlsx дойдет до листа
+    return [
+        ("Customers", customers_report(conn)),
+        ("Executors", executors_report(conn)),
+        ("Mutual", mutual_report(conn)),
+        ("Reviews", reviews_report(conn)),
+        ("Stats", stats_report(conn)),
+    ]
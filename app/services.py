@@ -3,21 +3,34 @@ from __future__ import annotations
 import html
 from typing import Any
 
-from .constants import CONSTRUCTION_TYPES
+from .constants import CONSTRUCTION_TYPES, SECTIONS_CAPITAL, SECTIONS_LINEAR
+
+_CAPITAL_BITS = {name: 1 << idx for idx, name in enumerate(SECTIONS_CAPITAL)}
+_LINEAR_BITS = {name: 1 << idx for idx, name in enumerate(SECTIONS_LINEAR)}
+
+
+def section_masks(entity: dict[str, Any]) -> tuple[int, int]:
+    """Маски разделов (кап., лин.) с учетом выбранных видов строительства."""
+    if "capital_mask" in entity and "linear_mask" in entity:
+        return entity["capital_mask"] or 0, entity["linear_mask"] or 0
+    types = entity.get("construction_types") or []
+    capital = 0
+    linear = 0
+    if CONSTRUCTION_TYPES[0] in types:
+        for name in entity.get("sections_capital") or []:
+            capital |= _CAPITAL_BITS.get(name, 0)
+    if CONSTRUCTION_TYPES[1] in types:
+        for name in entity.get("sections_linear") or []:
+            linear |= _LINEAR_BITS.get(name, 0)
+    return capital, linear
+
+
+def masks_match(left: tuple[int, int], right: tuple[int, int]) -> bool:
+    return bool(left[0] & right[0] or left[1] & right[1])
 
 
 def has_match(order: dict[str, Any], executor: dict[str, Any]) -> bool:
-    order_types = set(order.get("construction_types", []))
-    executor_types = set(executor.get("construction_types", []))
-    common_types = order_types & executor_types
-    for ctype in common_types:
-        if ctype == CONSTRUCTION_TYPES[0]:
-            if set(order.get("sections_capital", [])) & set(executor.get("sections_capital", [])):
-                return True
-        if ctype == CONSTRUCTION_TYPES[1]:
-            if set(order.get("sections_linear", [])) & set(executor.get("sections_linear", [])):
-                return True
-    return False
+    return masks_match(section_masks(order), section_masks(executor))
 
 
 def _e(text: str | None) -> str:
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import suppress
+import logging
+import signal
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEBHOOK_PATH = "/webhook"
+DEFAULT_WEBHOOK_HOST = "0.0.0.0"
+DEFAULT_WEBHOOK_PORT = 8080
+# Telegram открывает не больше стольких соединений к вебхуку одновременно
+DEFAULT_WEBHOOK_MAX_CONNECTIONS = 40
+# Сколько при остановке ждать обновления, которые уже начали обрабатываться
+DEFAULT_SHUTDOWN_TIMEOUT = 30.0
+
+
+class WebhookHandler(SimpleRequestHandler):
+    """
+    Обработчик вебхука aiogram: проверяет секрет, сразу отвечает Telegram 200
+    и обрабатывает обновление в отдельной задаче, так что обновления идут параллельно.
+
+    Telegram получает ответ раньше, чем обновление обработано, поэтому
+    max_connections вебхука обработку не ограничивает: одновременно обрабатывается
+    не больше concurrency обновлений, остальные ждут в своих задачах.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: str | None = None,
+        concurrency: int | None = None,
+        **data: Any,
+    ) -> None:
+        super().__init__(dispatcher, bot, secret_token=secret_token, **data)
+        if concurrency is not None and concurrency < 1:
+            raise ValueError("concurrency must be positive")
+        self._slots = asyncio.Semaphore(concurrency) if concurrency else None
+
+    async def _background_feed_update(self, bot: Bot, update: dict[str, Any]) -> None:
+        if self._slots is None:
+            await super()._background_feed_update(bot, update)
+            return
+        async with self._slots:
+            await super()._background_feed_update(bot, update)
+
+    async def join(self, timeout: float | None = None) -> int:
+        """Дождаться начатых обновлений; возвращает число не успевших завершиться."""
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return 0
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        return len(pending)
+
+
+def create_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    path: str = DEFAULT_WEBHOOK_PATH,
+    secret_token: str | None = None,
+    shutdown_timeout: float = DEFAULT_SHUTDOWN_TIMEOUT,
+    concurrency: int | None = None,
+    **data: Any,
+) -> web.Application:
+    """
+    aiohttp-приложение с вебхуком на path; concurrency — сколько обновлений
+    обрабатывается одновременно (None — без ограничения).
+
+    Остановка идет в on_cleanup, когда aiohttp уже перестал принимать запросы и
+    дождался начатых: затем дожидаются фоновые обновления, вызывается
+    dp.shutdown (очередь уведомлений дописывается) и закрывается сессия бота.
+    """
+    app = web.Application()
+    handler = WebhookHandler(dp, bot, secret_token=secret_token, concurrency=concurrency, **data)
+    # Не handler.register(): он закрыл бы сессию бота в on_shutdown, раньше фоновых обновлений
+    app.router.add_post(path, handler.handle)
+    workflow_data = {"app": app, "dispatcher": dp, "bot": bot, **dp.workflow_data, **data}
+
+    async def on_startup(_: web.Application) -> None:
+        await dp.emit_startup(**workflow_data)
+
+    async def on_cleanup(_: web.Application) -> None:
+        try:
+            left = await handler.join(shutdown_timeout)
+            if left:
+                logger.warning("Webhook stopped with %s updates still in progress", left)
+            await dp.emit_shutdown(**workflow_data)
+        finally:
+            await handler.close()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    url: str,
+    path: str = DEFAULT_WEBHOOK_PATH,
+    secret_token: str | None = None,
+    host: str = DEFAULT_WEBHOOK_HOST,
+    port: int = DEFAULT_WEBHOOK_PORT,
+    max_connections: int = DEFAULT_WEBHOOK_MAX_CONNECTIONS,
+    concurrency: int | None = None,
+) -> None:
+    """Поднять сервер вебхука, зарегистрировать url в Telegram и работать до SIGINT/SIGTERM."""
+    app = create_webhook_app(dp, bot, path, secret_token, concurrency=concurrency)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # На Windows обработчиков сигналов нет, там остается KeyboardInterrupt
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+    try:
+        await web.TCPSite(runner, host, port).start()
+        await bot.set_webhook(
+            url,
+            secret_token=secret_token,
+            max_connections=max_connections,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info("Webhook server listening on %s:%s, url %s", host, port, url)
+        await stop.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+        await runner.cleanup()
@@ -0,0 +1,161 @@
+"""
+Замер подбора исполнителя к заказу: Database.next_executor_candidate против
+прежнего запроса по маскам всех анкет и перебора в Python (list_executor_profiles + has_match).
+
+Два набора данных: «частый» — у каждого исполнителя 3 раздела из 28, раздел
+заказа есть у каждого девятого; «редкий» — раздел заказа есть у 0,1% исполнителей.
+
+Запуск: python scripts/bench_executor_candidate.py [100 1000 10000 100000]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import Database
+from app.constants import (
+    CONSTRUCTION_TYPES,
+    MATCH_DECISION_DECLINED,
+    ORDER_STATUS_OPEN,
+    SECTIONS_CAPITAL,
+    SECTIONS_LINEAR,
+)
+from app.services import has_match, section_masks
+
+SIZES = [100, 1_000, 10_000, 100_000]
+RUNS = 50
+# Сколько исполнителей заказчик уже пролистал
+SEEN = 20
+# Раздел заказа
+ORDER_SECTION = 5
+# Доля исполнителей с разделом заказа в «редком» наборе
+SPARSE_SHARE = 0.001
+
+# Подбор до индекса по разделам: обход всех анкет по user_id с проверкой масок
+MASK_SCAN_SQL = """
+SELECT e.user_id
+FROM orders o
+CROSS JOIN executor_profiles e INDEXED BY idx_executor_profiles_masks
+CROSS JOIN users u ON u.id = e.user_id
+WHERE o.id = ? AND o.assigned_executor_id IS NULL
+  AND ((e.capital_mask & o.capital_mask) != 0 OR (e.linear_mask & o.linear_mask) != 0)
+  AND u.is_executor = 1 AND u.blocked = 0
+  AND NOT EXISTS (
+      SELECT 1 FROM matches m
+      WHERE m.order_id = o.id AND m.executor_id = e.user_id
+        AND (m.customer_decision IS NOT NULL AND m.customer_decision != ''
+             OR m.executor_decision = ?)
+  )
+ORDER BY e.user_id
+LIMIT 1
+"""
+
+
+def _populate(conn, count: int, sparse: bool) -> None:
+    rng = random.Random(count)
+    others = [name for idx, name in enumerate(SECTIONS_CAPITAL) if idx != ORDER_SECTION]
+    now = datetime.utcnow().isoformat()
+    users = []
+    profiles = []
+    sections = []
+    for user_id in range(2, count + 2):
+        types = rng.sample(CONSTRUCTION_TYPES, rng.randint(1, 2))
+        data = {
+            "construction_types": types,
+            "sections_capital": [],
+            "sections_linear": rng.sample(SECTIONS_LINEAR, 3) if CONSTRUCTION_TYPES[1] in types else [],
+        }
+        if CONSTRUCTION_TYPES[0] in types:
+            if not sparse:
+                data["sections_capital"] = rng.sample(SECTIONS_CAPITAL, 3)
+            elif rng.random() < SPARSE_SHARE:
+                data["sections_capital"] = [SECTIONS_CAPITAL[ORDER_SECTION], *rng.sample(others, 2)]
+            else:
+                data["sections_capital"] = rng.sample(others, 3)
+        capital_mask, linear_mask = section_masks(data)
+        users.append((user_id, user_id, f"+7{user_id:010d}", int(rng.random() < 0.05), now, now))
+        profiles.append((user_id, "Более 5 лет", "x" * 200, capital_mask, linear_mask, now))
+        sections.extend((user_id, 2, CONSTRUCTION_TYPES.index(t)) for t in types)
+        sections.extend((user_id, 3, SECTIONS_CAPITAL.index(s)) for s in data["sections_capital"])
+        sections.extend((user_id, 4, SECTIONS_LINEAR.index(s)) for s in data["sections_linear"])
+    conn.execute("BEGIN")
+    conn.execute(
+        "INSERT INTO users(id, tg_id, phone, is_customer, created_at, updated_at) VALUES(1, 1, '+7', 1, ?, ?)",
+        (now, now),
+    )
+    conn.executemany(
+        "INSERT INTO users(id, tg_id, phone, is_executor, blocked, created_at, updated_at) VALUES(?, ?, ?, 1, ?, ?, ?)",
+        users,
+    )
+    conn.executemany(
+        """
+        INSERT INTO executor_profiles(user_id, experience, resume_text, capital_mask, linear_mask, updated_at)
+        VALUES(?, ?, ?, ?, ?, ?)
+        """,
+        profiles,
+    )
+    conn.executemany("INSERT INTO executor_sections(user_id, kind, item_id) VALUES(?, ?, ?)", sections)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+
+
+async def _measure(fn, runs: int = RUNS) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        await fn()
+    return (time.perf_counter() - started) / runs * 1000
+
+
+async def bench(count: int, sparse: bool) -> tuple[float, float, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        await db.init()
+        await db.writer.run(lambda conn: _populate(conn, count, sparse))
+        order = await db.create_order(
+            1,
+            {
+                "name": "Жилой дом",
+                "doc_types": ["РД"],
+                "construction_types": [CONSTRUCTION_TYPES[0]],
+                "sections_capital": [SECTIONS_CAPITAL[ORDER_SECTION]],
+                "status": ORDER_STATUS_OPEN,
+            },
+        )
+        for _ in range(SEEN):
+            candidate = await db.next_executor_candidate(order["id"])
+            if candidate is None:
+                break
+            await db.upsert_match(order["id"], candidate["user_id"], customer_decision=MATCH_DECISION_DECLINED)
+
+        async def legacy() -> None:
+            matches = await db.list_matches_for_order(order["id"])
+            seen = {m["executor_id"] for m in matches if m.get("customer_decision")}
+            for executor in await db.list_executor_profiles():
+                if not executor.get("blocked") and executor["user_id"] not in seen and has_match(order, executor):
+                    return
+
+        indexed = await _measure(lambda: db.next_executor_candidate(order["id"]))
+        masks = await _measure(lambda: db.fetchone(MASK_SCAN_SQL, (order["id"], MATCH_DECISION_DECLINED)))
+        scan = await _measure(legacy, runs=max(1, RUNS * 100 // count))
+        await db.close()
+    return indexed, masks, scan
+
+
+async def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print(f"{'набор':>8} {'исполнителей':>12} {'запрос, мс':>12} {'по маскам, мс':>14} {'перебор, мс':>12}")
+    for sparse in (False, True):
+        for count in sizes:
+            indexed, masks, scan = await bench(count, sparse)
+            label = "редкий" if sparse else "частый"
+            print(f"{label:>8} {count:>12} {indexed:>12.3f} {masks:>14.3f} {scan:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Замер выгрузки отчетов в xlsx: текущий app.excel (общие строки, числовые ячейки)
+против прежнего вывода, где каждая ячейка — inlineStr.
+
+Строки отчетов берутся из демо-базы scripts/seed_demo.py и размножаются до нужного объема.
+
+Запуск: python scripts/bench_xlsx.py [1000 10000 100000]
+"""
+
+import asyncio
+import contextlib
+from datetime import date
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import reports
+from app.db import Database
+from app.excel import _cell_ref, write_xlsx
+from seed_demo import seed_database
+
+SIZES = [1_000, 10_000, 100_000]
+REPORTS = {
+    "customers": lambda conn: list(reports.customers_report(conn)),
+    "executors": lambda conn: list(reports.executors_report(conn)),
+    "mutual": lambda conn: list(reports.mutual_report(conn)),
+    "reviews": lambda conn: list(reports.reviews_report(conn)),
+}
+
+
+def _legacy_xlsx(fileobj, rows) -> None:
+    # Прежний build_xlsx: лист целиком собирается в строку из inlineStr-ячеек
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        "<sheetData>"
+    ]
+    for r_idx, row in enumerate(rows, start=1):
+        lines.append(f'<row r="{r_idx}">')
+        for c_idx, value in enumerate(row, start=1):
+            text = escape("" if value is None else str(value))
+            lines.append(f'<c r="{_cell_ref(r_idx, c_idx)}" t="inlineStr"><is><t>{text}</t></is></c>')
+        lines.append("</row>")
+    lines.append("</sheetData></worksheet>")
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("xl/worksheets/sheet1.xml", "".join(lines))
+
+
+def _as_text(row: list) -> list:
+    return [value.isoformat() if isinstance(value, date) else value if value is None else str(value) for value in row]
+
+
+def _scale(rows: list[list], count: int) -> list[list]:
+    header, body = rows[0], rows[1:]
+    scaled = [header]
+    for idx in range(count):
+        row = list(body[idx % len(body)])
+        row[0] = idx + 1
+        scaled.append(row)
+    return scaled
+
+
+async def _load_reports() -> dict[str, list[list]]:
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                await seed_database()
+            db = Database(os.path.join("data", "demo.db"))
+            await db.init()
+            loaded = {name: await db.read(report) for name, report in REPORTS.items()}
+            await db.close()
+        finally:
+            os.chdir(cwd)
+    return loaded
+
+
+def _measure(write, rows) -> tuple[float, int]:
+    buffer = io.BytesIO()
+    started = time.perf_counter()
+    write(buffer, rows)
+    return (time.perf_counter() - started) * 1000, len(buffer.getvalue())
+
+
+async def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    loaded = await _load_reports()
+    print(f"{'отчет':>10} {'строк':>8} {'было, КБ':>10} {'стало, КБ':>10} {'было, мс':>10} {'стало, мс':>10}")
+    for name, rows in loaded.items():
+        if len(rows) < 2:
+            continue
+        for count in sizes:
+            scaled = _scale(rows, count)
+            legacy_ms, legacy_size = _measure(_legacy_xlsx, [_as_text(row) for row in scaled])
+            current_ms, current_size = _measure(write_xlsx, scaled)
+            print(
+                f"{name:>10} {count:>8} {legacy_size / 1024:>10.1f} {current_size / 1024:>10.1f}"
+                f" {legacy_ms:>10.1f} {current_ms:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -308,37 +308,40 @@ async def seed_database():
     print("🚀 Создание демо-данных для Тендо.про...")
     
     # Администратор
-    admin = await db.create_user(100001, "+79001234567")
-    await db.update_user_profile(admin["id"], "Администратор", "Системы", None)
-    await db.set_user_roles(admin["id"], is_admin=True)
-    await db.add_admin_phone("+79001234567")
+    async with db.transaction():
+        admin = await db.create_user(100001, "+79001234567")
+        await db.update_user_profile(admin["id"], "Администратор", "Системы", None)
+        await db.set_user_roles(admin["id"], is_admin=True)
+        await db.add_admin_phone("+79001234567")
     print("✅ Администратор создан")
     
     # Заказчики
     customer_ids = []
     for i, c in enumerate(CUSTOMERS):
-        user = await db.create_user(200000 + i, c["phone"])
-        await db.update_user_profile(user["id"], c["first_name"], c["last_name"], c["org"])
-        await db.set_user_roles(user["id"], is_customer=True)
+        async with db.transaction():
+            user = await db.create_user(200000 + i, c["phone"])
+            await db.update_user_profile(user["id"], c["first_name"], c["last_name"], c["org"])
+            await db.set_user_roles(user["id"], is_customer=True)
         customer_ids.append(user["id"])
     print(f"✅ Создано {len(CUSTOMERS)} заказчиков")
     
     # Исполнители
     executor_ids = []
     for i, e in enumerate(EXECUTORS):
-        user = await db.create_user(300000 + i, e["phone"])
-        await db.update_user_profile(user["id"], e["first_name"], e["last_name"], e["org"])
-        await db.set_user_roles(user["id"], is_executor=True)
-        await db.upsert_executor_profile(
-            user["id"],
-            e["exp"],
-            None,
-            e["resume"],
-            DOC_TYPES,
-            e["construction"],
-            e["sections_cap"],
-            e["sections_lin"],
-        )
+        async with db.transaction():
+            user = await db.create_user(300000 + i, e["phone"])
+            await db.update_user_profile(user["id"], e["first_name"], e["last_name"], e["org"])
+            await db.set_user_roles(user["id"], is_executor=True)
+            await db.upsert_executor_profile(
+                user["id"],
+                e["exp"],
+                None,
+                e["resume"],
+                DOC_TYPES,
+                e["construction"],
+                e["sections_cap"],
+                e["sections_lin"],
+            )
         executor_ids.append(user["id"])
     print(f"✅ Создано {len(EXECUTORS)} исполнителей")
     
@@ -379,8 +382,9 @@ async def seed_database():
     # Назначенные исполнители для закрытых заказов
     for order_id in order_ids[10:]:
         exec_id = random.choice(executor_ids)
-        await db.assign_executor(order_id, exec_id)
-        await db.upsert_match(order_id, exec_id, MATCH_DECISION_LIKED, MATCH_DECISION_LIKED)
+        async with db.transaction():
+            await db.assign_executor(order_id, exec_id)
+            await db.upsert_match(order_id, exec_id, MATCH_DECISION_LIKED, MATCH_DECISION_LIKED)
     print("✅ Назначены исполнители для закрытых заказов")
     
     # Рейтинги и отзывы
@@ -424,6 +428,8 @@ async def seed_database():
     print(f"   Заказов: {stats['orders']}")
     print(f"   В работе: {stats['in_work']}")
 
+    await db.close()
+
 
 if __name__ == "__main__":
     asyncio.run(seed_database())
@@ -0,0 +1,48 @@
+import unittest
+
+from app.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats(), {"size": 2, "hits": 3, "misses": 1})
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = LRUCache(10, ttl=5, clock=clock)
+        cache.set("a", 1)
+        clock.now = 4.9
+        self.assertIn("a", cache)
+        clock.now = 5
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_items_skip_expired(self):
+        clock = FakeClock()
+        cache = LRUCache(10, ttl=5, clock=clock)
+        cache.set("a", 1)
+        clock.now = 3
+        cache.set("b", 2)
+        self.assertEqual(cache.items(), [("a", 1), ("b", 2)])
+        clock.now = 6
+        self.assertEqual(cache.items(), [("b", 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import os
+import unittest
+from unittest import mock
+
+from app.config import load_config
+
+
+class LoadConfigTests(unittest.TestCase):
+    def _load(self, **env):
+        with mock.patch.dict(os.environ, {"BOT_TOKEN": "42:TEST", **env}, clear=True):
+            return load_config()
+
+    def test_defaults(self):
+        config = self._load()
+        self.assertLess(config.report_concurrency, config.db_pool_size)
+
+    def test_report_concurrency_below_pool_size(self):
+        self.assertEqual(self._load(DB_POOL_SIZE="8", REPORT_CONCURRENCY="7").report_concurrency, 7)
+        for pool_size, concurrency in (("4", "4"), ("4", "6"), ("4", "0"), ("1", "1")):
+            with self.subTest(pool_size=pool_size, concurrency=concurrency):
+                with self.assertRaises(RuntimeError):
+                    self._load(DB_POOL_SIZE=pool_size, REPORT_CONCURRENCY=concurrency)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,17 @@
+import asyncio
+import sqlite3
 import tempfile
 import unittest
 
-from app.constants import MATCH_DECISION_LIKED, ORDER_STATUS_OPEN
-from app.db import Database
+from app.constants import (
+    CONSTRUCTION_TYPES,
+    MATCH_DECISION_DECLINED,
+    MATCH_DECISION_LIKED,
+    ORDER_STATUS_OPEN,
+    SECTIONS_CAPITAL,
+    SECTIONS_LINEAR,
+)
+from app.db import Database, PragmaProfile
 
 
 class DatabaseTests(unittest.IsolatedAsyncioTestCase):
@@ -12,6 +21,7 @@ class DatabaseTests(unittest.IsolatedAsyncioTestCase):
         await self.db.init()
 
     async def asyncTearDown(self):
+        await self.db.close()
         self.tmp.close()
 
     async def test_user_and_order(self):
@@ -65,6 +75,355 @@ class DatabaseTests(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(cnt, 1)
         self.assertEqual(avg, 5.0)
 
+    async def test_pool_reuses_connections(self):
+        self.assertTrue(await self.db.health_check())
+        conn_ids = set()
+        for _ in range(self.db.pool.size * 3):
+            conn_ids.add(await self.db.pool.run(id))
+        self.assertEqual(len(conn_ids), self.db.pool.size)
+
+    async def test_pragma_profile_applied(self):
+        def _read(conn):
+            conn.execute("SELECT COUNT(*) FROM users").fetchone()
+            return {
+                "journal_mode": conn.execute("PRAGMA journal_mode").fetchone()[0],
+                "synchronous": conn.execute("PRAGMA synchronous").fetchone()[0],
+                "temp_store": conn.execute("PRAGMA temp_store").fetchone()[0],
+                "busy_timeout": conn.execute("PRAGMA busy_timeout").fetchone()[0],
+            }
+
+        pragmas = await self.db.pool.run(_read)
+        self.assertEqual(pragmas["journal_mode"], "wal")
+        self.assertEqual(pragmas["synchronous"], 1)
+        self.assertEqual(pragmas["temp_store"], 2)
+        self.assertEqual(pragmas["busy_timeout"], PragmaProfile().busy_timeout)
+        busy, _, _ = await self.db.checkpoint()
+        self.assertEqual(busy, 0)
+
+    def test_pragma_profile_rejects_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            PragmaProfile(journal_mode="wal; DROP TABLE users")
+
+    async def test_writes_are_group_committed(self):
+        users = await asyncio.gather(
+            *(self.db.create_user(1000 + idx, f"+7000000{idx:04d}") for idx in range(40))
+        )
+        self.assertEqual(len({u["id"] for u in users}), 40)
+        batches_before = self.db.writer.batches
+        await asyncio.gather(*(self.db.set_last_role(u["id"], "executor") for u in users))
+        self.assertLess(self.db.writer.batches - batches_before, 40)
+        self.assertEqual(len(await self.db.fetchall("SELECT id FROM users WHERE last_role = 'executor'")), 40)
+
+    async def test_failed_write_does_not_break_batch(self):
+        await self.db.create_user(1, "+70000000001")
+        results = await asyncio.gather(
+            self.db.execute(
+                "INSERT INTO users(tg_id, phone, created_at, updated_at) VALUES(?, ?, '', '')",
+                (1, "+70000000009"),
+            ),
+            self.db.add_admin_phone("+70000000002"),
+            return_exceptions=True,
+        )
+        self.assertIsInstance(results[0], sqlite3.IntegrityError)
+        self.assertTrue(await self.db.is_admin_phone("+70000000002"))
+
+    async def test_transaction_commits_together(self):
+        async with self.db.transaction():
+            user = await self.db.create_user(5, "+70000000005")
+            await self.db.update_user_profile(user["id"], "Петр", "Петров", None)
+            await self.db.set_user_roles(user["id"], is_executor=True)
+            inside = await self.db.get_user_by_id(user["id"])
+            self.assertEqual(inside["first_name"], "Петр")
+            self.assertIsNone(await self.db.pool.run(lambda conn: conn.execute(
+                "SELECT id FROM users WHERE id = ?", (user["id"],)
+            ).fetchone()))
+        stored = await self.db.get_user_by_phone("+70000000005")
+        self.assertEqual(stored["is_executor"], 1)
+
+    async def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            async with self.db.transaction():
+                user = await self.db.create_user(6, "+70000000006")
+                await self.db.update_user_profile(user["id"], "Петр", "Петров", None)
+                raise RuntimeError("boom")
+        self.assertIsNone(await self.db.get_user_by_phone("+70000000006"))
+        await self.db.add_admin_phone("+70000000007")
+        self.assertTrue(await self.db.is_admin_phone("+70000000007"))
+
+    async def test_writes_return_rows(self):
+        user = await self.db.create_user(7, "+70000000007")
+        self.assertEqual(user["phone"], "+70000000007")
+        self.assertEqual(user["is_customer"], 0)
+        updated = await self.db.set_user_roles(user["id"], is_executor=True)
+        self.assertEqual((updated["is_customer"], updated["is_executor"]), (0, 1))
+        updated = await self.db.set_user_roles(user["id"], is_customer=True)
+        self.assertEqual((updated["is_customer"], updated["is_executor"]), (1, 1))
+        self.assertIsNone(await self.db.set_user_roles(10**6, is_admin=True))
+
+    async def test_sections_stored_in_junction_tables(self):
+        user = await self.db.create_user(8, "+70000000008")
+        await self.db.set_user_roles(user["id"], is_executor=True)
+        await self.db.upsert_executor_profile(
+            user["id"],
+            "Более 5 лет",
+            None,
+            None,
+            ["ПД"],
+            CONSTRUCTION_TYPES,
+            [SECTIONS_CAPITAL[10]],
+            [SECTIONS_LINEAR[9], SECTIONS_LINEAR[0]],
+        )
+        profile = await self.db.get_executor_profile(user["id"])
+        self.assertEqual(profile["sections_capital"], [SECTIONS_CAPITAL[10]])
+        # Порядок выбора сохраняется, а не порядок app.constants
+        self.assertEqual(profile["sections_linear"], [SECTIONS_LINEAR[9], SECTIONS_LINEAR[0]])
+        self.assertEqual(
+            await self.db.list_executors_for_section("sections_linear", SECTIONS_LINEAR[9]), [user["id"]]
+        )
+        self.assertEqual(await self.db.list_executors_for_section("sections_linear", SECTIONS_LINEAR[1]), [])
+        with self.assertRaises(ValueError):
+            await self.db.upsert_executor_profile(user["id"], "", None, None, ["XX"], [], [], [])
+
+    async def test_open_orders_filtered_by_mask(self):
+        user = await self.db.create_user(9, "+70000000009")
+        order = await self.db.create_order(
+            user["id"],
+            {
+                "name": "Сети",
+                "doc_types": ["РД"],
+                "construction_types": [CONSTRUCTION_TYPES[1]],
+                "sections_capital": [SECTIONS_CAPITAL[0]],
+                "sections_linear": [SECTIONS_LINEAR[2]],
+                "status": ORDER_STATUS_OPEN,
+            },
+        )
+        # Раздел капитального строительства не учитывается без соответствующего вида
+        self.assertEqual((order["capital_mask"], order["linear_mask"]), (0, 1 << 2))
+        matching = await self.db.list_open_orders_matching(1 << 0, 1 << 2)
+        self.assertEqual([o["id"] for o in matching], [order["id"]])
+        self.assertEqual(await self.db.list_open_orders_matching(1 << 0, 1 << 3), [])
+
+    async def test_next_executor_candidate(self):
+        customer = await self.db.create_user(20, "+70000000020")
+        order = await self.db.create_order(
+            customer["id"],
+            {
+                "name": "Дом",
+                "doc_types": ["РД"],
+                "construction_types": [CONSTRUCTION_TYPES[0]],
+                "sections_capital": [SECTIONS_CAPITAL[3]],
+                "status": ORDER_STATUS_OPEN,
+            },
+        )
+        executors = []
+        for idx, sections in enumerate([[SECTIONS_CAPITAL[4]], [SECTIONS_CAPITAL[3]], [SECTIONS_CAPITAL[3]], [SECTIONS_CAPITAL[3]]]):
+            user = await self.db.create_user(30 + idx, f"+7000000003{idx}")
+            await self.db.set_user_roles(user["id"], is_executor=True)
+            await self.db.upsert_executor_profile(
+                user["id"], "", None, None, ["РД"], [CONSTRUCTION_TYPES[0]], sections, []
+            )
+            executors.append(user["id"])
+
+        candidate = await self.db.next_executor_candidate(order["id"])
+        self.assertEqual(candidate["user_id"], executors[1])
+        self.assertEqual(candidate["sections_capital"], [SECTIONS_CAPITAL[3]])
+
+        await self.db.set_blocked(executors[1], True)
+        await self.db.upsert_match(order["id"], executors[2], executor_decision=MATCH_DECISION_DECLINED)
+        self.assertEqual((await self.db.next_executor_candidate(order["id"]))["user_id"], executors[3])
+
+        await self.db.upsert_match(order["id"], executors[3], customer_decision=MATCH_DECISION_LIKED)
+        self.assertIsNone(await self.db.next_executor_candidate(order["id"]))
+
+    async def test_user_cache_invalidated_on_write(self):
+        user = await self.db.create_user(40, "+70000000040")
+        self.assertEqual((await self.db.get_user_by_tg_id(40))["id"], user["id"])
+        await self.db.get_user_by_tg_id(40)
+        self.assertEqual(self.db.user_cache.hits, 1)
+
+        await self.db.set_blocked(user["id"], True)
+        self.assertEqual((await self.db.get_user_by_tg_id(40))["blocked"], 1)
+        await self.db.update_user_tg(user["id"], 41)
+        self.assertIsNone(await self.db.get_user_by_tg_id(40))
+        self.assertEqual((await self.db.get_user_by_tg_id(41))["id"], user["id"])
+
+        async with self.db.transaction():
+            await self.db.set_user_roles(user["id"], is_customer=True)
+            self.assertEqual((await self.db.get_user_by_tg_id(41))["is_customer"], 1)
+        self.assertEqual((await self.db.get_user_by_tg_id(41))["is_customer"], 1)
+
+    async def test_hot_user_invalidated_after_other_evictions(self):
+        await self.db.close()
+        self.db = Database(self.tmp.name, user_cache_size=2)
+        await self.db.init()
+        hot = await self.db.create_user(60, "+70000000060")
+        await self.db.create_user(61, "+70000000061")
+        await self.db.create_user(62, "+70000000062")
+        await self.db.get_user_by_tg_id(60)
+        await self.db.get_user_by_tg_id(61)
+        await self.db.get_user_by_tg_id(60)
+        await self.db.get_user_by_tg_id(62)
+        self.assertIn(60, self.db.user_cache)
+
+        await self.db.set_blocked(hot["id"], True)
+        self.assertEqual((await self.db.get_user_by_tg_id(60))["blocked"], 1)
+        await self.db.set_user_roles(hot["id"], is_executor=True)
+        self.assertEqual((await self.db.get_user_by_tg_id(60))["is_executor"], 1)
+
+    async def test_order_cache_invalidated_on_write(self):
+        user = await self.db.create_user(50, "+70000000050")
+        order = await self.db.create_order(
+            user["id"],
+            {"name": "Склад", "doc_types": ["ПД"], "construction_types": [], "status": ORDER_STATUS_OPEN},
+        )
+        first = await self.db.get_order(order["id"])
+        first["doc_types"].append("РД")
+        self.assertEqual((await self.db.get_order(order["id"]))["doc_types"], ["ПД"])
+        self.assertEqual((self.db.order_cache.hits, self.db.order_cache.misses), (1, 1))
+
+        await self.db.set_order_status(order["id"], "closed")
+        self.assertEqual((await self.db.get_order(order["id"]))["status"], "closed")
+        await self.db.assign_executor(order["id"], user["id"])
+        self.assertEqual((await self.db.get_order(order["id"]))["assigned_executor_id"], user["id"])
+        await self.db.update_order(order["id"], {"name": "Склад 2", "doc_types": ["РД"]})
+        updated = await self.db.get_order(order["id"])
+        self.assertEqual((updated["name"], updated["doc_types"]), ("Склад 2", ["РД"]))
+        self.assertEqual(self.db.order_cache.misses, 4)
+
+    async def test_batch_fetch_keeps_caller_order(self):
+        users = [await self.db.create_user(60 + idx, f"+7000000006{idx}") for idx in range(3)]
+        orders = [
+            await self.db.create_order(
+                users[0]["id"],
+                {"name": f"Заказ {idx}", "doc_types": ["ПД"], "construction_types": [], "status": ORDER_STATUS_OPEN},
+            )
+            for idx in range(3)
+        ]
+        await self.db.get_order(orders[1]["id"])
+        ids = [orders[2]["id"], 10**6, orders[1]["id"], orders[0]["id"], orders[2]["id"]]
+        fetched = await self.db.get_orders_by_ids(ids)
+        self.assertEqual([o["id"] for o in fetched], [orders[2]["id"], orders[1]["id"], orders[0]["id"]])
+        self.assertEqual(fetched[0]["doc_types"], ["ПД"])
+        self.assertEqual(
+            [u["id"] for u in await self.db.get_users_by_ids([users[2]["id"], users[0]["id"]])],
+            [users[2]["id"], users[0]["id"]],
+        )
+
+        await self.db.upsert_match(orders[0]["id"], users[1]["id"], customer_decision=MATCH_DECISION_LIKED)
+        await self.db.upsert_match(orders[1]["id"], users[1]["id"], customer_decision=MATCH_DECISION_LIKED)
+        await self.db.upsert_match(orders[2]["id"], users[1]["id"], executor_decision=MATCH_DECISION_DECLINED)
+        await self.db.update_user_profile(users[1]["id"], "Петр", "Петров", None)
+        await self.db.upsert_match(orders[1]["id"], users[1]["id"], executor_decision=MATCH_DECISION_LIKED)
+        chosen = await self.db.list_chosen_orders_for_executor(users[1]["id"])
+        self.assertEqual([o["id"] for o in chosen], [orders[0]["id"]])
+        declined = await self.db.list_orders_declined_by_executor(users[1]["id"])
+        self.assertEqual([o["id"] for o in declined], [orders[2]["id"]])
+        liked = await self.db.list_matches_with_executors(orders[1]["id"], MATCH_DECISION_LIKED)
+        self.assertEqual(
+            [(m["executor_id"], m["executor_first_name"], m["executor_decision"]) for m in liked],
+            [(users[1]["id"], "Петр", MATCH_DECISION_LIKED)],
+        )
+
+    async def test_batch_fetch_chunks_in_list(self):
+        users = [await self.db.create_user(70 + idx, f"+7000000007{idx}") for idx in range(3)]
+        # Больше id, чем помещается в один IN (...): нужные попадают в разные порции
+        ids = [users[2]["id"], *range(10**6, 10**6 + 1200), users[0]["id"], users[1]["id"]]
+        fetched = await self.db.get_users_by_ids(ids)
+        self.assertEqual([u["id"] for u in fetched], [users[2]["id"], users[0]["id"], users[1]["id"]])
+        self.assertEqual(await self.db.get_orders_by_ids([]), [])
+
+    async def test_read_snapshot_ignores_concurrent_writes(self):
+        await self.db.create_user(1, "+79990000001")
+        path = self.tmp.name
+
+        def _counts(conn):
+            before = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            other = sqlite3.connect(path, isolation_level=None)
+            other.execute("INSERT INTO users(tg_id, phone, created_at, updated_at) VALUES(2, '+79990000002', '', '')")
+            other.close()
+            after = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            return before, after
+
+        self.assertEqual(await self.db.read_snapshot(_counts), (1, 1))
+        self.assertEqual(await self.db.read(lambda conn: conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]), 2)
+
+    async def test_close_stops_pool(self):
+        await self.db.close()
+        self.assertFalse(await self.db.health_check())
+
+
+class MigrationTests(unittest.IsolatedAsyncioTestCase):
+    async def test_json_columns_migrated(self):
+        tmp = tempfile.NamedTemporaryFile(delete=False)
+        self.addCleanup(tmp.close)
+        conn = sqlite3.connect(tmp.name)
+        conn.executescript(
+            """
+            CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, tg_id INTEGER UNIQUE, phone TEXT UNIQUE,
+                first_name TEXT, last_name TEXT, org_name TEXT, is_customer INTEGER NOT NULL DEFAULT 0,
+                is_executor INTEGER NOT NULL DEFAULT 0, is_admin INTEGER NOT NULL DEFAULT 0, last_role TEXT,
+                blocked INTEGER NOT NULL DEFAULT 0, created_at TEXT NOT NULL, updated_at TEXT NOT NULL);
+            CREATE TABLE executor_profiles (user_id INTEGER PRIMARY KEY, experience TEXT, resume_link TEXT,
+                resume_text TEXT, doc_types TEXT, construction_types TEXT, sections_capital TEXT,
+                sections_linear TEXT, updated_at TEXT);
+            CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, customer_id INTEGER NOT NULL,
+                name TEXT NOT NULL, doc_types TEXT NOT NULL, construction_types TEXT NOT NULL,
+                sections_capital TEXT, sections_linear TEXT, description TEXT, deadline TEXT, price TEXT,
+                expertise_required INTEGER, files_link TEXT, status TEXT NOT NULL, assigned_executor_id INTEGER,
+                created_at TEXT NOT NULL, updated_at TEXT NOT NULL);
+            INSERT INTO users(id, phone, created_at, updated_at) VALUES (1, '+70000000001', '', '');
+            INSERT INTO orders(customer_id, name, doc_types, construction_types, sections_capital,
+                sections_linear, status, created_at, updated_at)
+            VALUES (1, 'Заказ', '["ПД"]', '["линейные объекты"]', '[]',
+                '["СМ (смета)", "ПЗ (пояснительная записка)"]', 'open', '', '');
+            """
+        )
+        conn.close()
+        db = Database(tmp.name)
+        await db.init()
+        self.addAsyncCleanup(db.close)
+        order = await db.get_order(1)
+        self.assertEqual(order["doc_types"], ["ПД"])
+        self.assertEqual(order["construction_types"], ["линейные объекты"])
+        self.assertEqual(order["sections_linear"], ["СМ (смета)", "ПЗ (пояснительная записка)"])
+        columns = {row["name"] for row in await db.fetchall("PRAGMA table_info(orders)")}
+        self.assertNotIn("doc_types", columns)
+        self.assertEqual(
+            (order["capital_mask"], order["linear_mask"]), (0, 1 << SECTIONS_LINEAR.index("СМ (смета)") | 1)
+        )
+
+    async def test_section_position_added(self):
+        tmp = tempfile.NamedTemporaryFile(delete=False)
+        self.addCleanup(tmp.close)
+        db = Database(tmp.name)
+        await db.init()
+        user = await db.create_user(1, "+70000000001")
+        order = await db.create_order(
+            user["id"],
+            {
+                "name": "Заказ",
+                "doc_types": ["ПД"],
+                "construction_types": [CONSTRUCTION_TYPES[1]],
+                "sections_linear": [SECTIONS_LINEAR[9], SECTIONS_LINEAR[0]],
+                "status": ORDER_STATUS_OPEN,
+            },
+        )
+        await db.close()
+        # База версии 2: таблицы разделов без position
+        conn = sqlite3.connect(tmp.name)
+        for table in ("order_sections", "executor_sections"):
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN position")
+        conn.execute("PRAGMA user_version = 2")
+        conn.close()
+
+        db = Database(tmp.name)
+        await db.init()
+        self.addAsyncCleanup(db.close)
+        # Порядок выбора до миграции не сохранялся: остается порядок app.constants
+        self.assertEqual((await db.get_order(order["id"]))["sections_linear"], [SECTIONS_LINEAR[0], SECTIONS_LINEAR[9]])
+        await db.update_order(order["id"], {**order, "sections_linear": [SECTIONS_LINEAR[9], SECTIONS_LINEAR[0]]})
+        self.assertEqual((await db.get_order(order["id"]))["sections_linear"], [SECTIONS_LINEAR[9], SECTIONS_LINEAR[0]])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, Update
+
+from app.fsm_storage import KeyedEventIsolation
+
+
+class Flow(StatesGroup):
+    name = State()
+
+
+def _update(update_id, user_id, text):
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+                "text": text,
+            },
+        }
+    )
+
+
+class KeyedEventIsolationTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.log = []
+        self.active = set()
+        self.overlap = False
+        router = Router()
+
+        @router.message(Command("start"))
+        async def on_start(message: Message, state: FSMContext) -> None:
+            # Пока первый апдейт не выставил состояние, второй уже пришел
+            await asyncio.sleep(0.05)
+            await state.set_state(Flow.name)
+            self.log.append(("start", message.from_user.id, message.text))
+
+        @router.message(Flow.name)
+        async def on_name(message: Message, state: FSMContext) -> None:
+            self.log.append(("name", message.from_user.id, message.text))
+            await state.clear()
+
+        @router.message(F.text)
+        async def on_message(message: Message) -> None:
+            if message.text == "boom":
+                raise RuntimeError("boom")
+            user_id = message.from_user.id
+            if user_id in self.active:
+                self.overlap = True
+            self.active.add(user_id)
+            self.log.append(("start", user_id, message.text))
+            await asyncio.sleep(0.05 if message.text == "slow" else 0)
+            self.log.append(("end", user_id, message.text))
+            self.active.discard(user_id)
+
+        self.isolation = KeyedEventIsolation()
+        self.dp = Dispatcher(events_isolation=self.isolation)
+        self.dp.include_router(router)
+        self.bot = Bot("42:TEST")
+
+    async def _feed(self, *updates):
+        await asyncio.gather(*(self.dp.feed_update(self.bot, update) for update in updates))
+
+    async def test_second_update_sees_state_of_first(self):
+        await self._feed(_update(1, 7, "/start"), _update(2, 7, "Объект"))
+        self.assertIs(self.dp.fsm.events_isolation, self.isolation)
+        self.assertEqual(self.log, [("start", 7, "/start"), ("name", 7, "Объект")])
+        self.assertEqual(len(self.isolation._locks), 0)
+
+    async def test_same_user_serialized_in_order(self):
+        await self._feed(_update(1, 7, "slow"), _update(2, 7, "fast"), _update(3, 7, "third"))
+        self.assertFalse(self.overlap)
+        self.assertEqual(
+            [text for kind, _, text in self.log if kind == "start"], ["slow", "fast", "third"]
+        )
+        self.assertEqual(len(self.isolation._locks), 0)
+
+    async def test_users_run_concurrently(self):
+        await self._feed(_update(1, 7, "slow"), _update(2, 8, "fast"))
+        self.assertEqual(
+            self.log,
+            [("start", 7, "slow"), ("start", 8, "fast"), ("end", 8, "fast"), ("end", 7, "slow")],
+        )
+        self.assertEqual(len(self.isolation._locks), 0)
+
+    async def test_lock_released_on_error(self):
+        with self.assertRaises(RuntimeError):
+            await self.dp.feed_update(self.bot, _update(1, 7, "boom"))
+        self.assertEqual(len(self.isolation._locks), 0)
+        await self._feed(_update(2, 7, "fast"))
+        self.assertEqual(self.log[-1], ("end", 7, "fast"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,34 @@
+from datetime import date, datetime
+import tempfile
 import unittest
 import zipfile
 from io import BytesIO
+from xml.etree import ElementTree
 
-from app.excel import build_xlsx
+from app.excel import build_xlsx, write_workbook, write_xlsx
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def _read_sheet(fh, idx=1):
+    with zipfile.ZipFile(fh) as zf:
+        strings = [si.findtext(f"{NS}t") for si in ElementTree.fromstring(zf.read("xl/sharedStrings.xml"))]
+        with zf.open(f"xl/worksheets/sheet{idx}.xml") as sheet:
+            rows = []
+            for _, row in ElementTree.iterparse(sheet):
+                if row.tag != f"{NS}row":
+                    continue
+                values = []
+                for cell in row:
+                    if cell.get("t") == "s":
+                        values.append(strings[int(cell.findtext(f"{NS}v"))])
+                    elif cell.get("t") == "inlineStr":
+                        values.append(cell.findtext(f"{NS}is/{NS}t"))
+                    else:
+                        values.append(cell.findtext(f"{NS}v"))
+                rows.append(values)
+                row.clear()
+    return rows
 
 
 class ExcelTests(unittest.TestCase):
@@ -15,6 +41,60 @@ class ExcelTests(unittest.TestCase):
         self.assertIn("xl/workbook.xml", names)
         self.assertIn("xl/worksheets/sheet1.xml", names)
 
+    def test_write_xlsx_streams_rows(self):
+        rows = (["#" + str(idx), "<&>" if idx % 2 else None] for idx in range(20_000))
+        with tempfile.TemporaryFile() as fh:
+            write_xlsx(fh, rows, sheet_name="Big")
+            fh.seek(0)
+            parsed = _read_sheet(fh)
+        self.assertEqual(len(parsed), 20_000)
+        self.assertEqual(parsed[0], ["#0"])
+        self.assertEqual(parsed[-1], ["#19999", "<&>"])
+
+    def test_shared_strings_and_typed_cells(self):
+        rows = [
+            ["Раздел", 3, 4.5, date(2026, 1, 2), datetime(2026, 1, 2, 12, 0)],
+            ["Раздел", 0, -1.25, None, "x" * 300],
+        ]
+        data = build_xlsx(rows)
+        with zipfile.ZipFile(BytesIO(data)) as zf:
+            sst = ElementTree.fromstring(zf.read("xl/sharedStrings.xml"))
+            sheet = ElementTree.fromstring(zf.read("xl/worksheets/sheet1.xml"))
+        self.assertEqual(sst.get("count"), "2")
+        self.assertEqual(sst.get("uniqueCount"), "1")
+        cells = {cell.get("r"): cell for cell in sheet.iter(f"{NS}c")}
+        self.assertEqual(cells["A1"].get("t"), "s")
+        self.assertEqual(cells["A2"].findtext(f"{NS}v"), "0")
+        self.assertIsNone(cells["B1"].get("t"))
+        self.assertEqual(cells["B1"].findtext(f"{NS}v"), "3")
+        self.assertEqual(cells["C2"].findtext(f"{NS}v"), "-1.25")
+        self.assertEqual(cells["D1"].get("s"), "1")
+        self.assertEqual(cells["D1"].findtext(f"{NS}v"), "46024.0")
+        self.assertEqual(cells["E1"].get("s"), "2")
+        self.assertEqual(cells["E1"].findtext(f"{NS}v"), "46024.5")
+        self.assertNotIn("D2", cells)
+        self.assertEqual(cells["E2"].get("t"), "inlineStr")
+
+    def test_build_xlsx_readable_back(self):
+        rows = [["A", "B"], [1, "B"], ["A", 2.5]]
+        with BytesIO(build_xlsx(rows)) as fh:
+            self.assertEqual(_read_sheet(fh), [["A", "B"], ["1", "B"], ["A", "2.5"]])
+
+    def test_write_workbook_multiple_sheets(self):
+        buffer = BytesIO()
+        write_workbook(buffer, [("Первый", [["общая", 1]]), ("Второй", (row for row in [["общая"], ["своя"]]))])
+        with zipfile.ZipFile(buffer) as zf:
+            workbook = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+            sst = ElementTree.fromstring(zf.read("xl/sharedStrings.xml"))
+        self.assertEqual([sheet.get("name") for sheet in workbook.iter(f"{NS}sheet")], ["Первый", "Второй"])
+        self.assertEqual(sst.get("uniqueCount"), "2")
+        self.assertEqual(_read_sheet(buffer, 1), [["общая", "1"]])
+        self.assertEqual(_read_sheet(buffer, 2), [["общая"], ["своя"]])
+
+    def test_write_workbook_rejects_duplicate_sheets(self):
+        with self.assertRaises(ValueError):
+            write_workbook(BytesIO(), [("Лист", []), ("лист", [])])
+
 
 if __name__ == "__main__":
     unittest.main()
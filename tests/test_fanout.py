@@ -0,0 +1,183 @@
+import asyncio
+import tempfile
+import unittest
+
+from app.constants import (
+    CONSTRUCTION_TYPES,
+    NOTIFY_MODE_DIGEST,
+    NOTIFY_MODE_INSTANT,
+    NOTIFY_MODE_OFF,
+    ORDER_STATUS_OPEN,
+    SECTIONS_CAPITAL,
+    SECTIONS_LINEAR,
+)
+from app.db import Database
+from app.fanout import OrderFanout
+from app.notifications import Notifier
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+class OrderFanoutTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(delete=False)
+        self.db = Database(self.tmp.name)
+        await self.db.init()
+        self.customer = await self.db.create_user(1, "+70000000001")
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.tmp.close()
+
+    async def _executor(self, tg_id, types, capital=(), linear=(), mode=None, blocked=False):
+        user = await self.db.create_user(tg_id, f"+7000000{tg_id:04d}")
+        await self.db.set_user_roles(user["id"], is_executor=True)
+        await self.db.upsert_executor_profile(
+            user["id"],
+            "",
+            None,
+            None,
+            ["ПД"],
+            [CONSTRUCTION_TYPES[i] for i in types],
+            [SECTIONS_CAPITAL[i] for i in capital],
+            [SECTIONS_LINEAR[i] for i in linear],
+        )
+        if mode is not None:
+            await self.db.set_notify_mode(user["id"], mode)
+        if blocked:
+            await self.db.set_blocked(user["id"], True)
+        return user
+
+    async def _create_order(self, name="Заказ <КЖ>"):
+        return await self.db.create_order(
+            self.customer["id"],
+            {
+                "name": name,
+                "doc_types": ["ПД"],
+                "construction_types": CONSTRUCTION_TYPES,
+                "sections_capital": [SECTIONS_CAPITAL[4]],
+                "sections_linear": [SECTIONS_LINEAR[0], SECTIONS_LINEAR[1]],
+                "status": ORDER_STATUS_OPEN,
+            },
+        )
+
+    async def _seed(self):
+        return {
+            "capital": await self._executor(10, [0], capital=[4, 5]),
+            # Раздел совпадает, но вид строительства не выбран
+            "gated": await self._executor(11, [1], capital=[4], linear=[7]),
+            "blocked": await self._executor(12, [0], capital=[4], blocked=True),
+            "off": await self._executor(13, [0], capital=[4], mode=NOTIFY_MODE_OFF),
+            "digest": await self._executor(14, [1], linear=[0, 1], mode=NOTIFY_MODE_DIGEST),
+            "linear": await self._executor(15, [1], linear=[1]),
+            "other": await self._executor(16, [0], capital=[6]),
+        }
+
+    async def test_recipients_paged_by_user_id(self):
+        users = await self._seed()
+        await self.db.set_user_roles(self.customer["id"], is_executor=True)
+        await self.db.upsert_executor_profile(
+            self.customer["id"], "", None, None, ["ПД"], CONSTRUCTION_TYPES, [SECTIONS_CAPITAL[4]], []
+        )
+        order = await self._create_order()
+
+        pages = []
+        after = 0
+        while True:
+            rows = await self.db.list_order_recipients(order["id"], after, limit=2)
+            pages.append([(row["user_id"], row["mode"]) for row in rows])
+            if len(rows) < 2:
+                break
+            after = rows[-1]["user_id"]
+        self.assertEqual(
+            pages,
+            [
+                [(users["capital"]["id"], NOTIFY_MODE_INSTANT), (users["digest"]["id"], NOTIFY_MODE_DIGEST)],
+                [(users["linear"]["id"], NOTIFY_MODE_INSTANT)],
+            ],
+        )
+
+    async def test_fan_out_and_digest(self):
+        users = await self._seed()
+        bot = FakeBot()
+        notifier = Notifier(bot, chat_rate=100, chat_burst=10)
+        fanout = OrderFanout(self.db, notifier, page_size=1)
+        fanout.attach()
+        order = await self._create_order()
+        await fanout.join()
+
+        # Исполнитель сменил режим до сводки: сводка ему уже не нужна
+        await self.db.add_order_digest(order["id"], [users["linear"]["id"]])
+        await self.db.set_notify_mode(users["linear"]["id"], NOTIFY_MODE_INSTANT)
+        self.assertEqual(await fanout.send_digests(), 1)
+        self.assertEqual(await fanout.send_digests(), 0)
+        await fanout.close()
+        await notifier.close()
+
+        self.assertEqual([chat_id for chat_id, _ in bot.sent], [10, 15, 14])
+        self.assertIn(f"{order['id']} Заказ &lt;КЖ&gt;", bot.sent[0][1])
+        self.assertTrue(bot.sent[2][1].startswith("Новые заказы по вашим разделам:\n"))
+
+    async def test_rolled_back_order_not_sent(self):
+        await self._seed()
+        fanout = OrderFanout(self.db, Notifier(FakeBot()))
+        fanout.attach()
+        with self.assertRaises(RuntimeError):
+            async with self.db.transaction():
+                await self._create_order()
+                raise RuntimeError("boom")
+        self.assertFalse(fanout._tasks)
+        await fanout.close()
+
+    async def test_notify_mode(self):
+        user = await self._executor(10, [0], capital=[4])
+        self.assertEqual(await self.db.get_notify_mode(user["id"]), NOTIFY_MODE_INSTANT)
+        await self.db.set_notify_mode(user["id"], NOTIFY_MODE_DIGEST)
+        self.assertEqual(await self.db.get_notify_mode(user["id"]), NOTIFY_MODE_DIGEST)
+        with self.assertRaises(ValueError):
+            await self.db.set_notify_mode(user["id"], "sometimes")
+
+
+class GatedBot(FakeBot):
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self.gate.wait()
+        await super().send_message(chat_id, text, **kwargs)
+
+
+class NotifierEnqueueTests(unittest.IsolatedAsyncioTestCase):
+    async def test_bulk_does_not_starve_handlers(self):
+        bot = GatedBot()
+        notifier = Notifier(bot, maxsize=2, chat_rate=100, chat_burst=10)
+        fan_out = asyncio.gather(*(notifier.enqueue_bulk(100 + idx, f"order{idx}") for idx in range(6)))
+        await asyncio.sleep(0.01)
+        # Очередь рассылки полна, а сообщения обработчиков проходят и уходят раньше нее
+        self.assertFalse(fan_out.done())
+        self.assertTrue(notifier.notify(1, "reply"))
+        await notifier.enqueue(2, "answer")
+        bot.gate.set()
+        await asyncio.wait_for(fan_out, 1)
+        await notifier.close()
+        texts = [text for _, text in bot.sent]
+        self.assertEqual(texts[:3], ["order0", "reply", "answer"])
+        self.assertEqual(sorted(texts[3:]), [f"order{idx}" for idx in range(1, 6)])
+        self.assertEqual(notifier.stats()["dropped"], 0)
+
+    async def test_enqueue_waits_for_space(self):
+        bot = FakeBot()
+        notifier = Notifier(bot, maxsize=1, chat_rate=100, chat_burst=10)
+        for idx in range(5):
+            await notifier.enqueue(idx, f"m{idx}")
+        self.assertFalse(notifier.notify(9, "full") and notifier.notify(9, "full"))
+        await notifier.close()
+        self.assertEqual([text for _, text in bot.sent][:5], [f"m{idx}" for idx in range(5)])
+        self.assertEqual(notifier.stats()["dropped"], 1)
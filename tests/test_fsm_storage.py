@@ -0,0 +1,117 @@
+import asyncio
+import tempfile
+import unittest
+
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from app.db import Database
+from app.fsm_storage import SQLiteStorage
+
+
+class Flow(StatesGroup):
+    name = State()
+
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+class SQLiteStorageTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(delete=False)
+        self.db = Database(self.tmp.name)
+        await self.db.init()
+        self.now = 1000.0
+        self.storage = self._storage()
+
+    async def asyncTearDown(self):
+        await self.storage.close()
+        await self.db.close()
+        self.tmp.close()
+
+    def _storage(self, **kwargs):
+        return SQLiteStorage(self.db, flush_interval=60, clock=lambda: self.now, **kwargs)
+
+    async def _rows(self):
+        return await self.db.fetchall("SELECT key, state, data FROM fsm_states")
+
+    async def test_state_and_data_survive_restart(self):
+        await self.storage.set_state(KEY, Flow.name)
+        await self.storage.set_data(KEY, {"name": "Объект"})
+        self.assertEqual(await self.storage.get_state(KEY), Flow.name.state)
+        await self.storage.close()
+
+        self.storage = self._storage()
+        self.assertEqual(await self.storage.get_state(KEY), Flow.name.state)
+        self.assertEqual(await self.storage.get_data(KEY), {"name": "Объект"})
+
+    async def test_updates_are_coalesced_until_flush(self):
+        for idx in range(20):
+            await self.storage.update_data(KEY, {"sections": list(range(idx))})
+        self.assertEqual(await self._rows(), [])
+        await self.storage.flush()
+        rows = await self._rows()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(await self.storage.get_data(KEY), {"sections": list(range(19))})
+
+    async def test_get_data_returns_copy(self):
+        await self.storage.set_data(KEY, {"a": 1})
+        data = await self.storage.get_data(KEY)
+        data["a"] = 2
+        self.assertEqual(await self.storage.get_data(KEY), {"a": 1})
+
+    async def test_clear_deletes_row(self):
+        await self.storage.set_state(KEY, Flow.name)
+        await self.storage.flush()
+        await self.storage.set_state(KEY, None)
+        await self.storage.flush()
+        self.assertEqual(await self._rows(), [])
+
+    async def test_expired_state_is_empty_and_purged(self):
+        self.storage = self._storage(ttl=100)
+        await self.storage.set_state(KEY, Flow.name)
+        await self.storage.set_data(KEY, {"a": 1})
+        await self.storage.flush()
+        self.now += 50
+        self.assertEqual(await self.storage.get_state(KEY), Flow.name.state)
+        self.now += 100
+        self.assertIsNone(await self.storage.get_state(KEY))
+        self.assertEqual(await self.storage.get_data(KEY), {})
+        self.assertEqual(await self.storage.purge(), 1)
+        self.assertEqual(await self._rows(), [])
+
+    async def test_pending_limit_wakes_flush(self):
+        self.storage = self._storage(max_pending=2)
+        await self.storage.set_state(KEY, Flow.name)
+        await self.storage.set_state(StorageKey(bot_id=1, chat_id=11, user_id=11), Flow.name)
+        self.assertTrue(self.storage._wakeup.is_set())
+
+    async def test_concurrent_updates_merge(self):
+        read = self.db.get_fsm_record
+        calls = []
+
+        async def slow_read(key):
+            # Первое чтение возвращает строку, устаревшую к моменту слияния
+            row = await read(key)
+            calls.append(key)
+            if len(calls) == 1:
+                await asyncio.sleep(0.05)
+            return row
+
+        async def flush_soon():
+            await asyncio.sleep(0.02)
+            await self.storage.flush()
+
+        self.db.get_fsm_record = slow_read
+        merged = await asyncio.gather(
+            self.storage.update_data(KEY, {"a": 1}),
+            self.storage.update_data(KEY, {"b": 2}),
+            flush_soon(),
+        )
+        self.assertEqual(merged[1], {"a": 1, "b": 2})
+        self.assertEqual(await self.storage.get_data(KEY), {"a": 1, "b": 2})
+        self.assertEqual(len(self.storage._key_locks), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import unittest
+
+from app.jobs import ReportRunner
+
+
+class ReportRunnerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_per_owner_cap(self):
+        runner = ReportRunner(concurrency=2, per_owner=1)
+        release = asyncio.Event()
+        done = []
+
+        async def job():
+            await release.wait()
+            done.append(1)
+
+        self.assertTrue(runner.submit(1, job))
+        self.assertFalse(runner.submit(1, job))
+        self.assertTrue(runner.submit(2, job))
+        self.assertEqual(runner.running(1), 1)
+        release.set()
+        await runner.join()
+        self.assertEqual(done, [1, 1])
+        self.assertEqual(runner.running(1), 0)
+        self.assertTrue(runner.submit(1, job))
+        await runner.join()
+
+    async def test_concurrency_limit(self):
+        runner = ReportRunner(concurrency=1, per_owner=2)
+        active = 0
+        peak = 0
+
+        async def job():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        for owner in range(3):
+            self.assertTrue(runner.submit(owner, job))
+        await runner.join()
+        self.assertEqual(peak, 1)
+
+    async def test_failure_calls_error_handler(self):
+        runner = ReportRunner()
+        errors = []
+
+        async def job():
+            raise RuntimeError("boom")
+
+        async def on_error():
+            errors.append(1)
+
+        with self.assertLogs("app.jobs", level="ERROR"):
+            runner.submit(1, job, on_error=on_error)
+            await runner.join()
+        self.assertEqual(errors, [1])
+        self.assertEqual(runner.running(1), 0)
+
+    async def test_close_cancels_jobs(self):
+        runner = ReportRunner()
+        runner.submit(1, lambda: asyncio.sleep(10))
+        await runner.close()
+        self.assertEqual(runner.running(1), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
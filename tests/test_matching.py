@@ -1,7 +1,18 @@
+import tempfile
 import unittest
 
-from app.constants import CONSTRUCTION_TYPES, SECTIONS_CAPITAL, SECTIONS_LINEAR
-from app.services import has_match
+from app.constants import (
+    CONSTRUCTION_TYPES,
+    MATCH_DECISION_DECLINED,
+    MATCH_DECISION_LIKED,
+    ORDER_STATUS_CLOSED,
+    ORDER_STATUS_OPEN,
+    SECTIONS_CAPITAL,
+    SECTIONS_LINEAR,
+)
+from app.db import Database
+from app.matching import MatchingEngine
+from app.services import has_match, masks_match, section_masks
 
 
 class MatchingTests(unittest.TestCase):
@@ -31,6 +42,150 @@ class MatchingTests(unittest.TestCase):
         }
         self.assertFalse(has_match(order, executor))
 
+    def test_stored_masks_used(self):
+        order = {"capital_mask": 0, "linear_mask": 0b100}
+        executor = {
+            "construction_types": [CONSTRUCTION_TYPES[1]],
+            "sections_capital": [],
+            "sections_linear": [SECTIONS_LINEAR[2]],
+        }
+        self.assertEqual(section_masks(executor), (0, 0b100))
+        self.assertTrue(has_match(order, executor))
+        self.assertFalse(masks_match((0b1, 0), (0b10, 0b1)))
+
+
+class MatchingEngineTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(delete=False)
+        self.db = Database(self.tmp.name)
+        await self.db.init()
+        self.customer = await self.db.create_user(1, "+70000000001")
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.tmp.close()
+
+    async def _create_order(self, capital=(), linear=()):
+        types = []
+        if capital:
+            types.append(CONSTRUCTION_TYPES[0])
+        if linear:
+            types.append(CONSTRUCTION_TYPES[1])
+        return await self.db.create_order(
+            self.customer["id"],
+            {
+                "name": "Заказ",
+                "doc_types": ["ПД"],
+                "construction_types": types,
+                "sections_capital": [SECTIONS_CAPITAL[i] for i in capital],
+                "sections_linear": [SECTIONS_LINEAR[i] for i in linear],
+                "status": ORDER_STATUS_OPEN,
+            },
+        )
+
+    async def test_index_follows_order_changes(self):
+        first = await self._create_order(capital=[1])
+        engine = MatchingEngine()
+        engine.attach(self.db)
+        await engine.load(self.db)
+        second = await self._create_order(capital=[1, 2], linear=[0])
+        third = await self._create_order(linear=[3])
+
+        self.assertEqual(list(engine.candidates(99, 0b110, 0)), [first["id"], second["id"]])
+        self.assertEqual(engine.start_session(99, 0b110, 0b1, seen={first["id"]}), second["id"])
+        self.assertEqual(list(engine.candidates(self.customer["id"], 0b10, 0)), [])
+
+        await self.db.set_order_status(first["id"], ORDER_STATUS_CLOSED)
+        executor = await self.db.create_user(2, "+70000000002")
+        await self.db.assign_executor(second["id"], executor["id"])
+        self.assertEqual(list(engine.candidates(99, 0b110, 0b1)), [])
+
+        await self.db.update_order(
+            third["id"],
+            {
+                "name": "Заказ",
+                "doc_types": ["ПД"],
+                "construction_types": [CONSTRUCTION_TYPES[0]],
+                "sections_capital": [SECTIONS_CAPITAL[2]],
+                "sections_linear": [SECTIONS_LINEAR[3]],
+            },
+        )
+        self.assertEqual(list(engine.candidates(99, 0b100, 0)), [third["id"]])
+        self.assertEqual(list(engine.candidates(99, 0, 0b1000)), [])
+
+    async def test_rolled_back_order_not_indexed(self):
+        engine = MatchingEngine()
+        engine.attach(self.db)
+        with self.assertRaises(RuntimeError):
+            async with self.db.transaction():
+                await self._create_order(capital=[0])
+                raise RuntimeError("boom")
+        self.assertEqual(len(engine), 0)
+        order = await self._create_order(capital=[0])
+        self.assertIn(order["id"], engine)
+
+    async def test_swipe_session_cursor(self):
+        first = await self._create_order(capital=[0])
+        second = await self._create_order(capital=[0, 1])
+        engine = MatchingEngine()
+        engine.attach(self.db)
+        await engine.load(self.db)
+
+        self.assertEqual(engine.start_session(99, 0b1, 0, seen={first["id"]}), second["id"])
+        engine.advance(99, second["id"])
+        self.assertIsNone(engine.current(99))
+        self.assertTrue(engine.has_session(99))
+
+        # Заказ с пересекающимися разделами сбрасывает сессию, с чужими — нет
+        await self._create_order(linear=[0])
+        self.assertTrue(engine.has_session(99))
+        third = await self._create_order(capital=[0])
+        self.assertFalse(engine.has_session(99))
+        self.assertEqual(engine.start_session(99, 0b1, 0), first["id"])
+
+        # Закрытый заказ курсор пропускает без пересчета
+        await self.db.set_order_status(second["id"], ORDER_STATUS_CLOSED)
+        engine.advance(99, first["id"])
+        self.assertEqual(engine.current(99), third["id"])
+
+        executor = await self.db.create_user(2, "+70000000002")
+        engine.start_session(executor["id"], 0b1, 0)
+        await self.db.upsert_executor_profile(
+            executor["id"], "", None, None, ["ПД"], [CONSTRUCTION_TYPES[0]], [SECTIONS_CAPITAL[1]], []
+        )
+        self.assertFalse(engine.has_session(executor["id"]))
+
+    async def test_decision_outside_swipe_skips_order(self):
+        first = await self._create_order(capital=[0])
+        second = await self._create_order(capital=[0])
+        third = await self._create_order(capital=[0])
+        executor = await self.db.create_user(2, "+70000000002")
+        engine = MatchingEngine()
+        engine.attach(self.db)
+        await engine.load(self.db)
+
+        self.assertEqual(engine.start_session(executor["id"], 0b1, 0), first["id"])
+        # Ответ из списка «Вас выбрали» во время просмотра
+        await self.db.upsert_match(second["id"], executor["id"], executor_decision=MATCH_DECISION_LIKED)
+        await self.db.upsert_match(third["id"], executor["id"], customer_decision=MATCH_DECISION_LIKED)
+        # Решение по текущей карточке сдвигает курсор как обычно, без пересборки
+        await self.db.upsert_match(first["id"], executor["id"], executor_decision=MATCH_DECISION_DECLINED)
+        engine.advance(executor["id"], first["id"])
+        self.assertTrue(engine.has_session(executor["id"]))
+        self.assertEqual(engine.current(executor["id"]), third["id"])
+
+    async def test_swipe_sessions_bounded(self):
+        order = await self._create_order(capital=[0])
+        engine = MatchingEngine(max_sessions=2)
+        engine.attach(self.db)
+        await engine.load(self.db)
+        for executor_id in (97, 98, 99):
+            self.assertEqual(engine.start_session(executor_id, 0b1, 0), order["id"])
+        self.assertFalse(engine.has_session(97))
+        self.assertEqual(engine.current(99), order["id"])
+        # Сессию, вытесненную до ответа, обработчик просто откроет заново
+        engine.advance(97, order["id"])
+        self.assertFalse(engine.has_session(97))
 
 if __name__ == "__main__":
     unittest.main()
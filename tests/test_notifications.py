@@ -0,0 +1,162 @@
+import asyncio
+import time
+import unittest
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.notifications import Notifier, TokenBucket
+
+
+class FakeBot:
+    def __init__(self, failures=None):
+        self.sent = []
+        self.failures = failures or {}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        errors = self.failures.get(text)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text, kwargs, time.monotonic()))
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_refill(self):
+        now = [0.0]
+        bucket = TokenBucket(2, 2, clock=lambda: now[0])
+        bucket.take()
+        bucket.take()
+        self.assertAlmostEqual(bucket.delay(), 0.5)
+        now[0] = 0.5
+        self.assertEqual(bucket.delay(), 0.0)
+        now[0] = 10
+        bucket.take()
+        self.assertEqual(bucket.tokens, 1)
+
+
+class NotifierTests(unittest.IsolatedAsyncioTestCase):
+    async def test_delivers_in_order(self):
+        bot = FakeBot()
+        notifier = Notifier(bot, chat_rate=100, chat_burst=10)
+        for idx in range(5):
+            self.assertTrue(notifier.notify(1, f"m{idx}", reply_markup=None))
+        await notifier.close()
+        self.assertEqual([text for _, text, _, _ in bot.sent], [f"m{idx}" for idx in range(5)])
+        self.assertEqual(bot.sent[0][2], {"reply_markup": None})
+        self.assertEqual(notifier.stats()["sent"], 5)
+
+    async def test_chat_limit_does_not_block_other_chats(self):
+        bot = FakeBot()
+        notifier = Notifier(bot, chat_rate=10, chat_burst=1)
+        started = time.monotonic()
+        notifier.notify(1, "a1")
+        notifier.notify(1, "a2")
+        notifier.notify(1, "a3")
+        notifier.notify(2, "b1")
+        await notifier.close()
+        sent = {text: at - started for _, text, _, at in bot.sent}
+        self.assertEqual([text for _, text, _, _ in bot.sent], ["a1", "b1", "a2", "a3"])
+        self.assertLess(sent["b1"], 0.05)
+        self.assertGreaterEqual(sent["a3"], 0.18)
+
+    async def test_retry_after_is_retried(self):
+        error = TelegramRetryAfter(SendMessage(chat_id=1, text="x"), "Flood control", retry_after=0)
+        bot = FakeBot({"x": [error]})
+        notifier = Notifier(bot)
+        notifier.notify(1, "x")
+        await notifier.close()
+        self.assertEqual([text for _, text, _, _ in bot.sent], ["x"])
+        self.assertEqual(notifier.stats()["retried"], 1)
+
+    async def test_retry_after_pauses_other_chats(self):
+        error = TelegramRetryAfter(SendMessage(chat_id=1, text="x"), "Flood control", retry_after=0.2)
+        bot = FakeBot({"x": [error]})
+        notifier = Notifier(bot, chat_rate=100, chat_burst=10)
+        started = time.monotonic()
+        notifier.notify(1, "x")
+        notifier.notify(2, "y")
+        await notifier.close()
+        sent = {text: at - started for _, text, _, at in bot.sent}
+        self.assertGreaterEqual(sent["y"], 0.18)
+        self.assertGreaterEqual(sent["x"], 0.18)
+
+    async def test_permanent_error_is_not_retried(self):
+        error = TelegramForbiddenError(SendMessage(chat_id=1, text="x"), "bot was blocked by the user")
+        bot = FakeBot({"x": [error]})
+        notifier = Notifier(bot)
+        notifier.notify(1, "x")
+        notifier.notify(1, "y")
+        with self.assertLogs("app.notifications", level="ERROR"):
+            await notifier.close()
+        self.assertEqual([text for _, text, _, _ in bot.sent], ["y"])
+        self.assertEqual(notifier.stats()["failed"], 1)
+
+    async def test_full_queue_drops(self):
+        notifier = Notifier(FakeBot(), maxsize=2)
+        self.assertTrue(notifier.notify(1, "a"))
+        self.assertTrue(notifier.notify(2, "b"))
+        with self.assertLogs("app.notifications", level="WARNING"):
+            self.assertFalse(notifier.notify(3, "c"))
+        self.assertEqual(notifier.stats()["dropped"], 1)
+        await notifier.close()
+
+    async def test_full_queue_enqueue_waits(self):
+        bot = FakeBot()
+        gate = asyncio.Event()
+        send = bot.send_message
+
+        async def blocked_send(chat_id, text, **kwargs):
+            await gate.wait()
+            await send(chat_id, text, **kwargs)
+
+        bot.send_message = blocked_send
+        notifier = Notifier(bot, maxsize=1, chat_rate=100, chat_burst=10)
+        await notifier.enqueue(1, "a")
+        await notifier.enqueue(2, "b")
+        waiting = asyncio.create_task(notifier.enqueue(3, "c"))
+        await asyncio.sleep(0.01)
+        # Очередь полна: сообщение обработчика ждет места, а необязательное отбрасывается
+        self.assertFalse(waiting.done())
+        with self.assertLogs("app.notifications", level="WARNING"):
+            self.assertFalse(notifier.notify(4, "d"))
+        gate.set()
+        await asyncio.wait_for(waiting, 1)
+        await notifier.close()
+        self.assertEqual([text for _, text, _, _ in bot.sent], ["a", "b", "c"])
+        self.assertEqual(notifier.stats()["dropped"], 1)
+
+    async def test_close_without_messages(self):
+        notifier = Notifier(FakeBot())
+        notifier.notify(1, "a")
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(notifier.close(), 1)
+        with self.assertLogs("app.notifications", level="WARNING"):
+            self.assertFalse(notifier.notify(1, "b"))
+            self.assertFalse(await notifier.enqueue(1, "c"))
+            self.assertFalse(await notifier.enqueue_bulk(1, "d"))
+        self.assertEqual(notifier.stats()["dropped"], 3)
+
+    async def test_close_releases_waiting_enqueue(self):
+        bot = FakeBot()
+        send = bot.send_message
+
+        async def slow_send(chat_id, text, **kwargs):
+            await asyncio.sleep(0.1)
+            await send(chat_id, text, **kwargs)
+
+        bot.send_message = slow_send
+        notifier = Notifier(bot, maxsize=1, chat_rate=100, chat_burst=10)
+        await notifier.enqueue(1, "a")
+        await notifier.enqueue(2, "b")
+        waiting = asyncio.create_task(notifier.enqueue(3, "c"))
+        await asyncio.sleep(0.01)
+        # Очередь не успевает дописаться: ожидающий не висит, а получает отказ
+        with self.assertLogs("app.notifications", level="WARNING"):
+            await notifier.close(timeout=0.01)
+            self.assertFalse(await asyncio.wait_for(waiting, 1))
+        self.assertEqual([text for _, text, _, _ in bot.sent], ["a"])
+        self.assertEqual(notifier.stats()["dropped"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,265 @@
+from datetime import date
+import random
+import tempfile
+import unittest
+
+from app import reports
+from app.constants import (
+    CONSTRUCTION_TYPES,
+    MATCH_DECISION_DECLINED,
+    MATCH_DECISION_LIKED,
+    ORDER_STATUS_CLOSED,
+    ORDER_STATUS_OPEN,
+    SECTIONS_CAPITAL,
+    SECTIONS_LINEAR,
+)
+from app.db import Database
+from app.services import has_match
+
+
+def _full_name(user):
+    return f"{user.get('first_name','')} {user.get('last_name','')}".strip()
+
+
+def _as_text(rows):
+    # Прежние отчеты отдавали все значения строками
+    return [
+        [value.isoformat() if isinstance(value, date) else str(value) if isinstance(value, int) else value for value in row]
+        for row in rows
+    ]
+
+
+async def _reference_customers(db):
+    # Прежняя построчная реализация отчета из admin.report_customers
+    customers = await db.list_customers()
+    rows = [reports.CUSTOMERS_HEADER]
+    for idx, customer in enumerate(customers, start=1):
+        orders = await db.list_orders_by_customer(customer["id"])
+        open_orders = [o for o in orders if o["status"] != ORDER_STATUS_CLOSED]
+        closed_orders = [o for o in orders if o["status"] == ORDER_STATUS_CLOSED]
+        open_info = []
+        for order in open_orders:
+            if order.get("assigned_executor_id"):
+                executor = await db.get_user_by_id(order["assigned_executor_id"])
+                open_info.append(f"#{order['id']}: {executor.get('phone','-')} {_full_name(executor)}")
+            else:
+                open_info.append(f"#{order['id']}: исполнитель не подтвержден")
+        execs_info = []
+        for order in orders:
+            matches = await db.list_matches_for_order(order["id"])
+            exec_count = len({m["executor_id"] for m in matches if m.get("customer_decision") == MATCH_DECISION_LIKED})
+            sections = ", ".join(order.get("sections_capital", []) + order.get("sections_linear", []))
+            execs_info.append(f"#{order['id']}: {exec_count}, разделы: {sections}")
+        avg, cnt = await db.get_rating_summary(customer["id"])
+        rows.append(
+            [
+                str(idx),
+                customer.get("phone", ""),
+                _full_name(customer),
+                str(len(orders)),
+                "; ".join(open_info),
+                str(len(closed_orders)),
+                "; ".join(execs_info),
+                f"{avg:.2f} ({cnt})",
+            ]
+        )
+    return rows
+
+
+async def _reference_executors(db):
+    # Прежняя построчная реализация отчета из admin.report_executors
+    executors = await db.list_executors()
+    orders = await db.list_open_orders()
+    rows = [reports.EXECUTORS_HEADER]
+    for idx, executor in enumerate(executors, start=1):
+        profile = await db.get_executor_profile(executor["id"])
+        matches = await db.list_matches_for_executor(executor["id"])
+        accepted = [
+            m for m in matches
+            if m.get("customer_decision") == MATCH_DECISION_LIKED and m.get("executor_decision") == MATCH_DECISION_LIKED
+        ]
+        possible = [o for o in orders if not o.get("assigned_executor_id") and profile and has_match(o, profile)]
+        open_orders = []
+        for match in accepted:
+            order = await db.get_order(match["order_id"])
+            if order and order["status"] != ORDER_STATUS_CLOSED:
+                customer = await db.get_user_by_id(order["customer_id"])
+                open_orders.append(f"#{order['id']}: {customer.get('phone','-')} {_full_name(customer)}")
+        closed_orders = await db.list_closed_orders_for_user(executor["id"], role="executor")
+        avg, cnt = await db.get_rating_summary(executor["id"])
+        sections = ", ".join(
+            (profile or {}).get("sections_capital", []) + (profile or {}).get("sections_linear", [])
+        )
+        rows.append(
+            [
+                str(idx),
+                executor.get("phone", ""),
+                _full_name(executor),
+                sections,
+                str(len(accepted)),
+                str(len(possible)),
+                "; ".join(open_orders),
+                str(len(closed_orders)),
+                f"{avg:.2f} ({cnt})",
+            ]
+        )
+    return rows
+
+
+async def _reference_mutual(db):
+    # Прежняя построчная реализация отчета из admin.report_mutual
+    matches = await db.fetchall(
+        "SELECT * FROM matches WHERE customer_decision = ? AND executor_decision = ?",
+        (MATCH_DECISION_LIKED, MATCH_DECISION_LIKED),
+    )
+    rows = [reports.MUTUAL_HEADER]
+    for idx, match in enumerate(matches, start=1):
+        order = await db.get_order(match["order_id"])
+        customer = await db.get_user_by_id(order["customer_id"])
+        executor = await db.get_user_by_id(match["executor_id"])
+        rows.append(
+            [
+                str(idx),
+                customer.get("phone", ""),
+                _full_name(customer),
+                executor.get("phone", ""),
+                _full_name(executor),
+                order.get("deadline", ""),
+            ]
+        )
+    return rows
+
+
+async def _reference_reviews(db):
+    # Прежняя построчная реализация отчета из admin.admin_reviews
+    ratings = await db.fetchall("SELECT * FROM ratings")
+    rows = [reports.REVIEWS_HEADER]
+    for idx, rating in enumerate(ratings, start=1):
+        from_user = await db.get_user_by_id(rating["from_user_id"]) or {}
+        to_user = await db.get_user_by_id(rating["to_user_id"]) or {}
+        rows.append(
+            [
+                str(idx),
+                str(rating.get("order_id")),
+                f"{from_user.get('phone','')} {_full_name(from_user)}",
+                f"{to_user.get('phone','')} {_full_name(to_user)}",
+                str(rating.get("stars")),
+                rating.get("review") or "",
+                rating.get("created_at") or "",
+            ]
+        )
+    return rows
+
+
+class ReportTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(delete=False)
+        self.db = Database(self.tmp.name)
+        await self.db.init()
+        await self._populate(random.Random(7))
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        self.tmp.close()
+
+    async def _populate(self, rng):
+        db = self.db
+        self.customers = []
+        self.executors = []
+        for idx in range(6):
+            user = await db.create_user(100 + idx, f"+7900000010{idx}")
+            await db.set_user_roles(user["id"], is_customer=True, is_executor=idx == 5)
+            if idx % 3:
+                await db.update_user_profile(user["id"], f"Имя{idx}", f"Фамилия{idx}", None)
+            self.customers.append(user["id"])
+        for idx in range(8):
+            user = await db.create_user(200 + idx, f"+7900000020{idx}")
+            await db.set_user_roles(user["id"], is_executor=True)
+            await db.update_user_profile(user["id"], f"Исп{idx}", f"Овский{idx}", "ООО")
+            types = rng.sample(CONSTRUCTION_TYPES, rng.randint(1, 2))
+            await db.upsert_executor_profile(
+                user["id"],
+                "Более 5 лет",
+                None,
+                None,
+                ["ПД"],
+                types,
+                rng.sample(SECTIONS_CAPITAL, 2),
+                rng.sample(SECTIONS_LINEAR, 2),
+            )
+            self.executors.append(user["id"])
+        # Исполнитель без анкеты и заказчик, который тоже исполнитель
+        user = await db.create_user(300, "+79000000300")
+        await db.set_user_roles(user["id"], is_executor=True)
+        self.executors.append(user["id"])
+        self.executors.append(self.customers[5])
+        for customer_id in self.customers[1:]:
+            for _ in range(rng.randint(1, 4)):
+                order = await db.create_order(
+                    customer_id,
+                    {
+                        "name": "Объект",
+                        "doc_types": ["РД"],
+                        "construction_types": rng.sample(CONSTRUCTION_TYPES, rng.randint(1, 2)),
+                        "sections_capital": rng.sample(SECTIONS_CAPITAL, rng.randint(0, 3)),
+                        "sections_linear": rng.sample(SECTIONS_LINEAR, rng.randint(0, 2)),
+                        "deadline": "2026-12-01",
+                        "status": ORDER_STATUS_OPEN,
+                    },
+                )
+                for executor_id in rng.sample(self.executors, 3):
+                    await db.upsert_match(
+                        order["id"],
+                        executor_id,
+                        customer_decision=rng.choice([None, MATCH_DECISION_LIKED, MATCH_DECISION_DECLINED]),
+                        executor_decision=rng.choice([None, MATCH_DECISION_LIKED, MATCH_DECISION_DECLINED]),
+                    )
+                if rng.random() < 0.6:
+                    executor_id = rng.choice(self.executors)
+                    await db.upsert_match(
+                        order["id"],
+                        executor_id,
+                        customer_decision=MATCH_DECISION_LIKED,
+                        executor_decision=MATCH_DECISION_LIKED,
+                    )
+                    await db.assign_executor(order["id"], executor_id)
+                    if rng.random() < 0.5:
+                        await db.set_order_status(order["id"], ORDER_STATUS_CLOSED)
+                        await db.add_rating(order["id"], customer_id, executor_id, rng.randint(1, 5), "Хорошо")
+                        await db.add_rating(order["id"], executor_id, customer_id, rng.randint(1, 5), None)
+
+    async def test_customers_report_matches_reference(self):
+        expected = await _reference_customers(self.db)
+        self.assertGreater(len(expected), 2)
+        self.assertEqual(_as_text(await self.db.read(lambda conn: list(reports.customers_report(conn)))), expected)
+
+    async def test_executors_report_matches_reference(self):
+        expected = await _reference_executors(self.db)
+        self.assertTrue(any(row[5] != "0" for row in expected[1:]))
+        self.assertEqual(_as_text(await self.db.read(lambda conn: list(reports.executors_report(conn)))), expected)
+
+    async def test_mutual_report_matches_reference(self):
+        expected = await _reference_mutual(self.db)
+        self.assertGreater(len(expected), 2)
+        self.assertEqual(_as_text(await self.db.read(lambda conn: list(reports.mutual_report(conn)))), expected)
+
+    async def test_reviews_report_matches_reference(self):
+        expected = await _reference_reviews(self.db)
+        self.assertGreater(len(expected), 2)
+        self.assertEqual(_as_text(await self.db.read(lambda conn: list(reports.reviews_report(conn)))), expected)
+
+    async def test_full_export_sheets(self):
+        sheets = await self.db.read_snapshot(
+            lambda conn: [(name, list(rows)) for name, rows in reports.full_export(conn)]
+        )
+        self.assertEqual([name for name, _ in sheets], ["Customers", "Executors", "Mutual", "Reviews", "Stats"])
+        stats = await self.db.count_stats()
+        self.assertEqual(
+            sheets[-1][1][1],
+            [stats["users"], stats["customers"], stats["executors"], stats["orders"], stats["in_work"]],
+        )
+        self.assertEqual(_as_text(sheets[2][1]), await _reference_mutual(self.db))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.webhook import create_webhook_app
+
+SECRET = "test-secret"
+
+
+def _update(update_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+
+class WebhookTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.handled = []
+        self.events = []
+        self.running = 0
+        self.peak = 0
+        router = Router()
+
+        @router.message(F.text)
+        async def on_message(message: Message) -> None:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            try:
+                if message.text == "slow":
+                    await asyncio.sleep(0.2)
+                elif message.text.startswith("burst"):
+                    await asyncio.sleep(0.02)
+            finally:
+                self.running -= 1
+            self.handled.append(message.text)
+
+        self.dp = Dispatcher()
+        self.dp.include_router(router)
+        self.dp.startup.register(lambda: self.events.append("startup"))
+        self.dp.shutdown.register(lambda: self.events.append(("shutdown", list(self.handled))))
+        self.bot = Bot("42:TEST")
+        self.client = await self._client()
+
+    async def _client(self, **kwargs):
+        app = create_webhook_app(self.dp, self.bot, "/webhook", SECRET, **kwargs)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        return client
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def test_secret_checked(self):
+        response = await self.client.post(
+            "/webhook", json=_update(1, "wrong"), headers={"X-Telegram-Bot-Api-Secret-Token": "nope"}
+        )
+        self.assertEqual(response.status, 401)
+        response = await self.client.post("/webhook", json=_update(2, "missing"))
+        self.assertEqual(response.status, 401)
+        response = await self.client.post(
+            "/webhook", json=_update(3, "hello"), headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        )
+        self.assertEqual(response.status, 200)
+        await self.client.close()
+        self.assertEqual(self.handled, ["hello"])
+
+    async def test_updates_processed_concurrently_and_drained_on_shutdown(self):
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        # Медленное обновление не задерживает ни ответ Telegram, ни следующее обновление
+        response = await self.client.post("/webhook", json=_update(1, "slow"), headers=headers)
+        self.assertEqual(response.status, 200)
+        response = await self.client.post("/webhook", json=_update(2, "fast"), headers=headers)
+        self.assertEqual(response.status, 200)
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.handled, ["fast"])
+
+        await self.client.close()
+        self.assertEqual(self.events, ["startup", ("shutdown", ["fast", "slow"])])
+
+    async def test_concurrency_limit(self):
+        await self.client.close()
+        self.events.clear()
+        self.client = await self._client(concurrency=2)
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        responses = await asyncio.gather(
+            *(self.client.post("/webhook", json=_update(idx, f"burst{idx}"), headers=headers) for idx in range(6))
+        )
+        # Telegram получает ответ сразу, а обрабатывается не больше двух обновлений
+        self.assertEqual([response.status for response in responses], [200] * 6)
+        await self.client.close()
+        self.assertEqual(len(self.handled), 6)
+        self.assertEqual(self.peak, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()